@@ -0,0 +1,329 @@
+"""Retention and columnar archival for trade_decisions.
+
+Rows older than ARCHIVE_RETENTION_DAYS (rounded down to whole calendar months,
+so only closed months move) are written to Parquet under
+ARCHIVE_DIR/trade_decisions/month=YYYY-MM/ and then deleted from the hot table
+in the same batch. node_votes is flattened into typed per-node columns
+(<node>_recommendation, <node>_confidence, <node>_model), with votes from nodes
+not known at archive time kept as JSON in extra_votes.
+
+A batch's file is named after its first id, so a run interrupted between the
+write and the delete rewrites the same file instead of duplicating rows.
+Queries go through pyarrow datasets: only the requested columns are read and
+month partitions outside the time range are never opened, so historical
+analysis never touches Postgres.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from db import get_connection
+from settings import NODE_MODEL_ENVS, get_settings
+
+
+ARCHIVE_DIR_ENV = "ARCHIVE_DIR"
+
+DEFAULT_ARCHIVE_DIR = "archive"
+TABLE = "trade_decisions"
+BATCH_ROWS = 50_000
+NODE_IDS: Tuple[str, ...] = tuple(NODE_MODEL_ENVS)
+
+BASE_COLUMNS = (
+    "id",
+    "timestamp",
+    "symbol",
+    "decision",
+    "aggregate_confidence",
+    "entry_price",
+    "exit_price",
+    "profit_loss",
+    "holding_period_seconds",
+    "audit_hash",
+)
+
+
+def _pyarrow() -> Tuple[Any, Any, Any]:
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise RuntimeError("the archive needs the pyarrow package") from exc
+    return pa, ds, pq
+
+
+def root() -> str:
+    return os.path.join(os.getenv(ARCHIVE_DIR_ENV, DEFAULT_ARCHIVE_DIR), TABLE)
+
+
+def schema() -> Any:
+    pa, _, _ = _pyarrow()
+    fields = [
+        ("id", pa.int64()),
+        ("timestamp", pa.timestamp("us")),
+        ("symbol", pa.string()),
+        ("decision", pa.string()),
+        ("aggregate_confidence", pa.float64()),
+        ("entry_price", pa.float64()),
+        ("exit_price", pa.float64()),
+        ("profit_loss", pa.float64()),
+        ("holding_period_seconds", pa.float64()),
+        ("audit_hash", pa.string()),
+        ("votes_buy", pa.int16()),
+        ("votes_sell", pa.int16()),
+        ("votes_hold", pa.int16()),
+    ]
+    for node_id in NODE_IDS:
+        fields += [
+            (f"{node_id}_recommendation", pa.string()),
+            (f"{node_id}_confidence", pa.float64()),
+            (f"{node_id}_model", pa.string()),
+        ]
+    fields.append(("extra_votes", pa.string()))
+    return pa.schema(fields)
+
+
+def flatten(rows: Iterable[Tuple[Any, ...]]) -> Dict[str, List[Any]]:
+    """trade_decisions rows (BASE_COLUMNS order, node_votes last) -> column lists."""
+    names = [f.name for f in schema()]
+    columns: Dict[str, List[Any]] = {name: [] for name in names}
+    for row in rows:
+        *base, holding_period, audit_hash, node_votes = row
+        for name, value in zip(BASE_COLUMNS[:8], base):
+            columns[name].append(value)
+        columns["holding_period_seconds"].append(holding_period.total_seconds() if holding_period is not None else None)
+        columns["audit_hash"].append(audit_hash)
+        votes = {v.get("node_id"): v for v in node_votes or []}
+        recommendations = [v.get("recommendation") for v in votes.values()]
+        columns["votes_buy"].append(recommendations.count("BUY"))
+        columns["votes_sell"].append(recommendations.count("SELL"))
+        columns["votes_hold"].append(recommendations.count("HOLD"))
+        for node_id in NODE_IDS:
+            vote = votes.pop(node_id, {})
+            columns[f"{node_id}_recommendation"].append(vote.get("recommendation"))
+            columns[f"{node_id}_confidence"].append(vote.get("confidence"))
+            columns[f"{node_id}_model"].append(vote.get("model"))
+        columns["extra_votes"].append(json.dumps(list(votes.values())) if votes else None)
+    return columns
+
+
+def votes_from_row(row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Rebuild the node_votes list of an archived row."""
+    votes = []
+    for node_id in NODE_IDS:
+        recommendation = row.get(f"{node_id}_recommendation")
+        if recommendation is not None:
+            votes.append({
+                "node_id": node_id,
+                "model": row.get(f"{node_id}_model"),
+                "recommendation": recommendation,
+                "confidence": row.get(f"{node_id}_confidence"),
+            })
+    if row.get("extra_votes"):
+        votes.extend(json.loads(row["extra_votes"]))
+    return votes
+
+
+def cutoff(today: date, retention_days: float) -> datetime:
+    """Start of the month containing today - retention_days: everything before it is a closed month."""
+    boundary = today - timedelta(days=retention_days)
+    return datetime(boundary.year, boundary.month, 1)
+
+
+class Archiver:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    @property
+    def retention_days(self) -> float:
+        return get_settings().archive_retention_days
+
+    @property
+    def interval(self) -> float:
+        return max(get_settings().archive_interval_seconds, 60.0)
+
+    def _write(self, month: str, rows: List[Tuple[Any, ...]]) -> str:
+        pa, _, pq = _pyarrow()
+        directory = os.path.join(root(), f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{rows[0][0]:012d}.parquet")
+        table = pa.Table.from_pydict(flatten(rows), schema=schema())
+        tmp = path + ".tmp"
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+        return path
+
+    def run(self, retention_days: Optional[float] = None) -> Dict[str, Any]:
+        """Move closed months past the retention window out of the hot table."""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        if retention_days <= 0:
+            return {"archived": 0, "reason": "ARCHIVE_RETENTION_DAYS is not set"}
+        if not self._lock.acquire(blocking=False):
+            return {"archived": 0, "reason": "already running"}
+        try:
+            started = time.time()
+            before = cutoff(date.today(), retention_days)
+            archived, files = 0, []
+            while True:
+                with get_connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            """
+                            SELECT id, timestamp, symbol, decision, aggregate_confidence, entry_price,
+                                   exit_price, profit_loss, holding_period, audit_hash, node_votes
+                            FROM trade_decisions
+                            WHERE timestamp < %s
+                            ORDER BY id
+                            LIMIT %s
+                            """,
+                            (before, BATCH_ROWS),
+                        )
+                        rows = cur.fetchall()
+                        if not rows:
+                            break
+                        by_month: Dict[str, List[Tuple[Any, ...]]] = {}
+                        for row in rows:
+                            by_month.setdefault(row[1].strftime("%Y-%m"), []).append(row)
+                        # Files first, rows second: a crash in between leaves the rows to be rewritten, never lost.
+                        files += [self._write(month, month_rows) for month, month_rows in sorted(by_month.items())]
+                        cur.execute("DELETE FROM trade_decisions WHERE id = ANY(%s)", ([row[0] for row in rows],))
+                    conn.commit()
+                archived += len(rows)
+                if len(rows) < BATCH_ROWS:
+                    break
+            self.last_run = {
+                "archived": archived,
+                "files": files,
+                "cutoff": before.isoformat(),
+                "seconds": time.time() - started,
+                "finished_at": datetime.utcnow().isoformat(),
+            }
+            return self.last_run
+        finally:
+            self._lock.release()
+
+    def status(self) -> Dict[str, Any]:
+        partitions = []
+        if os.path.isdir(root()):
+            _, _, pq = _pyarrow()
+            for name in sorted(os.listdir(root())):
+                directory = os.path.join(root(), name)
+                parts = [f for f in sorted(os.listdir(directory)) if f.endswith(".parquet")]
+                paths = [os.path.join(directory, f) for f in parts]
+                partitions.append({
+                    "partition": name,
+                    "files": len(parts),
+                    "rows": sum(pq.ParquetFile(p).metadata.num_rows for p in paths),
+                    "bytes": sum(os.path.getsize(p) for p in paths),
+                })
+        return {
+            "root": root(),
+            "retention_days": self.retention_days or None,
+            "partitions": partitions,
+            "last_run": self.last_run,
+        }
+
+
+def _dataset() -> Optional[Any]:
+    pa, ds, _ = _pyarrow()
+    if not os.path.isdir(root()):
+        return None
+    month = pa.schema([("month", pa.string())])
+    return ds.dataset(
+        root(),
+        format="parquet",
+        partitioning=ds.partitioning(month, flavor="hive"),
+        schema=schema().append(month.field("month")),
+    )
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    # trade_decisions timestamps are naive UTC.
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _filter(
+    since: Optional[datetime],
+    until: Optional[datetime],
+    symbols: Optional[Sequence[str]],
+    ids: Optional[Sequence[int]] = None,
+) -> Any:
+    _, ds, _ = _pyarrow()
+    expression = None
+
+    def both(clause: Any) -> Any:
+        return clause if expression is None else expression & clause
+
+    # Partition bounds let the scanner skip whole months before looking at row timestamps.
+    if since is not None:
+        since = _naive_utc(since)
+        expression = both((ds.field("month") >= since.strftime("%Y-%m")) & (ds.field("timestamp") >= since))
+    if until is not None:
+        until = _naive_utc(until)
+        expression = both((ds.field("month") <= until.strftime("%Y-%m")) & (ds.field("timestamp") < until))
+    if symbols:
+        expression = both(ds.field("symbol").isin(list(symbols)))
+    if ids:
+        expression = both(ds.field("id").isin([int(i) for i in ids]))
+    return expression
+
+
+def scan(
+    columns: Optional[Sequence[str]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[Sequence[str]] = None,
+    limit: Optional[int] = None,
+    ids: Optional[Sequence[int]] = None,
+) -> Any:
+    """Archived rows as a pyarrow Table, reading only the given columns and matching partitions."""
+    pa, _, _ = _pyarrow()
+    dataset = _dataset()
+    names = [f.name for f in schema()]
+    columns = list(columns or names)
+    unknown = [c for c in columns if c not in names]
+    if unknown:
+        raise ValueError(f"unknown archive columns: {', '.join(unknown)}")
+    if dataset is None:
+        return pa.Table.from_pydict({c: [] for c in columns}, schema=pa.schema([schema().field(c) for c in columns]))
+    scanner = dataset.scanner(columns=columns, filter=_filter(since, until, symbols, ids))
+    return scanner.head(limit) if limit is not None else scanner.to_table()
+
+
+def node_stats(since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-node agreement with the executed decision and P&L over archived closed trades."""
+    columns = ["decision", "profit_loss"] + [f"{node_id}_recommendation" for node_id in NODE_IDS]
+    table = scan(columns, since, until)
+    decision = np.array(table.column("decision").to_pylist(), dtype=object)
+    pnl = np.array([p if p is not None else np.nan for p in table.column("profit_loss").to_pylist()], dtype=np.float64)
+    closed = ~np.isnan(pnl) & (pnl != 0)
+    stats: Dict[str, Dict[str, Any]] = {}
+    for node_id in NODE_IDS:
+        votes = np.array(table.column(f"{node_id}_recommendation").to_pylist(), dtype=object)
+        voted = np.array([v is not None for v in votes], dtype=bool)
+        agreed = voted & (votes == decision)
+        scored = voted & closed
+        correct = scored & (agreed == (pnl > 0))
+        stats[node_id] = {
+            "votes": int(voted.sum()),
+            "agreement_rate": float(agreed.sum() / voted.sum()) if voted.any() else None,
+            "closed_trades": int(scored.sum()),
+            "accuracy": float(correct.sum() / scored.sum()) if scored.any() else None,
+            "avg_pnl_when_agreed": float(pnl[agreed & closed].mean()) if (agreed & closed).any() else None,
+        }
+    return stats
+
+
+_archiver = Archiver()
+
+
+def get_archiver() -> Archiver:
+    return _archiver
@@ -0,0 +1,301 @@
+"""Content-addressed, compressed store for decision audit payloads.
+
+run_analysis captures every OpenRouter exchange (request messages and raw
+response) made for a decision; when the trade is journalled, the exchanges,
+the MarketData snapshot, the node results and the final (risk-adjusted)
+decision are written here and referenced from trade_decisions.audit_hash.
+
+Payloads are split into parts (each message, each response, the snapshot) and
+stored once per SHA-256 of their canonical JSON in audit_blobs, compressed with
+zstd (zlib when the zstandard package is not installed; the codec is recorded
+per blob). The same system prompt or a market snapshot shared by every node is
+therefore stored a single time. A decision's manifest is itself a blob that
+lists the hashes of its parts, so a lookup by decision id is one primary-key
+read for the manifest and one ANY() read for its parts. Decisions moved to the
+Parquet archive keep their audit_hash there and are looked up through it.
+
+Because parts are shared, blobs are pruned by mark and sweep: with
+AUDIT_RETENTION_DAYS set, prune() keeps every blob reachable from a decision
+still in trade_decisions or archived within the window, and deletes the rest
+once they are older than the window. created_at is therefore "last written",
+not "first written": re-writing an existing blob refreshes it, and a worker
+only skips a blob it wrote itself within half the window, so a blob a new
+decision is about to reference is never old enough to be swept.
+"""
+import contextvars
+import hashlib
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from db import get_connection
+from settings import get_settings
+
+try:
+    import zstandard
+
+    DEFAULT_CODEC = "zstd"
+except ImportError:
+    zstandard = None
+    DEFAULT_CODEC = "zlib"
+
+
+ZSTD_LEVEL = 3
+KNOWN_HASHES = 50_000
+EXPORT_BATCH = 500
+PRUNE_BATCH = 1000
+
+_exchanges: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar("audit_exchanges", default=None)
+
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def compress(raw: bytes, codec: str = DEFAULT_CODEC) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("blob is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+@contextmanager
+def capture() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the OpenRouter exchanges made inside the block (including from tasks it starts)."""
+    sink: List[Dict[str, Any]] = []
+    token = _exchanges.set(sink)
+    try:
+        yield sink
+    finally:
+        _exchanges.reset(token)
+
+
+def record_exchange(node_id: str, model: str, payload: Dict[str, Any], response: Dict[str, Any]) -> None:
+    sink = _exchanges.get()
+    if sink is not None:
+        sink.append({"node_id": node_id, "model": model, "request": payload, "response": response})
+
+
+class AuditStore:
+    def __init__(self) -> None:
+        # Hashes already known to be stored (with when this worker last wrote them), so repeated
+        # prompts are neither re-compressed nor re-sent while their created_at is still recent.
+        self._known: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, digests: List[str]) -> None:
+        with self._lock:
+            now = time.time()
+            for digest in digests:
+                self._known[digest] = now
+                self._known.move_to_end(digest)
+            while len(self._known) > KNOWN_HASHES:
+                self._known.popitem(last=False)
+
+    def _add(self, blobs: Dict[str, bytes], value: Any) -> str:
+        raw = _canonical(value)
+        digest = hashlib.sha256(raw).hexdigest()
+        blobs.setdefault(digest, raw)
+        return digest
+
+    def _manifest(self, bundle: Dict[str, Any], blobs: Dict[str, bytes]) -> Dict[str, Any]:
+        exchanges = []
+        for exchange in bundle.get("exchanges") or []:
+            request = dict(exchange["request"])
+            messages = request.pop("messages", [])
+            exchanges.append({
+                "node_id": exchange.get("node_id"),
+                "model": exchange.get("model"),
+                "messages": [self._add(blobs, message) for message in messages],
+                "request": self._add(blobs, request),
+                "response": self._add(blobs, exchange["response"]),
+            })
+        manifest: Dict[str, Any] = {"version": 1, "exchanges": exchanges}
+        for part in ("market_data", "node_results", "decision"):
+            if bundle.get(part) is not None:
+                manifest[part] = self._add(blobs, bundle[part])
+        manifest["meta"] = {k: v for k, v in bundle.items() if k not in {"exchanges", "market_data", "node_results", "decision"}}
+        return manifest
+
+    def put(self, cur: Any, bundle: Dict[str, Any]) -> Tuple[str, List[str]]:
+        """Write a bundle's new blobs with the caller's cursor, inside its transaction.
+
+        Returns the manifest hash and the hashes written; pass the latter to remember()
+        once the transaction commits, so a rolled-back write is never assumed stored.
+        """
+        blobs: Dict[str, bytes] = {}
+        manifest_hash = self._add(blobs, self._manifest(bundle, blobs))
+        retention_days = get_settings().audit_retention_days
+        # Without pruning a stored blob never needs touching again; with it, refresh at half the window.
+        stale_before = time.time() - retention_days * 86400.0 / 2 if retention_days > 0 else -float("inf")
+        with self._lock:
+            new = [
+                (digest, raw)
+                for digest, raw in blobs.items()
+                if digest not in self._known or self._known[digest] <= stale_before
+            ]
+        if new:
+            cur.executemany(
+                """
+                INSERT INTO audit_blobs (hash, codec, raw_size, data, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (hash) DO UPDATE SET created_at = EXCLUDED.created_at
+                """,
+                [(digest, DEFAULT_CODEC, len(raw), compress(raw), datetime.utcnow()) for digest, raw in new],
+            )
+        return manifest_hash, [digest for digest, _ in new]
+
+    def _fetch(self, cur: Any, digests: List[str]) -> Dict[str, Any]:
+        if not digests:
+            return {}
+        cur.execute("SELECT hash, codec, data FROM audit_blobs WHERE hash = ANY(%s)", (list(set(digests)),))
+        return {digest: json.loads(decompress(bytes(data), codec)) for digest, codec, data in cur.fetchall()}
+
+    def _expand(self, cur: Any, manifest_hash: str) -> Optional[Dict[str, Any]]:
+        manifest = self._fetch(cur, [manifest_hash]).get(manifest_hash)
+        if manifest is None:
+            return None
+        wanted = [manifest[p] for p in ("market_data", "node_results", "decision") if p in manifest]
+        for exchange in manifest["exchanges"]:
+            wanted.extend(exchange["messages"])
+            wanted.extend([exchange["request"], exchange["response"]])
+        parts = self._fetch(cur, wanted)
+        bundle: Dict[str, Any] = dict(manifest.get("meta") or {})
+        for part in ("market_data", "node_results", "decision"):
+            if part in manifest:
+                bundle[part] = parts.get(manifest[part])
+        bundle["exchanges"] = [
+            {
+                "node_id": exchange["node_id"],
+                "model": exchange["model"],
+                "request": {**(parts.get(exchange["request"]) or {}), "messages": [parts.get(h) for h in exchange["messages"]]},
+                "response": parts.get(exchange["response"]),
+            }
+            for exchange in manifest["exchanges"]
+        ]
+        bundle["audit_hash"] = manifest_hash
+        return bundle
+
+    def get_decision(self, decision_id: int) -> Optional[Dict[str, Any]]:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT audit_hash FROM trade_decisions WHERE id = %s", (decision_id,))
+                row = cur.fetchone()
+                audit_hash = row[0] if row is not None else _archived_hash(decision_id)
+                if audit_hash is None:
+                    return None
+                bundle = self._expand(cur, audit_hash)
+        if bundle is not None:
+            bundle["decision_id"] = decision_id
+        return bundle
+
+    def export(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Every audited decision in [since, until) in id order, one dict per decision."""
+        last_id = 0
+        while True:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        SELECT id, timestamp, symbol, audit_hash FROM trade_decisions
+                        WHERE id > %s AND audit_hash IS NOT NULL
+                          AND (%s::timestamp IS NULL OR timestamp >= %s)
+                          AND (%s::timestamp IS NULL OR timestamp < %s)
+                        ORDER BY id
+                        LIMIT %s
+                        """,
+                        (last_id, since, since, until, until, EXPORT_BATCH),
+                    )
+                    rows = cur.fetchall()
+                    bundles = [(row, self._expand(cur, row[3])) for row in rows]
+            for (decision_id, ts, symbol, _), bundle in bundles:
+                if bundle is not None:
+                    yield {"decision_id": decision_id, "timestamp": ts, "symbol": symbol, **bundle}
+            if len(rows) < EXPORT_BATCH:
+                return
+            last_id = rows[-1][0]
+
+    def prune(self, retention_days: float) -> Dict[str, Any]:
+        """Delete blobs older than retention_days that no retained decision still references."""
+        if retention_days <= 0:
+            return {"deleted": 0, "reason": "AUDIT_RETENTION_DAYS is not set"}
+        keep_since = datetime.utcnow() - timedelta(days=retention_days)
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT DISTINCT audit_hash FROM trade_decisions WHERE audit_hash IS NOT NULL")
+                manifests = {row[0] for row in cur.fetchall()}
+                manifests.update(_archived_hashes(keep_since))
+                live = set(manifests)
+                pending = sorted(manifests)
+                for start in range(0, len(pending), PRUNE_BATCH):
+                    for manifest in self._fetch(cur, pending[start:start + PRUNE_BATCH]).values():
+                        live.update(manifest[p] for p in ("market_data", "node_results", "decision") if p in manifest)
+                        for exchange in manifest["exchanges"]:
+                            live.update(exchange["messages"])
+                            live.update((exchange["request"], exchange["response"]))
+                # A concurrent put() that refreshes created_at holds the row lock; the DELETE waits for it
+                # and re-checks created_at, so a blob being re-referenced is never swept.
+                cur.execute(
+                    "DELETE FROM audit_blobs WHERE created_at < %s AND NOT (hash = ANY(%s))",
+                    (keep_since, list(live)),
+                )
+                deleted = cur.rowcount
+            conn.commit()
+        # No cache to clear here or on other workers: a hash any worker still skips was written
+        # within half the window, so it cannot have been old enough to delete.
+        return {"deleted": deleted, "live": len(live), "keep_since": keep_since.isoformat()}
+
+    def stats(self) -> Dict[str, Any]:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT codec, count(*), coalesce(sum(raw_size), 0), coalesce(sum(octet_length(data)), 0) FROM audit_blobs GROUP BY codec")
+                rows = cur.fetchall()
+        codecs = {codec: {"blobs": count, "raw_bytes": int(raw), "stored_bytes": int(stored)} for codec, count, raw, stored in rows}
+        raw_total = sum(c["raw_bytes"] for c in codecs.values())
+        stored_total = sum(c["stored_bytes"] for c in codecs.values())
+        return {
+            "codec": DEFAULT_CODEC,
+            "codecs": codecs,
+            "compression_ratio": raw_total / stored_total if stored_total else None,
+        }
+
+
+def _archived_hash(decision_id: int) -> Optional[str]:
+    import archive
+
+    try:
+        table = archive.scan(["id", "audit_hash"], ids=[decision_id], limit=1)
+    except RuntimeError:
+        # Without pyarrow nothing can have been archived.
+        return None
+    hashes = table.column("audit_hash").to_pylist()
+    return hashes[0] if hashes else None
+
+
+def _archived_hashes(since: datetime) -> List[str]:
+    import archive
+
+    try:
+        table = archive.scan(["audit_hash"], since=since)
+    except RuntimeError:
+        return []
+    return [h for h in table.column("audit_hash").to_pylist() if h]
+
+
+_store = AuditStore()
+
+
+def get_store() -> AuditStore:
+    return _store
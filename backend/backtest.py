@@ -0,0 +1,485 @@
+"""Historical backtest of the decision pipeline over daily bars.
+
+Indicators, node votes and vote aggregation are computed as whole-series NumPy
+arrays; only the (sparse) actionable bars go through risk_manager. Signals are
+computed per symbol on a process pool; fills then run in date order across all
+symbols against one cash balance, so the combined P&L curve respects the
+initial capital.
+
+    python backtest.py --symbols AAPL,MSFT --csv-dir ./bars --years 5
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import orchestrator
+import risk_manager
+from schemas import FinalDecision, MarketData
+from settings import Settings, reload as reload_settings
+
+
+NODE_IDS: List[str] = list(orchestrator.DEFAULT_WEIGHTS)
+
+
+@dataclass
+class Bars:
+    symbol: str
+    dates: np.ndarray  # datetime64[D], ascending
+    close: np.ndarray
+    volume: np.ndarray
+
+
+@dataclass
+class BacktestConfig:
+    algo: str = "weighted_majority"
+    threshold: float = 0.6
+    weights: Dict[str, float] = field(default_factory=lambda: dict(orchestrator.DEFAULT_WEIGHTS))
+    initial_capital: float = 100000.0
+    # Risk limits applied to each fill; a plain Settings() gives the documented defaults.
+    settings: Settings = field(default_factory=Settings)
+
+    @classmethod
+    def from_env(cls) -> "BacktestConfig":
+        settings = reload_settings(use_db=False)
+        return cls(
+            algo=settings.decision_algorithm,
+            threshold=settings.confidence_threshold,
+            initial_capital=settings.account_equity,
+            settings=settings,
+        )
+
+
+@dataclass
+class SymbolResult:
+    symbol: str
+    dates: np.ndarray
+    pnl_curve: np.ndarray
+    realized_pnl: float
+    trades: int
+    node_entry_pnl: np.ndarray
+    node_hits: np.ndarray
+    node_votes: np.ndarray
+
+
+def _ewm(values: np.ndarray, alpha: float) -> np.ndarray:
+    # Recursive y[t] = alpha * x[t] + (1 - alpha) * y[t-1], seeded with y[0] = x[0].
+    return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def _rolling(values: np.ndarray, window: int, fn) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        out[window - 1:] = fn(np.lib.stride_tricks.sliding_window_view(values, window), axis=-1)
+    return out
+
+
+def _pct_change(values: np.ndarray, periods: int) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    out[periods:] = values[periods:] / values[:-periods] - 1.0
+    return out
+
+
+def compute_indicators(close: np.ndarray) -> Dict[str, np.ndarray]:
+    delta = np.diff(close, prepend=close[0])
+    avg_gain = _ewm(np.clip(delta, 0.0, None), 1.0 / 14)
+    avg_loss = _ewm(np.clip(-delta, 0.0, None), 1.0 / 14)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(avg_loss > 0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss), 100.0)
+    macd = _ewm(close, 2.0 / 13) - _ewm(close, 2.0 / 27)
+    signal = _ewm(macd, 2.0 / 10)
+    sma20 = _rolling(close, 20, np.mean)
+    std20 = _rolling(close, 20, np.std)
+    returns = np.diff(close, prepend=close[0]) / close
+    return {
+        "rsi_14": rsi,
+        "macd": macd,
+        "macd_signal": signal,
+        "bb_upper": sma20 + 2.0 * std20,
+        "bb_lower": sma20 - 2.0 * std20,
+        "sma_200": _rolling(close, 200, np.mean),
+        "volatility_20d": _rolling(returns, 20, np.std) * np.sqrt(252.0),
+        "change_5d": _pct_change(close, 5),
+        "change_20d": _pct_change(close, 20),
+    }
+
+
+def stub_node_votes(close: np.ndarray, indicators: Dict[str, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Deterministic indicator proxies for the five LLM nodes, as (T, n_nodes) codes and confidences."""
+    t = len(close)
+    codes = np.zeros((t, len(NODE_IDS)), dtype=np.int8)
+    confs = np.full((t, len(NODE_IDS)), 0.5)
+    col = {node_id: i for i, node_id in enumerate(NODE_IDS)}
+
+    rsi, macd, signal = indicators["rsi_14"], indicators["macd"], indicators["macd_signal"]
+    i = col["technical_analysis"]
+    codes[:, i] = np.where((macd > signal) & (rsi < 70), 1, np.where((macd < signal) & (rsi > 30), -1, 0))
+    confs[:, i] = 0.5 + 0.5 * np.minimum(1.0, np.abs(rsi - 50.0) / 30.0)
+
+    sma = indicators["sma_200"]
+    i = col["fundamental_analysis"]
+    codes[:, i] = np.where(np.isnan(sma), 0, np.where(close > sma, 1, -1))
+    confs[:, i] = np.where(np.isnan(sma), 0.5, 0.65)
+
+    change_20d = np.nan_to_num(indicators["change_20d"])
+    i = col["sentiment_analysis"]
+    codes[:, i] = np.sign(change_20d).astype(np.int8)
+    confs[:, i] = np.minimum(1.0, 0.5 + np.abs(change_20d) * 2.0)
+
+    vol = indicators["volatility_20d"]
+    i = col["risk_evaluation"]
+    codes[:, i] = np.where(vol < 0.25, 1, np.where(vol > 0.45, -1, 0))
+    confs[:, i] = np.where(codes[:, i] != 0, 0.7, 0.5)
+
+    change_5d = np.nan_to_num(indicators["change_5d"])
+    i = col["momentum_analysis"]
+    codes[:, i] = np.where(change_5d > 0.02, 1, np.where(change_5d < -0.02, -1, 0))
+    confs[:, i] = np.minimum(1.0, 0.5 + np.abs(change_5d) * 5.0)
+    return codes, confs
+
+
+def recorded_node_votes(
+    dates: np.ndarray,
+    recorded: Dict[str, List[Dict[str, Any]]],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Votes stored in trade_decisions keyed by ISO date; days without a record are HOLD/0.5 like a node fallback."""
+    codes = np.zeros((len(dates), len(NODE_IDS)), dtype=np.int8)
+    confs = np.full((len(dates), len(NODE_IDS)), 0.5)
+    col = {node_id: i for i, node_id in enumerate(NODE_IDS)}
+    for r, day in enumerate(dates.astype(str)):
+        for vote in recorded.get(day, []):
+            c = col.get(vote.get("node_id"))
+            if c is None:
+                continue
+            codes[r, c] = orchestrator.VOTE_CODES.get(vote.get("recommendation"), 0)
+            confs[r, c] = float(vote.get("confidence", 0.5))
+    return codes, confs
+
+
+@dataclass
+class SymbolSignals:
+    symbol: str
+    dates: np.ndarray
+    close: np.ndarray
+    # Actionable bars after risk_manager: bar index, +1 BUY / -1 SELL, dollar size, nodes voting BUY.
+    events: np.ndarray
+    sides: np.ndarray
+    sizes: np.ndarray
+    backers: np.ndarray
+    node_hits: np.ndarray
+    node_votes: np.ndarray
+
+
+def symbol_signals(
+    bars: Bars,
+    config: BacktestConfig,
+    recorded: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> SymbolSignals:
+    """Votes, aggregation and per-trade risk sizing for one symbol; fills are left to simulate_portfolio."""
+    close = bars.close
+    n_nodes = len(NODE_IDS)
+    if len(close) == 0:
+        return SymbolSignals(
+            bars.symbol, bars.dates, close, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int8),
+            np.zeros(0), np.zeros((0, n_nodes), dtype=bool), np.zeros(n_nodes, dtype=np.int64), np.zeros(n_nodes, dtype=np.int64),
+        )
+    if recorded is None:
+        codes, confs = stub_node_votes(close, compute_indicators(close))
+    else:
+        codes, confs = recorded_node_votes(bars.dates, recorded)
+    weights = np.array([config.weights.get(node_id, 0.0) for node_id in NODE_IDS])
+    decision, agg_conf = orchestrator.aggregate_votes(codes, confs, weights, config.threshold, config.algo)
+
+    events = np.flatnonzero(decision != 0)
+    sizes = np.zeros(len(events))
+    for k, t in enumerate(events):
+        side = orchestrator.DECISIONS_BY_CODE[int(decision[t])]
+        final = FinalDecision.model_construct(
+            final_decision=side,
+            aggregate_confidence=float(agg_conf[t]),
+            votes={},
+            node_results=[],
+        )
+        market_data = MarketData.model_construct(symbol=bars.symbol, timestamp=str(bars.dates[t]), current_price=float(close[t]))
+        final = risk_manager.apply_risk_filters(final, market_data, config.settings)
+        sizes[k] = final.recommended_position_size or 0.0
+
+    forward = np.sign(np.append(np.diff(close), 0.0))[:, None]
+    voted = codes != 0
+    return SymbolSignals(
+        symbol=bars.symbol,
+        dates=bars.dates,
+        close=close,
+        events=events,
+        sides=decision[events].astype(np.int8),
+        sizes=sizes,
+        backers=codes[events] == 1,
+        node_hits=(voted[:-1] & (codes[:-1] == forward[:-1])).sum(axis=0),
+        node_votes=voted[:-1].sum(axis=0),
+    )
+
+
+def simulate_portfolio(signals: Sequence[SymbolSignals], config: BacktestConfig) -> List[SymbolResult]:
+    """Fill every symbol's signals in date order against one cash balance.
+
+    Long only and unlevered: a BUY is cut to the cash on hand, so gross exposure never
+    exceeds equity, and new entries stop at MAX_CONCURRENT_POSITIONS open symbols.
+    """
+    n_nodes = len(NODE_IDS)
+    symbol_idx = np.concatenate([np.full(len(sig.events), i) for i, sig in enumerate(signals)] or [np.zeros(0, dtype=np.int64)])
+    event_idx = np.concatenate([np.arange(len(sig.events)) for sig in signals] or [np.zeros(0, dtype=np.int64)])
+    event_dates = np.concatenate(
+        [sig.dates[sig.events] for sig in signals] or [np.zeros(0, dtype="datetime64[D]")]
+    ).astype("datetime64[D]")
+    # Same-day sells run first so the cash they free is available to that day's buys.
+    event_sides = np.concatenate([sig.sides for sig in signals] or [np.zeros(0, dtype=np.int8)])
+    order = np.lexsort((symbol_idx, event_sides, event_dates))
+
+    cash = config.initial_capital
+    max_positions = config.settings.max_concurrent_positions
+    qty = np.zeros(len(signals))
+    avg_price = np.zeros(len(signals))
+    support = np.zeros((len(signals), n_nodes))
+    d_qty = [np.zeros(len(sig.close)) for sig in signals]
+    d_cash = [np.zeros(len(sig.close)) for sig in signals]
+    realized = np.zeros(len(signals))
+    node_entry_pnl = np.zeros((len(signals), n_nodes))
+    trades = np.zeros(len(signals), dtype=np.int64)
+    for e in order:
+        i, k = int(symbol_idx[e]), int(event_idx[e])
+        sig = signals[i]
+        t = int(sig.events[k])
+        price = float(sig.close[t])
+        if sig.sides[k] > 0:
+            if qty[i] <= 0 and np.count_nonzero(qty > 0) >= max_positions:
+                continue
+            n = float(int(min(sig.sizes[k], cash) // price))
+            if n <= 0:
+                continue
+            avg_price[i] = (qty[i] * avg_price[i] + n * price) / (qty[i] + n)
+            qty[i] += n
+            support[i] += n * sig.backers[k]
+            cash -= n * price
+            d_qty[i][t] += n
+            d_cash[i][t] -= n * price
+            trades[i] += 1
+        elif qty[i] > 0:
+            sold = min(float(int(sig.sizes[k] // price)), qty[i])
+            if sold <= 0:
+                continue
+            pnl = (price - avg_price[i]) * sold
+            realized[i] += pnl
+            # Credit the round trip to the nodes that backed the entries, share-weighted.
+            node_entry_pnl[i] += pnl * support[i] / qty[i]
+            support[i] *= (qty[i] - sold) / qty[i]
+            qty[i] -= sold
+            cash += sold * price
+            d_qty[i][t] -= sold
+            d_cash[i][t] += sold * price
+            trades[i] += 1
+
+    return [
+        SymbolResult(
+            symbol=sig.symbol,
+            dates=sig.dates,
+            pnl_curve=np.cumsum(d_cash[i]) + np.cumsum(d_qty[i]) * sig.close,
+            realized_pnl=float(realized[i]),
+            trades=int(trades[i]),
+            node_entry_pnl=node_entry_pnl[i],
+            node_hits=sig.node_hits,
+            node_votes=sig.node_votes,
+        )
+        for i, sig in enumerate(signals)
+    ]
+
+
+def simulate_symbol(
+    bars: Bars,
+    config: BacktestConfig,
+    recorded: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+) -> SymbolResult:
+    """A single symbol traded alone against config.initial_capital."""
+    return simulate_portfolio([symbol_signals(bars, config, recorded)], config)[0]
+
+
+def _signals_job(job: Tuple[Bars, BacktestConfig, Optional[Dict[str, List[Dict[str, Any]]]]]) -> SymbolSignals:
+    return symbol_signals(*job)
+
+
+def combine_results(results: Sequence[SymbolResult], initial_capital: float) -> Dict[str, Any]:
+    results = [r for r in results if len(r.dates)]
+    if not results:
+        return {"symbols": 0, "trades": 0}
+    all_dates = np.unique(np.concatenate([r.dates for r in results]))
+    portfolio = np.zeros(len(all_dates))
+    for r in results:
+        idx = np.searchsorted(r.dates, all_dates, side="right") - 1
+        portfolio += np.where(idx >= 0, r.pnl_curve[np.clip(idx, 0, None)], 0.0)
+    equity = initial_capital + portfolio
+    peak = np.maximum.accumulate(equity)
+    drawdown = (equity - peak) / peak
+
+    entry_pnl = np.sum([r.node_entry_pnl for r in results], axis=0)
+    hits = np.sum([r.node_hits for r in results], axis=0)
+    votes = np.sum([r.node_votes for r in results], axis=0)
+    return {
+        "symbols": len(results),
+        "start": str(all_dates[0]),
+        "end": str(all_dates[-1]),
+        "total_pnl": float(portfolio[-1]),
+        "realized_pnl": float(sum(r.realized_pnl for r in results)),
+        "final_equity": float(equity[-1]),
+        "max_drawdown": float(drawdown.min()),
+        "trades": int(sum(r.trades for r in results)),
+        "per_symbol": {
+            r.symbol: {"pnl": float(r.pnl_curve[-1]), "realized_pnl": r.realized_pnl, "trades": r.trades}
+            for r in results
+        },
+        "node_attribution": {
+            node_id: {
+                "entry_pnl": float(entry_pnl[i]),
+                "hit_rate": float(hits[i] / votes[i]) if votes[i] else None,
+                "votes": int(votes[i]),
+            }
+            for i, node_id in enumerate(NODE_IDS)
+        },
+    }
+
+
+def run_backtest(
+    bars: Sequence[Bars],
+    config: Optional[BacktestConfig] = None,
+    recorded: Optional[Dict[str, Dict[str, List[Dict[str, Any]]]]] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Backtest every symbol in bars; recorded maps symbol -> ISO date -> node_votes, otherwise stub votes are used."""
+    config = config or BacktestConfig.from_env()
+    jobs = [(b, config, (recorded or {}).get(b.symbol, {}) if recorded is not None else None) for b in bars]
+    started = time.perf_counter()
+    if workers == 0 or len(jobs) <= 1:
+        signals = [_signals_job(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            signals = list(pool.map(_signals_job, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+    results = simulate_portfolio(signals, config)
+    summary = combine_results(results, config.initial_capital)
+    summary["elapsed_seconds"] = time.perf_counter() - started
+    return summary
+
+
+def _trim(bars: Bars, years: Optional[float]) -> Bars:
+    if not years or len(bars.dates) == 0:
+        return bars
+    cutoff = bars.dates[-1] - np.timedelta64(int(years * 365.25), "D")
+    keep = bars.dates >= cutoff
+    return Bars(bars.symbol, bars.dates[keep], bars.close[keep], bars.volume[keep])
+
+
+def load_bars_csv(path: str, symbol: str, years: Optional[float] = None) -> Bars:
+    """Read daily bars from a CSV with date/timestamp, close (or adjusted_close) and optional volume columns."""
+    rows: List[Tuple[str, float, float]] = []
+    with open(path, newline="") as fh:
+        for row in csv.DictReader(fh):
+            day = row.get("date") or row.get("timestamp")
+            price = row.get("adjusted_close") or row.get("close")
+            if not day or not price:
+                continue
+            rows.append((day[:10], float(price), float(row.get("volume") or 0.0)))
+    rows.sort()
+    return _trim(
+        Bars(
+            symbol=symbol,
+            dates=np.array([r[0] for r in rows], dtype="datetime64[D]"),
+            close=np.array([r[1] for r in rows]),
+            volume=np.array([r[2] for r in rows]),
+        ),
+        years,
+    )
+
+
+async def fetch_daily_bars(symbol: str, years: Optional[float] = None) -> Bars:
+    from nodes.data_fetcher import _get
+
+    data = await _get({
+        "function": "TIME_SERIES_DAILY_ADJUSTED",
+        "symbol": symbol,
+        "outputsize": "full",
+    })
+    series = data.get("Time Series (Daily)") or {}
+    days = sorted(series)
+    return _trim(
+        Bars(
+            symbol=symbol,
+            dates=np.array(days, dtype="datetime64[D]"),
+            close=np.array([float(series[d]["4. close"]) for d in days]),
+            volume=np.array([float(series[d].get("6. volume") or 0.0) for d in days]),
+        ),
+        years,
+    )
+
+
+def load_recorded_votes(symbols: Sequence[str]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
+    from db import get_connection
+
+    recorded: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT symbol, timestamp::date, node_votes
+                FROM trade_decisions
+                WHERE symbol = ANY(%s)
+                ORDER BY timestamp
+                """,
+                (list(symbols),),
+            )
+            for symbol, day, node_votes in cur.fetchall():
+                recorded.setdefault(symbol, {})[day.isoformat()] = node_votes or []
+    # Months moved out of the hot table by the archiver; live rows win on the same day.
+    try:
+        import archive
+
+        columns = ["symbol", "timestamp"] + [
+            f"{node_id}_{part}" for node_id in archive.NODE_IDS for part in ("recommendation", "confidence", "model")
+        ] + ["extra_votes"]
+        for row in archive.scan(columns, symbols=symbols).to_pylist():
+            recorded.setdefault(row["symbol"], {}).setdefault(row["timestamp"].date().isoformat(), archive.votes_from_row(row))
+    except RuntimeError:
+        pass
+    return recorded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest the decision pipeline over daily bars")
+    parser.add_argument("--symbols", required=True, help="comma separated symbols")
+    parser.add_argument("--csv-dir", help="directory with <SYMBOL>.csv files; Alpha Vantage is used when omitted")
+    parser.add_argument("--years", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=None, help="process pool size, 0 runs in-process")
+    parser.add_argument("--votes", choices=["stub", "recorded"], default="stub")
+    parser.add_argument("--output", help="write the JSON report to this path")
+    args = parser.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    if args.csv_dir:
+        bars = [load_bars_csv(os.path.join(args.csv_dir, f"{s}.csv"), s, args.years) for s in symbols]
+    else:
+        bars = [asyncio.run(fetch_daily_bars(s, args.years)) for s in symbols]
+    recorded = load_recorded_votes(symbols) if args.votes == "recorded" else None
+
+    report = json.dumps(run_backtest(bars, recorded=recorded, workers=args.workers), indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
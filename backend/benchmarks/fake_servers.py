@@ -0,0 +1,210 @@
+"""Local stand-ins for the OpenRouter and Alpha Vantage HTTP APIs."""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeServerConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    # Number of bars / models / news items returned per response.
+    response_size: int = 100
+    seed: Optional[int] = 0
+
+
+class _Behaviour:
+    def __init__(self, config: FakeServerConfig) -> None:
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.requests = 0
+
+    async def delay_or_fail(self) -> Optional[JSONResponse]:
+        self.requests += 1
+        delay = max(0.0, self.config.latency_ms + self.random.uniform(-1, 1) * self.config.jitter_ms)
+        await asyncio.sleep(delay / 1000.0)
+        if self.random.random() < self.config.error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        return None
+
+
+def openrouter_app(config: FakeServerConfig) -> FastAPI:
+    app = FastAPI()
+    behaviour = _Behaviour(config)
+    app.state.behaviour = behaviour
+
+    @app.post("/chat/completions")
+    async def chat(request: Request) -> Any:
+        failure = await behaviour.delay_or_fail()
+        if failure is not None:
+            return failure
+        body = await request.json()
+        recommendation = behaviour.random.choice(["BUY", "SELL", "HOLD"])
+        content = json.dumps({
+            "recommendation": recommendation,
+            "confidence": round(behaviour.random.uniform(0.4, 0.95), 2),
+            "reasoning": "benchmark stand-in response",
+            "target_price": None,
+            "stop_loss": None,
+            "holding_period": "1w",
+        })
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        return {
+            "id": f"gen-{behaviour.requests}",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (prompt_chars + len(content)) // 4,
+            },
+        }
+
+    @app.get("/models")
+    async def models() -> Any:
+        failure = await behaviour.delay_or_fail()
+        if failure is not None:
+            return failure
+        data = [
+            {
+                "id": f"vendor/model-{i}{':free' if i % 3 == 0 else ''}",
+                "pricing": {"prompt": 0 if i % 3 == 0 else 0.000001 * i, "completion": 0 if i % 3 == 0 else 0.000002 * i},
+            }
+            for i in range(config.response_size)
+        ]
+        return {"data": data}
+
+    return app
+
+
+def _series(days: int, start_price: float, rng: random.Random, intraday: bool = False) -> Dict[str, Dict[str, str]]:
+    series: Dict[str, Dict[str, str]] = {}
+    price = start_price
+    now = datetime(2024, 6, 28, 16, 0)
+    for i in range(days):
+        price *= 1.0 + rng.gauss(0.0, 0.01)
+        ts = now - (timedelta(minutes=5 * i) if intraday else timedelta(days=i))
+        key = ts.strftime("%Y-%m-%d %H:%M:%S") if intraday else ts.date().isoformat()
+        series[key] = {
+            "1. open": f"{price:.4f}",
+            "2. high": f"{price * 1.01:.4f}",
+            "3. low": f"{price * 0.99:.4f}",
+            "4. close": f"{price:.4f}",
+            "5. adjusted close": f"{price:.4f}",
+            "6. volume": str(rng.randint(100_000, 5_000_000)),
+        }
+    return series
+
+
+def alphavantage_app(config: FakeServerConfig) -> FastAPI:
+    app = FastAPI()
+    behaviour = _Behaviour(config)
+    app.state.behaviour = behaviour
+
+    # httpx requests base_url "" as "/query/"; accept both spellings.
+    @app.get("/query")
+    @app.get("/query/")
+    async def query(request: Request) -> Any:
+        failure = await behaviour.delay_or_fail()
+        if failure is not None:
+            return failure
+        params = request.query_params
+        function = params.get("function")
+        symbol = params.get("symbol") or params.get("tickers") or "X"
+        rng = random.Random(f"{symbol}:{function}")
+        size = config.response_size
+        day = date(2024, 6, 28)
+        if function == "TIME_SERIES_INTRADAY":
+            interval = params.get("interval", "5min")
+            return {f"Time Series ({interval})": _series(size, 100.0, rng, intraday=True)}
+        if function == "TIME_SERIES_DAILY_ADJUSTED":
+            return {"Time Series (Daily)": _series(size, 100.0, rng)}
+        if function == "RSI":
+            return {"Technical Analysis: RSI": {
+                (day - timedelta(days=i)).isoformat(): {"RSI": f"{rng.uniform(20, 80):.4f}"} for i in range(size)
+            }}
+        if function == "MACD":
+            return {"Technical Analysis: MACD": {
+                (day - timedelta(days=i)).isoformat(): {
+                    "MACD": f"{rng.gauss(0, 1):.4f}",
+                    "MACD_Signal": f"{rng.gauss(0, 1):.4f}",
+                    "MACD_Hist": f"{rng.gauss(0, 0.5):.4f}",
+                }
+                for i in range(size)
+            }}
+        if function == "BBANDS":
+            return {"Technical Analysis: BBANDS": {
+                (day - timedelta(days=i)).isoformat(): {
+                    "Real Upper Band": f"{105 + rng.random():.4f}",
+                    "Real Middle Band": "100.0000",
+                    "Real Lower Band": f"{95 - rng.random():.4f}",
+                }
+                for i in range(size)
+            }}
+        if function == "OVERVIEW":
+            return {"Symbol": symbol, "PERatio": f"{rng.uniform(5, 40):.2f}", "MarketCapitalization": str(rng.randint(10**9, 10**12))}
+        if function == "GLOBAL_QUOTE":
+            return {"Global Quote": {"01. symbol": symbol, "05. price": f"{rng.uniform(50, 150):.4f}", "07. latest trading day": day.isoformat()}}
+        if function == "REALTIME_BULK_QUOTES":
+            return {"data": [
+                {"symbol": s, "timestamp": f"{day.isoformat()} 16:00:00", "close": f"{random.Random(s).uniform(50, 150):.4f}"}
+                for s in symbol.split(",")
+            ]}
+        if function == "NEWS_SENTIMENT":
+            limit = int(params.get("limit", "5"))
+            return {"feed": [
+                {"title": f"{symbol} headline {i}", "overall_sentiment_score": f"{rng.uniform(-1, 1):.4f}"}
+                for i in range(min(limit, size))
+            ]}
+        return {"Note": f"unsupported function {function}"}
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn on a background thread."""
+
+    def __init__(self, app: FastAPI, port: Optional[int] = None) -> None:
+        self.app = app
+        self.port = port or free_port()
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="off")
+        )
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ServerThread":
+        self._thread.start()
+        deadline = time.time() + 10.0
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("fake server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=5.0)
+
+    def request_count(self) -> int:
+        return self.app.state.behaviour.requests
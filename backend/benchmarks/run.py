@@ -0,0 +1,230 @@
+"""Benchmark the backend against local OpenRouter / Alpha Vantage stand-ins.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --requests 50 --concurrency 10 --latency-ms 80
+    python -m benchmarks.run --compare benchmarks/results/<older>.json
+
+Measures /analyze/{symbol} and /trade/{symbol} latency percentiles, polling-cycle
+throughput versus watchlist size and event-loop blocking, and writes a JSON
+report that later runs can be compared against.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+import settings
+from benchmarks.fake_servers import FakeServerConfig, ServerThread, alphavantage_app, openrouter_app
+from benchmarks.serialization import bench_serialization
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping task; lag means something blocked the loop."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def __enter__(self) -> "LoopLagMonitor":
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    def summary(self) -> Dict[str, float]:
+        lags = np.array(self.lags or [0.0]) * 1000.0
+        return {
+            "max_lag_ms": float(lags.max()),
+            "p99_lag_ms": float(np.percentile(lags, 99)),
+            "blocked_ms": float(lags[lags > 1.0].sum()),
+        }
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.array(samples) * 1000.0
+    return {
+        "count": int(values.size),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+        "mean_ms": float(values.mean()),
+    }
+
+
+async def _timed_calls(call: Callable[[int], Awaitable[Any]], total: int, concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call(i)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    with LoopLagMonitor() as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall = time.perf_counter() - started
+    result: Dict[str, Any] = _percentiles(latencies) if latencies else {"count": 0}
+    result.update({"errors": errors, "wall_seconds": wall, "throughput_rps": total / wall if wall else 0.0})
+    result["event_loop"] = monitor.summary()
+    return result
+
+
+async def bench_endpoint(path_template: str, total: int, concurrency: int) -> Dict[str, Any]:
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300.0) as client:
+        async def call(i: int) -> None:
+            response = await client.post(path_template.format(symbol=f"SYM{i % 20}"))
+            response.raise_for_status()
+
+        return await _timed_calls(call, total, concurrency)
+
+
+async def bench_polling(watchlist_sizes: List[int]) -> Dict[str, Any]:
+    import main
+
+    results: Dict[str, Any] = {}
+    for size in watchlist_sizes:
+        symbols = [f"W{i}" for i in range(size)]
+        with LoopLagMonitor() as monitor:
+            started = time.perf_counter()
+            await main._run_cycle(symbols, [], auto_trade=True)
+            elapsed = time.perf_counter() - started
+        results[str(size)] = {
+            "cycle_seconds": elapsed,
+            "symbols_per_second": size / elapsed if elapsed else 0.0,
+            "event_loop": monitor.summary(),
+        }
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _flatten(prefix: str, value: Any, out: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, item, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    now: Dict[str, float] = {}
+    before: Dict[str, float] = {}
+    _flatten("", current["results"], now)
+    _flatten("", baseline["results"], before)
+    diff: Dict[str, Dict[str, float]] = {}
+    for key, value in now.items():
+        if key in before and before[key]:
+            diff[key] = {"baseline": before[key], "current": value, "change_pct": (value - before[key]) / before[key] * 100.0}
+    return diff
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    config = FakeServerConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        response_size=args.response_size,
+    )
+    with ServerThread(openrouter_app(config)) as openrouter, ServerThread(alphavantage_app(config)) as alphavantage:
+        os.environ.update({
+            "OPENROUTER_BASE_URL": openrouter.url,
+            "OPENROUTER_API_KEY": "bench",
+            "ALPHA_VANTAGE_BASE_URL": f"{alphavantage.url}/query",
+            "ALPHA_VANTAGE_API_KEY": "bench",
+            "TRADING_MODE": "simulated",
+        })
+        # Env only: an app_settings override (e.g. TRADING_MODE=live) must not leak into a benchmark.
+        settings.reload(use_db=False)
+        results = {
+            "analyze": await bench_endpoint("/analyze/{symbol}", args.requests, args.concurrency),
+            "trade": await bench_endpoint("/trade/{symbol}", args.requests, args.concurrency),
+            "polling": await bench_polling([int(s) for s in args.watchlist_sizes.split(",")]),
+            "serialization": bench_serialization(),
+            "upstream_requests": {
+                "openrouter": openrouter.request_count(),
+                "alphavantage": alphavantage.request_count(),
+            },
+        }
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": vars(args),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backend benchmark suite")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--response-size", type=int, default=100)
+    parser.add_argument("--watchlist-sizes", default="1,5,10,25")
+    parser.add_argument("--output", help="report path, defaults to benchmarks/results/<commit>-<time>.json")
+    parser.add_argument("--compare", help="baseline report to diff against")
+    args = parser.parse_args()
+
+    # Keep the run hermetic: no DB-backed weights, no replay, no webhooks, fast simulated fills.
+    os.environ.setdefault("NODE_WEIGHTING", "static")
+    os.environ.setdefault("CASSETTE_MODE", "off")
+    os.environ.setdefault("DISCORD_ENABLED", "false")
+    os.environ.setdefault("SIM_FILL_LATENCY_MS", "5")
+
+    report = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as fh:
+            report["comparison"] = compare(report, json.load(fh))
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{report['commit']}-{stamp}.json")
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Per-decision CPU time of the serialization path, before and after the fast path.
+
+Run from the backend directory:
+
+    python -m benchmarks.serialization --iterations 2000
+
+"before" replays what a decision used to cost: five MarketData.json() calls for
+the node prompts plus one for the single-flight fingerprint, a validated
+FinalDecision, FastAPI's response_model round trip (dump, validate, serialize,
+json.dumps), json.dumps of node_votes and one MarketData dump for the audit
+record. "after" is the current code: one cached MarketData encoding,
+model_construct, model_response, the orjson-backed encoders and the same audit
+dump. /trades/recent is measured for 50 rows: per-row dicts plus List[Dict]
+response validation and json.dumps, versus dicts built from the cursor tuples
+and FastJSONResponse.
+Times are process CPU time, in microseconds per operation.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+from pydantic import TypeAdapter
+
+import serialization
+from schemas import (
+    MACD,
+    FinalDecision,
+    Fundamentals,
+    MarketData,
+    NewsSentimentItem,
+    NodeRecommendation,
+    TechnicalIndicators,
+    TradeResponse,
+)
+
+
+NODE_IDS = ("technical_analysis", "fundamental_analysis", "sentiment_analysis", "risk_evaluation", "momentum_analysis")
+
+
+def _market_data_kwargs() -> Dict[str, Any]:
+    return {
+        "symbol": "AAPL",
+        "timestamp": "2026-10-16T16:00:00",
+        "current_price": 231.47,
+        "price_change_1d": 0.84,
+        "price_change_1w": -1.92,
+        "volume": 48213000,
+        "volume_avg_30d": 52340000,
+        "technical_indicators": TechnicalIndicators(rsi_14=58.3, macd=MACD(value=1.21, signal=0.97), bb_upper=238.1, bb_lower=221.6),
+        "fundamentals": Fundamentals(pe_ratio=35.2, market_cap=3.51e12),
+        "news_sentiment": [
+            NewsSentimentItem(headline=f"Apple supplier update number {i} moves shares", sentiment_score=0.05 * i - 0.1)
+            for i in range(5)
+        ],
+    }
+
+
+def _node_results() -> List[NodeRecommendation]:
+    return [
+        NodeRecommendation(
+            node_id=node_id,
+            model="openai/gpt-4o-mini",
+            recommendation=("BUY", "HOLD", "SELL")[i % 3],
+            confidence=0.55 + 0.05 * i,
+            reasoning="Momentum and breadth improved while valuation stays stretched; " * 3,
+            target_price=245.0,
+            stop_loss=220.0,
+            holding_period="2w",
+        )
+        for i, node_id in enumerate(NODE_IDS)
+    ]
+
+
+def _decision_fields(node_results: List[NodeRecommendation]) -> Dict[str, Any]:
+    return {
+        "final_decision": "BUY",
+        "aggregate_confidence": 0.64,
+        "votes": {"BUY": 2, "SELL": 1, "HOLD": 2},
+        "dissenting_opinions": [{"node": r.node_id, "reason": r.reasoning} for r in node_results[1:]],
+        "recommended_position_size": None,
+        "target_price": 245.0,
+        "stop_loss": 220.0,
+        "node_results": node_results,
+    }
+
+
+def _node_votes(decision: FinalDecision) -> List[Dict[str, Any]]:
+    return [
+        {"node_id": n.node_id, "model": n.model, "recommendation": n.recommendation, "confidence": n.confidence}
+        for n in decision.node_results
+    ]
+
+
+_TRADE_ADAPTER = TypeAdapter(TradeResponse)
+_ROWS_ADAPTER = TypeAdapter(List[Dict[str, Any]])
+
+
+def decision_before(node_results: List[NodeRecommendation]) -> bytes:
+    market_data = MarketData(**_market_data_kwargs())
+    prompts = [market_data.model_dump_json() for _ in NODE_IDS]
+    fingerprint = market_data.model_dump_json()
+    decision = FinalDecision(**_decision_fields(node_results))
+    response = TradeResponse(symbol=market_data.symbol, decision=decision, order_id="sim-1", trace_id="t" * 32)
+    # FastAPI's response_model path: dump, validate against the model, serialize, json.dumps.
+    validated = _TRADE_ADAPTER.validate_python(response.model_dump())
+    body = json.dumps(_TRADE_ADAPTER.dump_python(validated, mode="json"), separators=(",", ":")).encode("utf-8")
+    json.dumps(_node_votes(decision))
+    audit = {"market_data": market_data.model_dump(mode="json")}
+    assert prompts and fingerprint
+    return body
+
+
+def decision_after(node_results: List[NodeRecommendation]) -> bytes:
+    market_data = MarketData(**_market_data_kwargs())
+    prompts = [market_data.cached_json() for _ in NODE_IDS]
+    fingerprint = market_data.cached_json()
+    decision = FinalDecision.model_construct(**_decision_fields(node_results))
+    response = TradeResponse.model_construct(symbol=market_data.symbol, decision=decision, order_id="sim-1", trace_id="t" * 32)
+    body = serialization.model_response(response).body
+    serialization.dumps_text(_node_votes(decision))
+    audit = {"market_data": market_data.model_dump(mode="json")}
+    assert prompts and fingerprint
+    return body
+
+
+def _trade_rows(n: int) -> List[Tuple[Any, ...]]:
+    now = datetime(2026, 10, 16, 16, 0)
+    votes = [{"node_id": node_id, "model": "m", "recommendation": "BUY", "confidence": 0.7} for node_id in NODE_IDS]
+    return [
+        (i, now - timedelta(minutes=i), "AAPL", "BUY", 0.64, 231.0 + i, None, None, timedelta(hours=3), votes)
+        for i in range(n)
+    ]
+
+
+def recent_before(rows: List[Tuple[Any, ...]]) -> bytes:
+    results: List[Dict[str, Any]] = []
+    for row in rows:
+        (trade_id, ts, symbol, decision, confidence, entry, exit_price, pnl, holding, votes) = row
+        results.append({
+            "id": trade_id,
+            "timestamp": ts.isoformat(),
+            "symbol": symbol,
+            "decision": decision,
+            "aggregate_confidence": confidence,
+            "entry_price": entry,
+            "exit_price": exit_price,
+            "profit_loss": pnl,
+            "holding_period": str(holding),
+            "node_votes": votes,
+        })
+    validated = _ROWS_ADAPTER.validate_python(results)
+    return json.dumps(_ROWS_ADAPTER.dump_python(validated, mode="json"), separators=(",", ":")).encode("utf-8")
+
+
+def recent_after(rows: List[Tuple[Any, ...]]) -> bytes:
+    results = [
+        {
+            "id": trade_id,
+            "timestamp": ts.isoformat(),
+            "symbol": symbol,
+            "decision": decision,
+            "aggregate_confidence": confidence,
+            "entry_price": entry,
+            "exit_price": exit_price,
+            "profit_loss": pnl,
+            "holding_period": str(holding),
+            "node_votes": votes,
+        }
+        for trade_id, ts, symbol, decision, confidence, entry, exit_price, pnl, holding, votes in rows
+    ]
+    return serialization.FastJSONResponse(results).body
+
+
+def _cpu_us(fn: Callable[[], Any], iterations: int) -> float:
+    fn()
+    started = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def bench_serialization(iterations: int = 2000) -> Dict[str, Any]:
+    node_results = _node_results()
+    rows = _trade_rows(50)
+    # Both paths must produce the same document.
+    assert json.loads(decision_before(node_results)) == json.loads(decision_after(node_results))
+    assert json.loads(recent_before(rows)) == json.loads(recent_after(rows))
+    results: Dict[str, Any] = {"orjson": serialization.orjson is not None}
+    for name, before, after in (
+        ("decision", lambda: decision_before(node_results), lambda: decision_after(node_results)),
+        ("trades_recent_50", lambda: recent_before(rows), lambda: recent_after(rows)),
+    ):
+        before_us = _cpu_us(before, iterations)
+        after_us = _cpu_us(after, iterations)
+        results[name] = {"before_cpu_us": before_us, "after_cpu_us": after_us, "speedup": before_us / after_us if after_us else None}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-decision serialization CPU time, before vs after")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(bench_serialization(args.iterations), indent=2))
+
+
+if __name__ == "__main__":
+    main()
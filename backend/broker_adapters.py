@@ -0,0 +1,224 @@
+import os
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+ALPACA_API_KEY_ENV = "ALPACA_API_KEY"
+ALPACA_SECRET_KEY_ENV = "ALPACA_SECRET_KEY"
+SIM_FILL_LATENCY_MS_ENV = "SIM_FILL_LATENCY_MS"
+SIM_SLIPPAGE_BPS_ENV = "SIM_SLIPPAGE_BPS"
+SIM_PARTIAL_FILL_RATE_ENV = "SIM_PARTIAL_FILL_RATE"
+SIM_SEED_ENV = "SIM_SEED"
+
+# How long submit_market_order waits for an Alpaca order to reach a final state before
+# reporting whatever has filled so far.
+ALPACA_FILL_WAIT_SECONDS = 2.0
+ALPACA_FILL_POLL_SECONDS = 0.25
+ALPACA_FINAL_STATUSES = {"filled", "canceled", "expired", "rejected", "done_for_day"}
+
+
+@dataclass
+class OrderFill:
+    order_id: str
+    filled_qty: float
+    fill_price: float
+    entry_price: float
+    exit_price: Optional[float] = None
+    realized_pnl: Optional[float] = None
+
+
+class BrokerAdapter(ABC):
+    name = "base"
+    # Whether execute_trade should journal fills to trade_decisions and notify Discord.
+    records_trades = True
+
+    @abstractmethod
+    def submit_market_order(self, symbol: str, side: str, qty: int, reference_price: float) -> OrderFill:
+        ...
+
+    @abstractmethod
+    def positions(self) -> Dict[str, Tuple[float, float]]:
+        """Open long positions held at this broker, as symbol -> (quantity, average price)."""
+
+
+class VirtualAdapter(BrokerAdapter):
+    name = "virtual"
+
+    def submit_market_order(self, symbol: str, side: str, qty: int, reference_price: float) -> OrderFill:
+        from virtual_ledger import apply_virtual_fill
+
+        realized_pnl, entry_price_used = apply_virtual_fill(symbol=symbol, side=side, qty=qty, price=reference_price)
+        return OrderFill(
+            order_id=f"virtual-{symbol}-{int(time.time())}",
+            filled_qty=qty,
+            fill_price=reference_price,
+            entry_price=entry_price_used or reference_price,
+            exit_price=reference_price if side == "SELL" else None,
+            realized_pnl=realized_pnl,
+        )
+
+    def positions(self) -> Dict[str, Tuple[float, float]]:
+        from virtual_ledger import get_position_book
+
+        return get_position_book().positions()
+
+
+class AlpacaAdapter(BrokerAdapter):
+    def __init__(self, paper: bool) -> None:
+        self.paper = paper
+        self.name = "alpaca-paper" if paper else "alpaca-live"
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def _client(self) -> Any:
+        api_key = os.getenv(ALPACA_API_KEY_ENV)
+        secret_key = os.getenv(ALPACA_SECRET_KEY_ENV)
+        if not api_key or not secret_key:
+            raise RuntimeError("Alpaca API keys are not set")
+        with self._lock:
+            client = self._clients.get((api_key, secret_key))
+            if client is None:
+                from alpaca.trading.client import TradingClient
+
+                client = TradingClient(api_key, secret_key, paper=self.paper)
+                self._clients[(api_key, secret_key)] = client
+        return client
+
+    def submit_market_order(self, symbol: str, side: str, qty: int, reference_price: float) -> OrderFill:
+        from alpaca.trading.enums import OrderSide, TimeInForce
+        from alpaca.trading.requests import MarketOrderRequest
+
+        order_data = MarketOrderRequest(
+            symbol=symbol,
+            qty=qty,
+            side=OrderSide.BUY if side == "BUY" else OrderSide.SELL,
+            time_in_force=TimeInForce.DAY,
+        )
+        client = self._client()
+        order = client.submit_order(order_data)
+        deadline = time.monotonic() + ALPACA_FILL_WAIT_SECONDS
+        while _order_status(order) not in ALPACA_FINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(ALPACA_FILL_POLL_SECONDS)
+            order = client.get_order_by_id(order.id)
+        # Report what actually filled: an accepted-but-unfilled or rejected order is 0, not qty.
+        filled_qty = float(order.filled_qty or 0)
+        fill_price = float(order.filled_avg_price) if order.filled_avg_price else reference_price
+        return OrderFill(
+            order_id=str(order.id),
+            filled_qty=filled_qty,
+            fill_price=fill_price,
+            entry_price=fill_price,
+        )
+
+    def positions(self) -> Dict[str, Tuple[float, float]]:
+        return {
+            str(p.symbol): (float(p.qty), float(p.avg_entry_price))
+            for p in self._client().get_all_positions()
+            if float(p.qty) > 0
+        }
+
+
+def _order_status(order: Any) -> str:
+    status = order.status
+    return str(getattr(status, "value", status)).lower()
+
+
+class SimulatedExchangeAdapter(BrokerAdapter):
+    """In-process exchange for offline load tests: fill latency, slippage and partial fills."""
+
+    name = "simulated"
+    records_trades = False
+
+    def __init__(
+        self,
+        fill_latency_ms: Optional[float] = None,
+        slippage_bps: Optional[float] = None,
+        partial_fill_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.fill_latency_ms = (
+            fill_latency_ms if fill_latency_ms is not None else float(os.getenv(SIM_FILL_LATENCY_MS_ENV, "50"))
+        )
+        self.slippage_bps = slippage_bps if slippage_bps is not None else float(os.getenv(SIM_SLIPPAGE_BPS_ENV, "5"))
+        self.partial_fill_rate = (
+            partial_fill_rate
+            if partial_fill_rate is not None
+            else float(os.getenv(SIM_PARTIAL_FILL_RATE_ENV, "0.1"))
+        )
+        seed_env = os.getenv(SIM_SEED_ENV)
+        self._random = random.Random(seed if seed is not None else (int(seed_env) if seed_env else None))
+        self._lock = threading.Lock()
+        self._positions: Dict[str, Tuple[float, float]] = {}
+
+    def submit_market_order(self, symbol: str, side: str, qty: int, reference_price: float) -> OrderFill:
+        if self.fill_latency_ms > 0:
+            time.sleep(self.fill_latency_ms / 1000.0)
+        slip = reference_price * self.slippage_bps / 10000.0
+        fill_price = reference_price + slip if side == "BUY" else reference_price - slip
+        with self._lock:
+            filled_qty = float(qty)
+            if qty > 1 and self._random.random() < self.partial_fill_rate:
+                filled_qty = float(max(1, int(qty * self._random.uniform(0.1, 1.0))))
+            current_qty, avg_price = self._positions.get(symbol, (0.0, 0.0))
+            realized_pnl: Optional[float] = None
+            entry_price = fill_price
+            if side == "BUY":
+                new_qty = current_qty + filled_qty
+                self._positions[symbol] = (new_qty, (current_qty * avg_price + filled_qty * fill_price) / new_qty)
+            else:
+                sold = min(filled_qty, current_qty)
+                realized_pnl = (fill_price - avg_price) * sold if sold > 0 else 0.0
+                entry_price = avg_price if sold > 0 else fill_price
+                if current_qty - sold <= 0:
+                    self._positions.pop(symbol, None)
+                else:
+                    self._positions[symbol] = (current_qty - sold, avg_price)
+        return OrderFill(
+            order_id=f"sim-{uuid.uuid4().hex[:12]}",
+            filled_qty=filled_qty,
+            fill_price=fill_price,
+            entry_price=entry_price,
+            exit_price=fill_price if side == "SELL" else None,
+            realized_pnl=realized_pnl,
+        )
+
+    def positions(self) -> Dict[str, Tuple[float, float]]:
+        with self._lock:
+            return dict(self._positions)
+
+
+_factories: Dict[str, Callable[[], BrokerAdapter]] = {
+    "virtual": VirtualAdapter,
+    "paper": lambda: AlpacaAdapter(paper=True),
+    "live": lambda: AlpacaAdapter(paper=False),
+    "simulated": SimulatedExchangeAdapter,
+}
+_adapters: Dict[str, BrokerAdapter] = {}
+_adapters_lock = threading.Lock()
+
+
+def register_adapter(mode: str, factory: Callable[[], BrokerAdapter]) -> None:
+    with _adapters_lock:
+        _factories[mode] = factory
+        _adapters.pop(mode, None)
+
+
+def available_modes() -> Tuple[str, ...]:
+    return tuple(_factories)
+
+
+def get_adapter(mode: str) -> BrokerAdapter:
+    with _adapters_lock:
+        adapter = _adapters.get(mode)
+        if adapter is None:
+            factory = _factories.get(mode)
+            if factory is None:
+                raise RuntimeError(f"unknown trading mode: {mode}")
+            adapter = factory()
+            _adapters[mode] = adapter
+    return adapter
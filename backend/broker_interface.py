@@ -1,31 +1,51 @@
+import asyncio
+import contextvars
 import os
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
 
-from alpaca.trading.client import TradingClient
-from alpaca.trading.enums import OrderSide, TimeInForce
-from alpaca.trading.requests import MarketOrderRequest
-
-from db import apply_virtual_fill, get_setting, log_trade_decision
+from broker_adapters import get_adapter
+from db import log_trade_decision
 from schemas import FinalDecision, MarketData
+from settings import Settings, get_settings
 import discord_notifier
+import event_bus
+import metrics
+import portfolio_risk
+import tracing
+
 
+BROKER_THREADS_ENV = "BROKER_THREADS"
 
-ALPACA_API_KEY_ENV = "ALPACA_API_KEY"
-ALPACA_SECRET_KEY_ENV = "ALPACA_SECRET_KEY"
-TRADING_MODE_ENV = "TRADING_MODE"
+_executor: Optional[ThreadPoolExecutor] = None
 
 
-def _get_trading_client() -> TradingClient:
-    api_key = os.getenv(ALPACA_API_KEY_ENV)
-    secret_key = os.getenv(ALPACA_SECRET_KEY_ENV)
-    if not api_key or not secret_key:
-        raise RuntimeError("Alpaca API keys are not set")
-    paper = os.getenv(TRADING_MODE_ENV, "paper") != "live"
-    return TradingClient(api_key, secret_key, paper=paper)
+@dataclass
+class OrderResult:
+    symbol: str
+    order_id: Optional[str]
+    latency_ms: float
+    error: Optional[str] = None
 
 
-def execute_trade(symbol: str, market_data: MarketData, decision: FinalDecision) -> Optional[str]:
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv(BROKER_THREADS_ENV, "4")),
+            thread_name_prefix="broker",
+        )
+    return _executor
+
+
+def execute_trade(
+    symbol: str,
+    market_data: MarketData,
+    decision: FinalDecision,
+    settings: Optional[Settings] = None,
+) -> Optional[str]:
     if decision.final_decision not in {"BUY", "SELL"}:
         return None
     if not decision.recommended_position_size or decision.recommended_position_size <= 0:
@@ -35,59 +55,91 @@ def execute_trade(symbol: str, market_data: MarketData, decision: FinalDecision)
     if qty <= 0:
         return None
 
-    mode = (get_setting("TRADING_MODE", os.getenv(TRADING_MODE_ENV, "paper")) or "paper").lower()
-
-    if mode == "virtual":
-        order_id = f"virtual-{symbol}-{int(time.time())}"
-        side = "BUY" if decision.final_decision == "BUY" else "SELL"
-        realized_pnl, entry_price_used = apply_virtual_fill(
-            symbol=symbol,
-            side=side,
-            qty=qty,
-            price=market_data.current_price,
-        )
-        log_trade_decision(
-            symbol=symbol,
-            market_timestamp=market_data.timestamp,
-            decision=decision,
-            entry_price=entry_price_used or market_data.current_price,
-            exit_price=market_data.current_price if side == "SELL" else None,
-            profit_loss=realized_pnl,
-        )
-        discord_notifier.send_trade_notification(
-            symbol=symbol,
-            market_data=market_data,
-            decision=decision,
-            order_id=order_id,
-            trading_mode=mode,
-        )
-        return order_id
-
-    client = _get_trading_client()
-    side = OrderSide.BUY if decision.final_decision == "BUY" else OrderSide.SELL
-
-    order_data = MarketOrderRequest(
-        symbol=symbol,
-        qty=qty,
-        side=side,
-        time_in_force=TimeInForce.DAY,
+    mode = (settings or get_settings()).trading_mode
+    adapter = get_adapter(mode)
+    side = "BUY" if decision.final_decision == "BUY" else "SELL"
+    started = time.perf_counter()
+    try:
+        with tracing.span("broker.submit", mode=mode, side=side, quantity=qty):
+            fill = adapter.submit_market_order(symbol, side, qty, market_data.current_price)
+    except Exception:
+        metrics.BROKER_SUBMIT_SECONDS.observe(time.perf_counter() - started, mode, "error")
+        raise
+    metrics.BROKER_SUBMIT_SECONDS.observe(time.perf_counter() - started, mode, "ok")
+    if fill.filled_qty > 0:
+        portfolio_risk.record_fill(symbol, side, fill.filled_qty, fill.fill_price)
+    if fill.filled_qty < qty:
+        # Unfilled or partly filled at the broker: take its positions on the next sync instead of guessing.
+        portfolio_risk.invalidate()
+    event_bus.publish(
+        "fill",
+        {
+            "order_id": fill.order_id,
+            "side": side,
+            "quantity": fill.filled_qty,
+            "price": fill.fill_price,
+            "realized_pnl": fill.realized_pnl,
+            "trading_mode": mode,
+        },
+        symbol,
     )
 
-    order = client.submit_order(order_data)
-
-    log_trade_decision(
-        symbol=symbol,
-        market_timestamp=market_data.timestamp,
-        decision=decision,
-        entry_price=market_data.current_price,
+    if adapter.records_trades:
+        with tracing.span("journal"):
+            log_trade_decision(
+                symbol=symbol,
+                market_timestamp=market_data.timestamp,
+                decision=decision,
+                entry_price=fill.entry_price,
+                exit_price=fill.exit_price,
+                profit_loss=fill.realized_pnl,
+                market_data=market_data,
+            )
+        with tracing.span("notify"):
+            discord_notifier.send_trade_notification(
+                symbol=symbol,
+                market_data=market_data,
+                decision=decision,
+                order_id=fill.order_id,
+                trading_mode=mode,
+            )
+
+    return fill.order_id
+
+
+async def execute_trade_async(
+    symbol: str,
+    market_data: MarketData,
+    decision: FinalDecision,
+    settings: Optional[Settings] = None,
+) -> Optional[str]:
+    """Run execute_trade on the broker thread pool so SDK, DB and webhook I/O stay off the event loop."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context into the pool so broker spans join the request's trace.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _get_executor(), context.run, execute_trade, symbol, market_data, decision, settings
     )
 
-    discord_notifier.send_trade_notification(
-        symbol=symbol,
-        market_data=market_data,
-        decision=decision,
-        order_id=str(order.id),
-        trading_mode=mode,
-    )
 
-    return str(order.id)
+async def _timed_execute(
+    symbol: str,
+    market_data: MarketData,
+    decision: FinalDecision,
+    settings: Optional[Settings],
+) -> OrderResult:
+    started = time.perf_counter()
+    try:
+        order_id = await execute_trade_async(symbol, market_data, decision, settings)
+    except Exception as exc:
+        return OrderResult(symbol, None, (time.perf_counter() - started) * 1000.0, error=str(exc))
+    return OrderResult(symbol, order_id, (time.perf_counter() - started) * 1000.0)
+
+
+async def execute_trades(
+    orders: Sequence[Tuple[str, MarketData, FinalDecision]],
+    settings: Optional[Settings] = None,
+) -> List[OrderResult]:
+    """Submit a cycle's orders concurrently, timing each one."""
+    settings = settings or get_settings()
+    return list(await asyncio.gather(*(_timed_execute(*order, settings) for order in orders)))
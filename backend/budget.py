@@ -0,0 +1,367 @@
+"""OpenRouter token and cost accounting with budget admission control.
+
+Every chat response's `usage` is recorded per model and node for the current
+day, priced from the /models list (or the `usage.cost` OpenRouter reports when
+usage accounting is on). With LLM_DAILY_BUDGET_USD / LLM_DAILY_TOKEN_BUDGET set
+the controller picks a level each time it is asked:
+
+- normal: spend is on pace to stay within the budget; nothing changes.
+- conserve: the trailing burn rate would exhaust the budget before midnight.
+  Below-average-weight nodes are downgraded to LLM_FALLBACK_MODEL (or skipped
+  without one) and symbols are admitted at the rate of analyses per second the
+  remaining budget affords until midnight, held positions first, then the
+  symbols that waited longest. The rate is metered by a token bucket, so it
+  holds whether _run_cycle is called with a full batch or one symbol at a time
+  by a price trigger.
+- exhausted: the budget is spent. Every paid model is downgraded (or skipped)
+  and the polling loop only re-checks symbols with open positions.
+
+Usage is flushed to the llm_usage table and re-read from it on every flush, so
+workers sharing a database share one budget (lagging by one flush interval).
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import metrics
+from settings import Settings, get_settings
+
+
+BURN_WINDOW_SECONDS = 3600.0
+
+# (model, node) -> [prompt_tokens, completion_tokens, cost_usd, requests]
+Usage = Dict[Tuple[str, str], List[float]]
+
+_current_node: contextvars.ContextVar[str] = contextvars.ContextVar("llm_node", default="other")
+
+
+def _price(value: Any) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _seconds_left_today(now: float) -> float:
+    current = datetime.fromtimestamp(now)
+    midnight = datetime.combine(current.date() + timedelta(days=1), datetime.min.time())
+    return max((midnight - current).total_seconds(), 1.0)
+
+
+def current_node() -> str:
+    return _current_node.get()
+
+
+@contextmanager
+def attribute(node_id: str) -> Iterator[None]:
+    """Charge OpenRouter calls made inside the block to node_id."""
+    token = _current_node.set(node_id)
+    try:
+        yield
+    finally:
+        _current_node.reset(token)
+
+
+class BudgetController:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._day = date.today()
+        self._usage: Usage = {}
+        self._pending: Usage = {}
+        self._recent: Deque[Tuple[float, float, float]] = deque()  # (monotonic ts, cost, tokens)
+        self._pricing: Dict[str, Tuple[float, float]] = {}
+        self._pricing_at = 0.0
+        # Token bucket of affordable analyses while conserving, and when each symbol was last let through.
+        self._allowance = 0.0
+        self._allowance_at: Optional[float] = None
+        self._admitted_at: Dict[str, float] = {}
+
+    @property
+    def flush_interval(self) -> float:
+        return max(get_settings().budget_flush_seconds, 1.0)
+
+    @property
+    def pricing_refresh_interval(self) -> float:
+        return get_settings().budget_pricing_refresh_seconds
+
+    def _roll_day(self) -> None:
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self._usage = {}
+            self._pending = {}
+            self._recent.clear()
+
+    def update_pricing(self, models: Iterable[Dict[str, Any]]) -> None:
+        pricing = {}
+        for model in models:
+            prices = model.get("pricing") or {}
+            pricing[str(model.get("id"))] = (_price(prices.get("prompt")), _price(prices.get("completion")))
+        with self._lock:
+            self._pricing.update(pricing)
+            self._pricing_at = time.time()
+
+    def pricing_age(self) -> float:
+        return time.time() - self._pricing_at if self._pricing_at else math.inf
+
+    def is_free(self, model: str) -> bool:
+        if model.endswith(":free"):
+            return True
+        prompt, completion = self._pricing.get(model, (None, None))
+        return prompt == 0.0 and completion == 0.0
+
+    def cost_of(self, model: str, usage: Dict[str, Any]) -> float:
+        if usage.get("cost") is not None:
+            return _price(usage["cost"])
+        prompt, completion = self._pricing.get(model, (0.0, 0.0))
+        return _price(usage.get("prompt_tokens")) * prompt + _price(usage.get("completion_tokens")) * completion
+
+    def record(self, model: str, usage: Optional[Dict[str, Any]]) -> float:
+        """Account one chat response's usage to the current node; returns its cost in USD."""
+        if not usage:
+            return 0.0
+        node = _current_node.get()
+        prompt_tokens = _price(usage.get("prompt_tokens"))
+        completion_tokens = _price(usage.get("completion_tokens"))
+        cost = self.cost_of(model, usage)
+        with self._lock:
+            self._roll_day()
+            for book in (self._usage, self._pending):
+                row = book.setdefault((model, node), [0.0, 0.0, 0.0, 0.0])
+                row[0] += prompt_tokens
+                row[1] += completion_tokens
+                row[2] += cost
+                row[3] += 1
+            self._recent.append((time.monotonic(), cost, prompt_tokens + completion_tokens))
+        metrics.LLM_TOKENS.inc(model, node, "prompt", amount=prompt_tokens)
+        metrics.LLM_TOKENS.inc(model, node, "completion", amount=completion_tokens)
+        metrics.LLM_COST_USD.inc(model, node, amount=cost)
+        return cost
+
+    def _totals(self) -> Tuple[float, float, float]:
+        cost = sum(row[2] for row in self._usage.values())
+        tokens = sum(row[0] + row[1] for row in self._usage.values())
+        requests = sum(row[3] for row in self._usage.values())
+        return cost, tokens, requests
+
+    def _burn_per_second(self) -> Tuple[float, float]:
+        now = time.monotonic()
+        while self._recent and self._recent[0][0] < now - BURN_WINDOW_SECONDS:
+            self._recent.popleft()
+        if not self._recent:
+            return 0.0, 0.0
+        # Measure over the window, or since the first call when the process is younger than that.
+        span = max(now - self._recent[0][0], 60.0)
+        return sum(c for _, c, _ in self._recent) / span, sum(t for _, _, t in self._recent) / span
+
+    def _fractions(self, settings: Settings) -> Tuple[float, float, float]:
+        """(spent, projected end-of-day, cost of one request) as fractions of the tightest budget."""
+        cost, tokens, requests = self._totals()
+        cost_rate, token_rate = self._burn_per_second()
+        left = _seconds_left_today(time.time())
+        spent = projected = per_request = 0.0
+        for used, rate, budget in (
+            (cost, cost_rate, settings.llm_daily_budget_usd),
+            (tokens, token_rate, float(settings.llm_daily_token_budget)),
+        ):
+            if budget <= 0:
+                continue
+            spent = max(spent, used / budget)
+            projected = max(projected, (used + rate * left) / budget)
+            if requests:
+                per_request = max(per_request, used / requests / budget)
+        return spent, projected, per_request
+
+    def level(self, settings: Optional[Settings] = None) -> str:
+        settings = settings or get_settings()
+        with self._lock:
+            self._roll_day()
+            spent, projected, _ = self._fractions(settings)
+        if spent >= 1.0:
+            return "exhausted"
+        if projected > 1.0:
+            return "conserve"
+        return "normal"
+
+    def plan_models(
+        self,
+        node_ids: Sequence[str],
+        weights: Dict[str, float],
+        settings: Optional[Settings] = None,
+    ) -> Dict[str, Optional[str]]:
+        """Model per node for one analysis; None means the node is skipped."""
+        settings = settings or get_settings()
+        level = self.level(settings)
+        plan: Dict[str, Optional[str]] = {node_id: settings.node_models.get(node_id) for node_id in node_ids}
+        if level == "normal":
+            return plan
+        mean_weight = sum(weights.get(n, 0.0) for n in node_ids) / max(len(node_ids), 1)
+        fallback = settings.llm_fallback_model or None
+        for node_id, model in plan.items():
+            if model is None or self.is_free(model):
+                continue
+            if level == "exhausted" or weights.get(node_id, 0.0) < mean_weight:
+                plan[node_id] = fallback
+                metrics.BUDGET_ACTIONS.inc("downgrade" if fallback else "skip_node")
+        return plan
+
+    def select_symbols(
+        self,
+        symbols: Sequence[str],
+        held: Iterable[str],
+        settings: Optional[Settings] = None,
+    ) -> List[str]:
+        """Symbols worth analysing now under the current budget level."""
+        settings = settings or get_settings()
+        held_set = set(held)
+        priority = [s for s in symbols if s in held_set]
+        rest = [s for s in symbols if s not in held_set]
+        with self._lock:
+            self._roll_day()
+            spent, projected, per_request = self._fractions(settings)
+            per_analysis = per_request * len(settings.node_models)
+            if spent < 1.0 and (projected <= 1.0 or per_analysis <= 0):
+                self._allowance_at = None
+                return list(symbols)
+            if spent >= 1.0:
+                admitted: List[str] = []
+            else:
+                # Analyses per second that spread what is left over the rest of the day.
+                rate = (1.0 - spent) / per_analysis / _seconds_left_today(time.time())
+                now = time.monotonic()
+                # Entering conserve starts with one polling interval's worth; a burst never exceeds it.
+                elapsed = settings.poll_interval_seconds if self._allowance_at is None else now - self._allowance_at
+                burst = max(rate * settings.poll_interval_seconds, 1.0)
+                self._allowance = min(self._allowance + rate * elapsed, burst)
+                self._allowance_at = now
+                # Held positions are always re-checked, but they still draw on the allowance.
+                self._allowance -= len(priority)
+                count = min(max(int(self._allowance), 0), len(rest))
+                self._allowance -= count
+                # Longest-waiting first, so every watched symbol still gets its turn.
+                admitted = sorted(rest, key=lambda s: self._admitted_at.get(s, -math.inf))[:count]
+                for symbol in priority + admitted:
+                    self._admitted_at[symbol] = now
+        if len(admitted) < len(rest):
+            metrics.BUDGET_ACTIONS.inc("defer_symbol", amount=len(rest) - len(admitted))
+        return priority + admitted
+
+    def load(self) -> None:
+        from db import get_connection
+
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT model, node, prompt_tokens, completion_tokens, cost_usd, requests "
+                    "FROM llm_usage WHERE day = %s",
+                    (self._day,),
+                )
+                rows = cur.fetchall()
+        with self._lock:
+            self._usage = {(m, n): [float(p), float(c), float(cost), float(r)] for m, n, p, c, cost, r in rows}
+            for key, row in self._pending.items():
+                current = self._usage.setdefault(key, [0.0, 0.0, 0.0, 0.0])
+                for i, value in enumerate(row):
+                    current[i] += value
+
+    def flush(self) -> None:
+        """Write unflushed usage, then reload today's totals (including other workers')."""
+        from db import get_connection
+
+        with self._lock:
+            self._roll_day()
+            pending, self._pending = self._pending, {}
+            day = self._day
+        try:
+            if pending:
+                with get_connection() as conn:
+                    with conn.cursor() as cur:
+                        for (model, node), (prompt, completion, cost, requests) in pending.items():
+                            cur.execute(
+                                """
+                                INSERT INTO llm_usage (day, model, node, prompt_tokens, completion_tokens, cost_usd, requests)
+                                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                                ON CONFLICT (day, model, node) DO UPDATE SET
+                                    prompt_tokens = llm_usage.prompt_tokens + EXCLUDED.prompt_tokens,
+                                    completion_tokens = llm_usage.completion_tokens + EXCLUDED.completion_tokens,
+                                    cost_usd = llm_usage.cost_usd + EXCLUDED.cost_usd,
+                                    requests = llm_usage.requests + EXCLUDED.requests
+                                """,
+                                (day, model, node, int(prompt), int(completion), cost, int(requests)),
+                            )
+                    conn.commit()
+        except Exception:
+            with self._lock:
+                if self._day == day:
+                    for key, row in pending.items():
+                        current = self._pending.setdefault(key, [0.0, 0.0, 0.0, 0.0])
+                        for i, value in enumerate(row):
+                            current[i] += value
+            raise
+        self.load()
+
+    def status(self, settings: Optional[Settings] = None) -> Dict[str, Any]:
+        settings = settings or get_settings()
+        level = self.level(settings)
+        with self._lock:
+            cost, tokens, requests = self._totals()
+            cost_rate, token_rate = self._burn_per_second()
+            usage = dict(self._usage)
+        left = _seconds_left_today(time.time())
+        by_model: Dict[str, Dict[str, float]] = {}
+        by_node: Dict[str, Dict[str, float]] = {}
+        for (model, node), (prompt, completion, row_cost, row_requests) in usage.items():
+            for book, key in ((by_model, model), (by_node, node)):
+                entry = book.setdefault(key, {"tokens": 0.0, "cost_usd": 0.0, "requests": 0.0})
+                entry["tokens"] += prompt + completion
+                entry["cost_usd"] += row_cost
+                entry["requests"] += row_requests
+        usd_budget = settings.llm_daily_budget_usd
+        token_budget = settings.llm_daily_token_budget
+        return {
+            "day": self._day.isoformat(),
+            "level": level,
+            "spent_usd": cost,
+            "tokens": tokens,
+            "requests": requests,
+            "budget_usd": usd_budget or None,
+            "budget_tokens": token_budget or None,
+            "remaining_usd": max(usd_budget - cost, 0.0) if usd_budget else None,
+            "remaining_tokens": max(token_budget - tokens, 0.0) if token_budget else None,
+            "burn_usd_per_hour": cost_rate * 3600.0,
+            "burn_tokens_per_hour": token_rate * 3600.0,
+            "projected_usd": cost + cost_rate * left,
+            "projected_tokens": tokens + token_rate * left,
+            "fallback_model": settings.llm_fallback_model or None,
+            "pricing_age_seconds": None if math.isinf(self.pricing_age()) else self.pricing_age(),
+            "by_model": by_model,
+            "by_node": by_node,
+        }
+
+
+_controller = BudgetController()
+
+
+def get_controller() -> BudgetController:
+    return _controller
+
+
+def record(model: str, usage: Optional[Dict[str, Any]]) -> float:
+    return _controller.record(model, usage)
+
+
+def plan_models(node_ids: Sequence[str], weights: Dict[str, float], settings: Optional[Settings] = None) -> Dict[str, Optional[str]]:
+    return _controller.plan_models(node_ids, weights, settings)
+
+
+def select_symbols(symbols: Sequence[str], held: Iterable[str], settings: Optional[Settings] = None) -> List[str]:
+    return _controller.select_symbols(symbols, held, settings)
+
+
+def status(settings: Optional[Settings] = None) -> Dict[str, Any]:
+    return _controller.status(settings)
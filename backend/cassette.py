@@ -0,0 +1,143 @@
+"""Record/replay of outbound Alpha Vantage and OpenRouter exchanges.
+
+CASSETTE_MODE=record appends every exchange to a gzip JSON-lines archive at
+CASSETTE_PATH; CASSETTE_MODE=replay serves them back without network access, so
+/trade/{symbol} and the polling loop can be re-run deterministically offline.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+CASSETTE_MODE_ENV = "CASSETTE_MODE"
+CASSETTE_PATH_ENV = "CASSETTE_PATH"
+CASSETTE_REPLAY_LATENCY_ENV = "CASSETTE_REPLAY_LATENCY"
+
+DEFAULT_CASSETTE_PATH = "cassettes/session.jsonl.gz"
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    encoded = json.dumps([kind, request], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path: str, mode: str, replay_latency: str = "0") -> None:
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        # Identical requests (e.g. repeated daily series fetches) replay in recorded order.
+        self._entries: Dict[str, List[Tuple[Dict[str, Any], float]]] = {}
+        self._cursor: Dict[str, int] = {}
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                entry = json.loads(line)
+                self._entries.setdefault(entry["key"], []).append((entry["response"], entry.get("latency", 0.0)))
+
+    def _append(self, kind: str, key: str, request: Dict[str, Any], response: Dict[str, Any], latency: float) -> None:
+        line = json.dumps(
+            {"kind": kind, "key": key, "request": request, "response": response, "latency": latency},
+            separators=(",", ":"),
+            default=str,
+        )
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+
+    def _next(self, kind: str, key: str) -> Tuple[Dict[str, Any], float]:
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise RuntimeError(f"cassette miss for {kind} request {key[:12]}")
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return entries[min(index, len(entries) - 1)]
+
+    def _latency(self, recorded: float) -> float:
+        if self.replay_latency == "recorded":
+            return recorded
+        try:
+            return float(self.replay_latency)
+        except ValueError:
+            return 0.0
+
+    async def exchange(
+        self,
+        kind: str,
+        request: Dict[str, Any],
+        live: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        key = request_key(kind, request)
+        if self.mode == "replay":
+            response, recorded_latency = self._next(kind, key)
+            delay = self._latency(recorded_latency)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return response
+        started = time.perf_counter()
+        response = await live()
+        if self.mode == "record":
+            latency = time.perf_counter() - started
+            # Encoding and the gzip append run in a thread so recording does not stall the loop it measures.
+            await asyncio.to_thread(self._append, kind, key, request, response, latency)
+        return response
+
+
+_active: Optional[Cassette] = None
+_configured = False
+
+
+def _from_env() -> Optional[Cassette]:
+    mode = os.getenv(CASSETTE_MODE_ENV, "off").lower()
+    if mode not in {"record", "replay"}:
+        return None
+    return Cassette(
+        path=os.getenv(CASSETTE_PATH_ENV, DEFAULT_CASSETTE_PATH),
+        mode=mode,
+        replay_latency=os.getenv(CASSETTE_REPLAY_LATENCY_ENV, "0"),
+    )
+
+
+def get_cassette() -> Optional[Cassette]:
+    global _active, _configured
+    if not _configured:
+        _active = _from_env()
+        _configured = True
+    return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str, replay_latency: str = "0") -> Iterator[Cassette]:
+    """Temporarily route exchanges through the given cassette, e.g. for a scripted replay run."""
+    global _active, _configured
+    previous, previous_configured = _active, _configured
+    _active, _configured = Cassette(path, mode, replay_latency), True
+    try:
+        yield _active
+    finally:
+        _active, _configured = previous, previous_configured
+
+
+async def exchange(
+    kind: str,
+    request: Dict[str, Any],
+    live: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    active = get_cassette()
+    if active is None:
+        return await live()
+    return await active.exchange(kind, request, live)
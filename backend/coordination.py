@@ -0,0 +1,143 @@
+"""Coordinate polling across processes and replicas through Postgres.
+
+Each process heartbeats a row in worker_leases; the processes with a fresh
+heartbeat are the live members. WATCH_SYMBOLS are sharded over the members with
+rendezvous hashing, so a worker joining or dying only moves the symbols it
+gains or loses. One member holds the "leader" row in the leases table
+(renewed on every heartbeat, taken over once it expires) and does the
+cluster-wide work such as NISA buying.
+
+With COORDINATION_ENABLED=false (the default) a process owns every symbol and
+is always leader, which is the single-process behaviour. A process that cannot
+heartbeat for LEASE_TTL_SECONDS stops owning anything rather than risk
+duplicating a peer's orders.
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Sequence
+
+from db import get_connection
+from settings import get_settings
+
+
+LEADER_LEASE = "leader"
+
+
+def rendezvous_owner(symbol: str, members: Sequence[str]) -> str:
+    return max(members, key=lambda m: hashlib.sha1(f"{m}:{symbol}".encode("utf-8")).digest())
+
+
+class Coordinator:
+    def __init__(self) -> None:
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._members: List[str] = [self.worker_id]
+        self._leader = False
+        self._last_heartbeat = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().coordination_enabled
+
+    @property
+    def ttl(self) -> float:
+        return get_settings().lease_ttl_seconds
+
+    @property
+    def heartbeat_interval(self) -> float:
+        return get_settings().lease_heartbeat_seconds
+
+    def heartbeat(self) -> None:
+        """Renew this worker's lease, refresh the member list and try to hold leadership."""
+        ttl = self.ttl
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO worker_leases (worker_id, hostname, started_at, heartbeat_at)
+                    VALUES (%s, %s, now(), now())
+                    ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = now()
+                    """,
+                    (self.worker_id, socket.gethostname()),
+                )
+                cur.execute(
+                    "DELETE FROM worker_leases WHERE heartbeat_at < now() - make_interval(secs => %s)",
+                    (ttl * 10,),
+                )
+                cur.execute(
+                    """
+                    SELECT worker_id FROM worker_leases
+                    WHERE heartbeat_at >= now() - make_interval(secs => %s)
+                    ORDER BY worker_id
+                    """,
+                    (ttl,),
+                )
+                members = [row[0] for row in cur.fetchall()]
+                cur.execute(
+                    """
+                    INSERT INTO leases AS l (name, holder, expires_at)
+                    VALUES (%s, %s, now() + make_interval(secs => %s))
+                    ON CONFLICT (name) DO UPDATE
+                    SET holder = EXCLUDED.holder, expires_at = EXCLUDED.expires_at
+                    WHERE l.holder = EXCLUDED.holder OR l.expires_at < now()
+                    RETURNING holder
+                    """,
+                    (LEADER_LEASE, self.worker_id, ttl),
+                )
+                leader = cur.fetchone() is not None
+            conn.commit()
+        with self._lock:
+            self._members = members or [self.worker_id]
+            self._leader = leader
+            self._last_heartbeat = time.monotonic()
+
+    def release(self) -> None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM worker_leases WHERE worker_id = %s", (self.worker_id,))
+                cur.execute("DELETE FROM leases WHERE name = %s AND holder = %s", (LEADER_LEASE, self.worker_id))
+            conn.commit()
+        with self._lock:
+            self._leader = False
+            self._last_heartbeat = 0.0
+
+    def _fresh(self) -> bool:
+        return time.monotonic() - self._last_heartbeat < self.ttl
+
+    def is_leader(self) -> bool:
+        if not self.enabled:
+            return True
+        with self._lock:
+            return self._leader and self._fresh()
+
+    def owned(self, symbols: Sequence[str]) -> List[str]:
+        if not self.enabled:
+            return list(symbols)
+        with self._lock:
+            if not self._fresh():
+                return []
+            members = list(self._members)
+        return [s for s in symbols if rendezvous_owner(s, members) == self.worker_id]
+
+    def describe(self, symbols: Sequence[str]) -> Dict[str, Any]:
+        with self._lock:
+            members = list(self._members)
+        return {
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "leader": self.is_leader(),
+            "members": members,
+            "owned_symbols": self.owned(symbols),
+            "assignments": {s: rendezvous_owner(s, members) for s in symbols} if self.enabled else {},
+        }
+
+
+_coordinator = Coordinator()
+
+
+def get_coordinator() -> Coordinator:
+    return _coordinator
@@ -1,27 +1,163 @@
-import json
 import os
+import re
+import threading
+import time
 from contextlib import contextmanager
+from functools import lru_cache
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional
 
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
 
-from schemas import FinalDecision, NodeRecommendation
+import metrics
+import serialization
+import tracing
+from schemas import FinalDecision, MarketData, NodeRecommendation
 
 
 DATABASE_URL_ENV = "DATABASE_URL"
+DB_POOL_MAX_ENV = "DB_POOL_MAX"
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _statement_labels(query: str) -> tuple:
+    # Statements are constant strings, so the parse is cached and the labels stay bounded.
+    words = query.split(None, 1)
+    statement = words[0].upper() if words else "UNKNOWN"
+    match = _TABLE_RE.search(query)
+    return statement, match.group(1).lower() if match else "none"
+
+
+class _TimedCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        labels = _statement_labels(query if isinstance(query, str) else str(query))
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"db {labels[0]} {labels[1]}"):
+                return super().execute(query, vars)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, *labels)
+
+    def executemany(self, query, vars_list):
+        labels = _statement_labels(query if isinstance(query, str) else str(query))
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"db {labels[0]} {labels[1]}"):
+                return super().executemany(query, vars_list)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - started, *labels)
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                url = os.getenv(DATABASE_URL_ENV)
+                if not url:
+                    raise RuntimeError("DATABASE_URL is not set")
+                _pool = ThreadedConnectionPool(
+                    1, int(os.getenv(DB_POOL_MAX_ENV, "20")), dsn=url, cursor_factory=_TimedCursor
+                )
+    return _pool
 
 
 @contextmanager
 def get_connection():
-    url = os.getenv(DATABASE_URL_ENV)
-    if not url:
-        raise RuntimeError("DATABASE_URL is not set")
-    conn = psycopg2.connect(url)
+    pool = _get_pool()
+    conn = pool.getconn()
     try:
         yield conn
     finally:
-        conn.close()
+        # Anything not committed by the caller is discarded before the connection is reused.
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except psycopg2.Error:
+            pass
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+# Idempotent DDL applied at startup. Postgres only runs database/init.sql on an empty
+# volume, so tables and columns added after a deployment was created arrive here.
+SCHEMA_MIGRATIONS = (
+    "ALTER TABLE trade_decisions ADD COLUMN IF NOT EXISTS audit_hash TEXT",
+    """
+    CREATE TABLE IF NOT EXISTS nisa_runs (
+        symbol VARCHAR(10) PRIMARY KEY,
+        last_run DATE,
+        last_order_id TEXT,
+        updated_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS worker_leases (
+        worker_id TEXT PRIMARY KEY,
+        hostname TEXT,
+        started_at TIMESTAMPTZ,
+        heartbeat_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT,
+        expires_at TIMESTAMPTZ
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS llm_usage (
+        day DATE,
+        model TEXT,
+        node TEXT,
+        prompt_tokens BIGINT DEFAULT 0,
+        completion_tokens BIGINT DEFAULT 0,
+        cost_usd DOUBLE PRECISION DEFAULT 0,
+        requests INTEGER DEFAULT 0,
+        PRIMARY KEY (day, model, node)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_blobs (
+        hash TEXT PRIMARY KEY,
+        codec TEXT,
+        raw_size INTEGER,
+        data BYTEA,
+        created_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT,
+        symbol TEXT,
+        priority INTEGER,
+        submitted_at DOUBLE PRECISION,
+        status TEXT,
+        started_at DOUBLE PRECISION,
+        finished_at DOUBLE PRECISION,
+        result JSONB,
+        error TEXT,
+        idempotency_key TEXT UNIQUE,
+        trace_id TEXT
+    )
+    """,
+)
+
+
+def ensure_schema() -> None:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            for statement in SCHEMA_MIGRATIONS:
+                cur.execute(statement)
+        conn.commit()
 
 
 def log_trade_decision(
@@ -32,21 +168,29 @@ def log_trade_decision(
     exit_price: Optional[float] = None,
     profit_loss: Optional[float] = None,
     holding_period_seconds: Optional[int] = None,
+    market_data: Optional[MarketData] = None,
 ) -> None:
-    node_votes: List[Dict[str, Any]] = []
-    for node in decision.node_results:
-        node_votes.append(
-            {
-                "node_id": node.node_id,
-                "model": node.model,
-                "recommendation": node.recommendation,
-                "confidence": node.confidence,
-            }
-        )
-    node_votes_json = json.dumps(node_votes)
+    from audit_store import get_store
+
+    node_votes: List[Dict[str, Any]] = [
+        {
+            "node_id": node.node_id,
+            "model": node.model,
+            "recommendation": node.recommendation,
+            "confidence": node.confidence,
+        }
+        for node in decision.node_results
+    ]
+    node_votes_json = serialization.dumps_text(node_votes)
+    audit = dict(decision._audit or {})
+    if market_data is not None and "market_data" not in audit:
+        audit["market_data"] = market_data.model_dump(mode="json")
+    audit["decision"] = decision.model_dump(mode="json")
+    store = get_store()
 
     with get_connection() as conn:
         with conn.cursor() as cur:
+            audit_hash, written = store.put(cur, audit)
             cur.execute(
                 """
                 INSERT INTO trade_decisions (
@@ -58,9 +202,10 @@ def log_trade_decision(
                     exit_price,
                     profit_loss,
                     holding_period,
-                    node_votes
+                    node_votes,
+                    audit_hash
                 ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s::interval, %s::jsonb
+                    %s, %s, %s, %s, %s, %s, %s, %s::interval, %s::jsonb, %s
                 )
                 """,
                 (
@@ -73,9 +218,11 @@ def log_trade_decision(
                     profit_loss,
                     f"{holding_period_seconds or 0} seconds",
                     node_votes_json,
+                    audit_hash,
                 ),
             )
         conn.commit()
+    store.remember(written)
 
 
 def get_recent_trades(limit: int = 50) -> list[dict[str, Any]]:
@@ -101,98 +248,33 @@ def get_recent_trades(limit: int = 50) -> list[dict[str, Any]]:
                 (limit,),
             )
             rows = cur.fetchall()
-    results: list[dict[str, Any]] = []
-    for row in rows:
-        (
-            trade_id,
-            ts,
-            symbol,
-            decision,
-            aggregate_confidence,
-            entry_price,
-            exit_price,
-            profit_loss,
-            holding_period,
-            node_votes,
-        ) = row
-        results.append(
-            {
-                "id": trade_id,
-                "timestamp": ts.isoformat() if hasattr(ts, "isoformat") else str(ts),
-                "symbol": symbol,
-                "decision": decision,
-                "aggregate_confidence": aggregate_confidence,
-                "entry_price": entry_price,
-                "exit_price": exit_price,
-                "profit_loss": profit_loss,
-                "holding_period": str(holding_period),
-                "node_votes": node_votes,
-            }
-        )
-    return results
-
-
-def apply_virtual_fill(symbol: str, side: str, qty: float, price: float) -> Tuple[Optional[float], Optional[float]]:
-    """Update virtual_positions and compute realized PnL for virtual trades.
-
-    Returns (realized_pnl, entry_price_used).
-    """
+    # Assembled straight from the cursor tuples; node_votes arrives already decoded from JSONB.
+    return [
+        {
+            "id": trade_id,
+            "timestamp": ts.isoformat() if hasattr(ts, "isoformat") else str(ts),
+            "symbol": symbol,
+            "decision": decision,
+            "aggregate_confidence": aggregate_confidence,
+            "entry_price": entry_price,
+            "exit_price": exit_price,
+            "profit_loss": profit_loss,
+            "holding_period": str(holding_period),
+            "node_votes": node_votes,
+        }
+        for trade_id, ts, symbol, decision, aggregate_confidence, entry_price, exit_price, profit_loss, holding_period, node_votes in rows
+    ]
+
+
+def get_realized_pnl_since(since: datetime) -> float:
     with get_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
-                "SELECT quantity, avg_price FROM virtual_positions WHERE symbol = %s",
-                (symbol,),
+                "SELECT COALESCE(SUM(profit_loss), 0) FROM trade_decisions WHERE timestamp >= %s",
+                (since,),
             )
             row = cur.fetchone()
-            if row:
-                current_qty, avg_price = float(row[0] or 0.0), float(row[1] or 0.0)
-            else:
-                current_qty, avg_price = 0.0, 0.0
-
-            realized_pnl: Optional[float] = None
-            entry_price_used: Optional[float] = None
-
-            if side == "BUY":
-                new_qty = current_qty + qty
-                if new_qty > 0:
-                    new_avg = ((current_qty * avg_price) + (qty * price)) / new_qty
-                else:
-                    new_avg = price
-                cur.execute(
-                    """
-                    INSERT INTO virtual_positions (symbol, quantity, avg_price, last_updated)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (symbol) DO UPDATE
-                    SET quantity = EXCLUDED.quantity,
-                        avg_price = EXCLUDED.avg_price,
-                        last_updated = EXCLUDED.last_updated
-                    """,
-                    (symbol, new_qty, new_avg, datetime.utcnow()),
-                )
-                entry_price_used = price
-            else:  # SELL
-                sell_qty = min(qty, current_qty) if current_qty > 0 else 0.0
-                if sell_qty > 0 and current_qty > 0:
-                    realized_pnl = (price - avg_price) * sell_qty
-                    new_qty = current_qty - sell_qty
-                    if new_qty <= 0:
-                        cur.execute("DELETE FROM virtual_positions WHERE symbol = %s", (symbol,))
-                    else:
-                        cur.execute(
-                            """
-                            UPDATE virtual_positions
-                            SET quantity = %s, last_updated = %s
-                            WHERE symbol = %s
-                            """,
-                            (new_qty, datetime.utcnow(), symbol),
-                        )
-                    entry_price_used = avg_price
-                else:
-                    # no position to sell from
-                    realized_pnl = 0.0
-                    entry_price_used = price
-        conn.commit()
-    return realized_pnl, entry_price_used
+    return float(row[0] or 0.0)
 
 
 def get_setting(key: str, default: Optional[str] = None) -> Optional[str]:
@@ -1,14 +1,31 @@
+import asyncio
+import logging
 import os
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 import httpx
 
+import metrics
 from db import get_recent_trades
 from schemas import FinalDecision, MarketData
 
 
 DISCORD_WEBHOOK_URL_ENV = "DISCORD_WEBHOOK_URL"
 DISCORD_ENABLED_ENV = "DISCORD_ENABLED"
+DISCORD_QUEUE_SIZE_ENV = "DISCORD_QUEUE_SIZE"
+DISCORD_COALESCE_SECONDS_ENV = "DISCORD_COALESCE_SECONDS"
+
+# Discord accepts at most 10 embeds per webhook message.
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_RATE_LIMIT_RETRIES = 5
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_queue: Optional["asyncio.Queue[Dict[str, Any]]"] = None
+_worker: Optional["asyncio.Task[None]"] = None
+_client: Optional[httpx.AsyncClient] = None
+_dropped = 0
+
+logger = logging.getLogger(__name__)
 
 
 def _is_enabled() -> bool:
@@ -38,22 +55,15 @@ def _build_performance_summary() -> str:
     )
 
 
-def send_trade_notification(
+def _trade_embed(
     symbol: str,
     market_data: MarketData,
     decision: FinalDecision,
     order_id: str,
     trading_mode: str,
-) -> None:
-    if not _is_enabled():
-        return
-    url = os.getenv(DISCORD_WEBHOOK_URL_ENV)
-    if not url:
-        return
-
+) -> Dict[str, Any]:
     side = "BUY" if decision.final_decision == "BUY" else "SELL"
-    content_lines = [
-        f"**AIトレード通知 ({trading_mode})**",
+    lines = [
         f"銘柄: {symbol}",
         f"売買: {side}",
         f"現在価格: {market_data.current_price}",
@@ -61,13 +71,140 @@ def send_trade_notification(
         f"ストップロス: {decision.stop_loss}",
         f"集約コンフィデンス: {decision.aggregate_confidence:.2f}",
         f"注文ID: {order_id}",
-        "",
-        "--- パフォーマンス指標 (recent) ---",
-        _build_performance_summary(),
     ]
-    payload: Dict[str, Any] = {"content": "\n".join(content_lines)}
+    return {"title": f"{side} {symbol} ({trading_mode})", "description": "\n".join(lines)}
+
+
+def _build_payload(embeds: List[Dict[str, Any]], summary: str, dropped: int) -> Dict[str, Any]:
+    content_lines = [f"**AIトレード通知** {len(embeds)}件"]
+    if dropped:
+        content_lines.append(f"(キュー溢れにより {dropped} 件の通知を省略)")
+    content_lines += ["", "--- パフォーマンス指標 (recent) ---", summary]
+    return {"content": "\n".join(content_lines), "embeds": embeds}
 
+
+def _enqueue(embed: Dict[str, Any]) -> None:
+    global _dropped
+    if _queue is None:
+        return
     try:
-        httpx.post(url, json=payload, timeout=10.0)
-    except Exception:
+        _queue.put_nowait(embed)
+    except asyncio.QueueFull:
+        _dropped += 1
+        metrics.DISCORD_DROPPED.inc("queue_full")
+
+
+def _drop(reason: str, count: int, detail: str) -> None:
+    metrics.DISCORD_DROPPED.inc(reason, amount=count)
+    logger.warning("dropped %d Discord trade notification(s) (%s): %s", count, reason, detail)
+
+
+async def _post(payload: Dict[str, Any]) -> None:
+    url = os.getenv(DISCORD_WEBHOOK_URL_ENV)
+    if not url or _client is None:
+        return
+    count = len(payload["embeds"])
+    for _ in range(MAX_RATE_LIMIT_RETRIES):
+        response = await _client.post(url, json=payload)
+        if response.status_code != 429:
+            if response.status_code >= 400:
+                _drop("http_error", count, f"HTTP {response.status_code} {response.text[:200]}")
+            return
+        try:
+            retry_after = float(response.json().get("retry_after", 1.0))
+        except Exception:
+            retry_after = float(response.headers.get("Retry-After", "1"))
+        await asyncio.sleep(retry_after)
+    _drop("rate_limited", count, f"still rate limited after {MAX_RATE_LIMIT_RETRIES} attempts")
+
+
+async def _collect_batch(window: float) -> List[Dict[str, Any]]:
+    assert _queue is not None
+    batch = [await _queue.get()]
+    deadline = asyncio.get_running_loop().time() + window
+    while len(batch) < MAX_EMBEDS_PER_MESSAGE:
+        timeout = deadline - asyncio.get_running_loop().time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+async def _worker_loop() -> None:
+    global _dropped
+    try:
+        window = float(os.getenv(DISCORD_COALESCE_SECONDS_ENV, "2.0"))
+    except ValueError:
+        window = 2.0
+    while True:
+        batch = await _collect_batch(window)
+        dropped, _dropped = _dropped, 0
+        try:
+            summary = await asyncio.to_thread(_build_performance_summary)
+            await _post(_build_payload(batch, summary, dropped))
+        except Exception as exc:
+            _drop("error", len(batch), f"{type(exc).__name__}: {exc}")
+            continue
+
+
+def start_worker() -> None:
+    """Start the background sender on the running event loop."""
+    global _loop, _queue, _worker, _client
+    if _worker is not None:
         return
+    try:
+        size = int(os.getenv(DISCORD_QUEUE_SIZE_ENV, "100"))
+    except ValueError:
+        size = 100
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue(maxsize=size)
+    _client = httpx.AsyncClient(timeout=10.0)
+    _worker = _loop.create_task(_worker_loop())
+
+
+async def stop_worker() -> None:
+    global _loop, _queue, _worker, _client
+    if _worker is not None:
+        _worker.cancel()
+    if _client is not None:
+        await _client.aclose()
+    _loop, _queue, _worker, _client = None, None, None, None
+
+
+def send_trade_notification(
+    symbol: str,
+    market_data: MarketData,
+    decision: FinalDecision,
+    order_id: str,
+    trading_mode: str,
+) -> None:
+    """Queue a trade notification; safe to call from the event loop or broker threads.
+
+    Without a running worker (scripts, one-off tools) the message is sent inline.
+    """
+    if not _is_enabled():
+        return
+    embed = _trade_embed(symbol, market_data, decision, order_id, trading_mode)
+
+    loop = _loop
+    if loop is None or loop.is_closed():
+        try:
+            payload = _build_payload([embed], _build_performance_summary(), 0)
+            response = httpx.post(os.getenv(DISCORD_WEBHOOK_URL_ENV, ""), json=payload, timeout=10.0)
+        except Exception as exc:
+            _drop("error", 1, f"{type(exc).__name__}: {exc}")
+            return
+        if response.status_code >= 400:
+            _drop("http_error", 1, f"HTTP {response.status_code} {response.text[:200]}")
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _enqueue(embed)
+    else:
+        loop.call_soon_threadsafe(_enqueue, embed)
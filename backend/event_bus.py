@@ -0,0 +1,137 @@
+"""In-process publish/subscribe for live dashboard updates.
+
+The orchestrator, risk filter and broker publish events; /events (SSE) and
+/ws/events (WebSocket) fan them out. Each event is serialised once no matter how
+many clients listen, and publishing with no subscribers is a cheap no-op.
+Every client has a bounded buffer; a client that falls behind is disconnected
+rather than slowing the pipeline down, and can resync from /trades/recent.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+
+import serialization
+
+
+EVENT_BUFFER_SIZE_ENV = "EVENT_BUFFER_SIZE"
+
+# (sequence number, event type, JSON-encoded event)
+Message = Tuple[int, str, str]
+
+
+def _jsonable(data: Any) -> Any:
+    if hasattr(data, "model_dump"):
+        return data.model_dump(mode="json")
+    return data
+
+
+class Subscription:
+    def __init__(self, maxsize: int, symbols: Optional[FrozenSet[str]], types: Optional[FrozenSet[str]]) -> None:
+        self.queue: "asyncio.Queue[Message]" = asyncio.Queue(maxsize=maxsize)
+        self.symbols = symbols
+        self.types = types
+        self.overflowed = False
+
+    def wants(self, event_type: str, symbol: Optional[str]) -> bool:
+        if self.types is not None and event_type not in self.types:
+            return False
+        if self.symbols is not None and symbol is not None and symbol not in self.symbols:
+            return False
+        return True
+
+    async def next(self, timeout: float) -> Optional[Message]:
+        """Next message, or None on timeout; check overflowed before waiting again."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    def __init__(self) -> None:
+        self._subscribers: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self.disconnected_slow = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(
+        self,
+        symbols: Optional[FrozenSet[str]] = None,
+        types: Optional[FrozenSet[str]] = None,
+    ) -> Subscription:
+        """Register a client; must be called on the serving event loop, which publishers then target."""
+        self._loop = asyncio.get_running_loop()
+        try:
+            size = int(os.getenv(EVENT_BUFFER_SIZE_ENV, "256"))
+        except ValueError:
+            size = 256
+        subscription = Subscription(max(size, 1), symbols, types)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data: Any, symbol: Optional[str] = None) -> None:
+        """Publish from the event loop or any worker thread."""
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        with self._seq_lock:
+            self._seq += 1
+            seq = self._seq
+        message = (seq, event_type, serialization.dumps_text(
+            {"seq": seq, "type": event_type, "symbol": symbol, "ts": time.time(), "data": _jsonable(data)}
+        ))
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(message, symbol)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, message, symbol)
+
+    def _dispatch(self, message: Message, symbol: Optional[str]) -> None:
+        for subscription in list(self._subscribers):
+            if not subscription.wants(message[1], symbol):
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self._subscribers.discard(subscription)
+                self.disconnected_slow += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self._seq,
+            "disconnected_slow": self.disconnected_slow,
+        }
+
+
+_bus = EventBus()
+
+
+def get_bus() -> EventBus:
+    return _bus
+
+
+def publish(event_type: str, data: Any, symbol: Optional[str] = None) -> None:
+    _bus.publish(event_type, data, symbol)
+
+
+def parse_filter(value: Optional[str]) -> Optional[FrozenSet[str]]:
+    if not value:
+        return None
+    return frozenset(v.strip() for v in value.split(",") if v.strip()) or None
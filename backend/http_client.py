@@ -0,0 +1,31 @@
+"""Shared httpx.AsyncClient for the upstream APIs (OpenRouter, Alpha Vantage).
+
+One pooled client keeps TLS sessions and keep-alive connections across calls
+instead of paying a new handshake on every request. Pooled connections belong
+to the event loop that opened them, so a call from a different loop (asyncio.run
+in scripts and benchmarks) gets a client of its own. The application closes the
+client on shutdown.
+"""
+import asyncio
+from typing import Optional, Tuple
+
+import httpx
+
+
+_shared: Optional[Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """The client for the running event loop; pass timeouts per request."""
+    global _shared
+    loop = asyncio.get_running_loop()
+    if _shared is None or _shared[0] is not loop or _shared[1].is_closed:
+        _shared = (loop, httpx.AsyncClient())
+    return _shared[1]
+
+
+async def aclose() -> None:
+    global _shared
+    shared, _shared = _shared, None
+    if shared is not None and shared[0] is asyncio.get_running_loop():
+        await shared[1].aclose()
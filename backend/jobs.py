@@ -0,0 +1,367 @@
+"""Asynchronous job queue for the analyze/trade pipelines.
+
+Submitting returns a job id immediately; a fixed pool of workers drains a
+priority queue (lower number runs first) so at most JOB_WORKERS pipelines run
+at once. Finished jobs stay in a TTL-bounded result store where they can be
+polled, long-polled or streamed. An Idempotency-Key maps client retries onto
+the job they already created instead of repeating the work. Jobs still queued
+after JOB_RESULT_TTL_SECONDS expire as failed.
+
+With COORDINATION_ENABLED=true several workers serve the API, so every job is
+also written to the jobs table: any worker can answer GET /jobs/{id} (polling
+the row for jobs running elsewhere) and idempotency keys hold cluster-wide.
+"""
+import asyncio
+import itertools
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import coordination
+import event_bus
+import serialization
+import tracing
+from db import get_connection
+from settings import get_settings
+
+
+DEFAULT_PRIORITIES = {"trade": 0, "analyze": 5}
+WAIT_SAMPLES = 500
+# How often a worker re-reads the row of a job that runs on another worker.
+REMOTE_POLL_SECONDS = 1.0
+STORE_PRUNE_SECONDS = 60.0
+
+_COLUMNS = (
+    "id", "kind", "symbol", "priority", "submitted_at", "status", "started_at", "finished_at",
+    "result", "error", "idempotency_key", "trace_id",
+)
+
+Handler = Callable[[str], Awaitable[Any]]
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    symbol: str
+    priority: int
+    submitted_at: float
+    status: str = "queued"
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    idempotency_key: Optional[str] = None
+    trace_id: Optional[str] = None
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in {"succeeded", "failed"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = self.result.model_dump(mode="json") if hasattr(self.result, "model_dump") else self.result
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "symbol": self.symbol,
+            "priority": self.priority,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_seconds": (self.started_at or time.time()) - self.submitted_at,
+            "result": result,
+            "error": self.error,
+            "trace_id": self.trace_id,
+        }
+
+    @classmethod
+    def from_row(cls, row: Tuple[Any, ...]) -> "Job":
+        return cls(**dict(zip(_COLUMNS, row)))
+
+    def _set(self, **changes: Any) -> None:
+        for key, value in changes.items():
+            setattr(self, key, value)
+        # Wake everyone waiting on this job, then arm a fresh event for the next change.
+        self.changed.set()
+        self.changed = asyncio.Event()
+        event_bus.publish("job", {"id": self.id, "kind": self.kind, "status": self.status}, self.symbol)
+
+
+class JobStore:
+    """The jobs table, shared by every worker when coordination is enabled."""
+
+    def save(self, job: Job) -> None:
+        data = job.to_dict()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    UPDATE jobs SET status = %s, started_at = %s, finished_at = %s,
+                        result = %s::jsonb, error = %s, trace_id = %s
+                    WHERE id = %s
+                    """,
+                    (
+                        job.status, job.started_at, job.finished_at,
+                        serialization.dumps_text(data["result"]), job.error, job.trace_id, job.id,
+                    ),
+                )
+            conn.commit()
+
+    def insert(self, job: Job) -> Optional[Job]:
+        """Insert a queued job; if its idempotency key is taken, return the job holding it instead."""
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    INSERT INTO jobs ({", ".join(_COLUMNS)})
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NULL, %s, %s, %s)
+                    ON CONFLICT (idempotency_key) DO NOTHING
+                    RETURNING id
+                    """,
+                    (
+                        job.id, job.kind, job.symbol, job.priority, job.submitted_at, job.status,
+                        job.started_at, job.finished_at, job.error, job.idempotency_key, job.trace_id,
+                    ),
+                )
+                inserted = cur.fetchone() is not None
+                existing = None
+                if not inserted:
+                    cur.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE idempotency_key = %s", (job.idempotency_key,))
+                    row = cur.fetchone()
+                    existing = Job.from_row(row) if row else None
+            conn.commit()
+        return existing
+
+    def load(self, job_id: str) -> Optional[Job]:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = %s", (job_id,))
+                row = cur.fetchone()
+        return Job.from_row(row) if row else None
+
+    def prune(self, cutoff: float) -> None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM jobs WHERE COALESCE(finished_at, submitted_at) < %s", (cutoff,))
+            conn.commit()
+
+
+class JobQueue:
+    def __init__(self) -> None:
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: Optional["asyncio.PriorityQueue[Tuple[int, int, str]]"] = None
+        self._workers: List["asyncio.Task[None]"] = []
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[str, str] = {}
+        self._counter = itertools.count()
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._expired = 0
+        self._store = JobStore()
+        self._store_pruned_at = 0.0
+        self._janitor: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def shared(self) -> bool:
+        return coordination.get_coordinator().enabled
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        settings = get_settings()
+        self._queue = asyncio.PriorityQueue(maxsize=settings.job_queue_size)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._worker()) for _ in range(settings.job_workers)]
+        self._janitor = loop.create_task(self._janitor_loop())
+
+    async def stop(self) -> None:
+        tasks = self._workers + ([self._janitor] if self._janitor is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._janitor = None
+        self._queue = None
+
+    async def submit(
+        self,
+        kind: str,
+        symbol: str,
+        priority: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> Job:
+        if kind not in self._handlers:
+            raise ValueError(f"unknown job kind {kind!r}")
+        if self._queue is None:
+            self.start()
+        assert self._queue is not None
+        await self._prune()
+        if idempotency_key:
+            existing = self._jobs.get(self._by_key.get(idempotency_key, ""))
+            if existing is not None:
+                return existing
+        if self._queue.full():
+            raise QueueFullError("job queue is full")
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            symbol=symbol,
+            priority=DEFAULT_PRIORITIES.get(kind, 5) if priority is None else priority,
+            submitted_at=time.time(),
+            idempotency_key=idempotency_key,
+        )
+        if self.shared:
+            existing = await asyncio.to_thread(self._store.insert, job)
+            if existing is not None:
+                return existing
+        try:
+            self._queue.put_nowait((job.priority, next(self._counter), job.id))
+        except asyncio.QueueFull:
+            raise QueueFullError("job queue is full") from None
+        self._jobs[job.id] = job
+        if idempotency_key:
+            self._by_key[idempotency_key] = job.id
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.shared:
+            job = await asyncio.to_thread(self._store.load, job_id)
+        return job
+
+    async def next_change(self, job: Job, timeout: float) -> Job:
+        """The job after its next status change, or as it stands once timeout passes."""
+        if job.id in self._jobs:
+            try:
+                await asyncio.wait_for(job.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return job
+        # Running on another worker: follow its row.
+        deadline = time.monotonic() + timeout
+        while True:
+            await asyncio.sleep(max(min(REMOTE_POLL_SECONDS, deadline - time.monotonic()), 0.0))
+            latest = await asyncio.to_thread(self._store.load, job.id)
+            if latest is None or latest.status != job.status or time.monotonic() >= deadline:
+                return latest or job
+
+    async def wait(self, job: Job, timeout: float) -> Job:
+        deadline = time.monotonic() + timeout
+        while not job.done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            job = await self.next_change(job, remaining)
+        return job
+
+    async def _persist(self, job: Job) -> None:
+        if not self.shared:
+            return
+        try:
+            await asyncio.to_thread(self._store.save, job)
+        except Exception:
+            pass
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            _, _, job_id = await queue.get()
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued":
+                continue
+            started = time.time()
+            self._waits.append(started - job.submitted_at)
+            self._running += 1
+            job._set(status="running", started_at=started)
+            await self._persist(job)
+            try:
+                with tracing.trace(f"job.{job.kind}", job_id=job.id, symbol=job.symbol) as root:
+                    job.trace_id = root.trace_id
+                    result = await self._handlers[job.kind](job.symbol)
+            except asyncio.CancelledError:
+                self._running -= 1
+                job._set(status="failed", error="cancelled", finished_at=time.time())
+                await asyncio.shield(self._persist(job))
+                raise
+            except Exception as exc:
+                self._failed += 1
+                job._set(status="failed", error=str(exc) or type(exc).__name__, finished_at=time.time())
+            else:
+                self._completed += 1
+                job._set(status="succeeded", result=result, finished_at=time.time())
+            self._running -= 1
+            await self._persist(job)
+
+    async def _janitor_loop(self) -> None:
+        while True:
+            await asyncio.sleep(STORE_PRUNE_SECONDS)
+            await self._prune()
+
+    async def _prune(self) -> None:
+        """Drop results older than the TTL and fail jobs that waited in the queue that long."""
+        now = time.time()
+        cutoff = now - get_settings().job_result_ttl_seconds
+        for job in [job for job in self._jobs.values() if job.status == "queued" and job.submitted_at < cutoff]:
+            self._expired += 1
+            job._set(status="failed", error="expired in queue", finished_at=now)
+            await self._persist(job)
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and (job.finished_at or 0) < cutoff]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.idempotency_key:
+                self._by_key.pop(job.idempotency_key, None)
+        if self.shared and now - self._store_pruned_at >= STORE_PRUNE_SECONDS:
+            self._store_pruned_at = now
+            try:
+                await asyncio.to_thread(self._store.prune, cutoff)
+            except Exception:
+                pass
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def stats(self) -> Dict[str, Any]:
+        await self._prune()
+        now = time.time()
+        queued = [job for job in self._jobs.values() if job.status == "queued"]
+        waits = np.array(self._waits) if self._waits else np.zeros(1)
+        return {
+            "workers": len(self._workers),
+            "queue_depth": self.depth(),
+            "running": self._running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "expired": self._expired,
+            "shared": self.shared,
+            "stored_results": len(self._jobs),
+            "oldest_queued_seconds": max((now - job.submitted_at for job in queued), default=0.0),
+            "wait_seconds": {
+                "mean": float(waits.mean()),
+                "p50": float(np.percentile(waits, 50)),
+                "p95": float(np.percentile(waits, 95)),
+                "max": float(waits.max()),
+            },
+        }
+
+
+_queue = JobQueue()
+
+
+def get_queue() -> JobQueue:
+    return _queue
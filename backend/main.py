@@ -1,22 +1,76 @@
 import asyncio
+import itertools
+import json
+import logging
+import math
 import os
-from typing import Any, Dict, List
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+import archive
+import audit_store
+import db
+import broker_adapters
 import broker_interface
+import budget
+import coordination
+import discord_notifier
+import event_bus
+import http_client
+import jobs
+import market_calendar
+import metrics
+import news_store
+import node_weights
 import orchestrator
+import portfolio_risk
+import price_stream
+import profiler
 import risk_manager
-from db import get_recent_trades, get_setting, set_setting
+import scheduler
+import serialization
+import settings as app_settings
+import sweep
+import tracing
+import virtual_ledger
+from db import get_recent_trades, set_setting
 from openrouter_client import OpenRouterClient
 from schemas import FinalDecision, MarketData, TradeResponse
-from nodes import data_fetcher
+from settings import Settings, get_settings
 import nisa_mode
 
 
+logger = logging.getLogger(__name__)
 app = FastAPI(title="OpenRouter AI Hedge Fund Backend")
 
+EVENT_HEARTBEAT_SECONDS = 15.0
+SCHEDULER_IDLE_SECONDS = 5.0
+# Scrapes, probes and long-lived streams would otherwise push decision traces out of the ring.
+UNTRACED_PATHS = ("/metrics", "/health", "/events", "/ws")
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    path = request.url.path
+    if any(path == p or path.startswith(p + "/") for p in UNTRACED_PATHS):
+        return await call_next(request)
+    sampler = profiler.get_profiler()
+    started = sampler.begin() if sampler.enabled else None
+    with tracing.trace(f"{request.method} {request.url.path}") as root:
+        try:
+            response = await call_next(request)
+        finally:
+            if started is not None:
+                await asyncio.to_thread(sampler.end, started, root.trace_id)
+        root.set(status_code=response.status_code)
+    response.headers["X-Trace-Id"] = root.trace_id
+    return response
+
 
 class TradingModeUpdate(BaseModel):
     mode: str
@@ -28,26 +82,142 @@ async def health() -> dict:
 
 
 @app.post("/analyze", response_model=FinalDecision)
-async def analyze(market_data: MarketData) -> FinalDecision:
-    return await orchestrator.run_analysis(market_data)
+async def analyze(market_data: MarketData) -> Response:
+    return serialization.model_response(await orchestrator.analyze_market_data(market_data))
 
 
-@app.post("/analyze/{symbol}", response_model=FinalDecision)
-async def analyze_symbol(symbol: str) -> FinalDecision:
-    market_data = await data_fetcher.fetch_market_data(symbol)
-    return await orchestrator.run_analysis(market_data)
+async def _analyze_pipeline(symbol: str) -> FinalDecision:
+    _, decision = await orchestrator.analyze_symbol(symbol)
+    return decision
 
 
-@app.post("/trade/{symbol}", response_model=TradeResponse)
-async def trade_symbol(symbol: str) -> TradeResponse:
-    market_data = await data_fetcher.fetch_market_data(symbol)
-    decision = await orchestrator.run_analysis(market_data)
-    decision = risk_manager.apply_risk_filters(decision, market_data)
+async def _trade_pipeline(symbol: str) -> TradeResponse:
+    settings = get_settings()
+    market_data, decision = await orchestrator.analyze_symbol(symbol, settings)
+    decision = risk_manager.apply_risk_filters(decision, market_data, settings)
+    await asyncio.to_thread(portfolio_risk.sync, settings)
+    portfolio_risk.evaluate_cycle([(symbol, market_data, decision)], settings)
     try:
-        order_id = broker_interface.execute_trade(symbol, market_data, decision)
+        order_id = await broker_interface.execute_trade_async(symbol, market_data, decision, settings)
     except Exception:
         order_id = None
-    return TradeResponse(symbol=symbol, decision=decision, order_id=order_id)
+    return TradeResponse.model_construct(symbol=symbol, decision=decision, order_id=order_id, trace_id=tracing.current_trace_id())
+
+
+jobs.get_queue().register("analyze", _analyze_pipeline)
+jobs.get_queue().register("trade", _trade_pipeline)
+
+
+# Decisions are built from validated parts; response_model documents them, model_response encodes them once.
+@app.post("/analyze/{symbol}", response_model=FinalDecision)
+async def analyze_symbol(symbol: str) -> Response:
+    return serialization.model_response(await _analyze_pipeline(symbol))
+
+
+@app.post("/trade/{symbol}", response_model=TradeResponse)
+async def trade_symbol(symbol: str) -> Response:
+    return serialization.model_response(await _trade_pipeline(symbol))
+
+
+@app.post("/jobs/{kind}/{symbol}", status_code=202)
+async def submit_job(
+    kind: str,
+    symbol: str,
+    priority: Optional[int] = None,
+    idempotency_key: Optional[str] = Header(default=None),
+) -> Dict[str, Any]:
+    if kind not in jobs.DEFAULT_PRIORITIES:
+        raise HTTPException(status_code=404, detail=f"unknown job kind {kind}")
+    try:
+        job = await jobs.get_queue().submit(kind, symbol, priority, idempotency_key)
+    except jobs.QueueFullError as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "5"})
+    return job.to_dict()
+
+
+metrics.gauge_function("job_queue_depth", "Jobs waiting for a worker.", jobs.get_queue().depth)
+metrics.gauge_function("event_subscribers", "Connected /events and /ws/events clients.", lambda: event_bus.get_bus().stats()["subscribers"])
+
+
+@app.get("/traces")
+async def list_traces(limit: int = 50) -> List[Dict[str, Any]]:
+    return tracing.recent_traces(limit)
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str) -> Dict[str, Any]:
+    spans = tracing.get_trace(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="trace not found or evicted")
+    return tracing.to_otlp(spans)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cluster")
+async def cluster_status() -> Dict[str, Any]:
+    return coordination.get_coordinator().describe(get_settings().watch_symbols)
+
+
+@app.get("/analysis/stats")
+async def analysis_stats() -> Dict[str, int]:
+    return orchestrator.single_flight_stats()
+
+
+@app.get("/schedule")
+async def schedule_status() -> Dict[str, Any]:
+    return scheduler.get_scheduler().snapshot()
+
+
+@app.get("/stream")
+async def stream_status() -> Dict[str, Any]:
+    return price_stream.get_stream().status()
+
+
+@app.get("/budget")
+async def budget_status() -> Dict[str, Any]:
+    return budget.status()
+
+
+@app.get("/jobs/stats")
+async def job_stats() -> Dict[str, Any]:
+    return await jobs.get_queue().stats()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0.0) -> Dict[str, Any]:
+    job = await jobs.get_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found or expired")
+    if wait > 0:
+        job = await jobs.get_queue().wait(job, min(wait, 60.0))
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str) -> StreamingResponse:
+    queue = jobs.get_queue()
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found or expired")
+
+    async def stream():
+        current = job
+        sent = None
+        while True:
+            if current.status != sent:
+                sent = current.status
+                yield f"event: {sent}\ndata: {json.dumps(current.to_dict(), default=str)}\n\n"
+            if current.done:
+                break
+            current = await queue.next_change(current, EVENT_HEARTBEAT_SECONDS)
+            if current.status == sent:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.get("/models")
@@ -73,66 +243,502 @@ async def is_free_model(model_id: str) -> Dict[str, Any]:
 
 @app.get("/config/trading_mode")
 async def get_trading_mode() -> Dict[str, str]:
-    mode = get_setting("TRADING_MODE", os.getenv("TRADING_MODE", "virtual")) or "virtual"
-    return {"mode": mode}
+    return {"mode": get_settings().trading_mode}
 
 
 @app.post("/config/trading_mode")
 async def set_trading_mode(payload: TradingModeUpdate) -> Dict[str, str]:
     mode = payload.mode.lower()
-    if mode not in {"virtual", "paper", "live"}:
+    if mode not in broker_adapters.available_modes():
         raise HTTPException(status_code=400, detail="invalid trading mode")
     set_setting("TRADING_MODE", mode)
+    await asyncio.to_thread(app_settings.reload)
     return {"mode": mode}
 
 
+@app.get("/config")
+async def get_config() -> Dict[str, Any]:
+    return {"settings": app_settings.describe(get_settings()), "last_error": app_settings.last_error()}
+
+
+@app.post("/config/reload")
+async def reload_config() -> Dict[str, Any]:
+    settings = await asyncio.to_thread(app_settings.reload)
+    return {"settings": app_settings.describe(settings), "last_error": app_settings.last_error()}
+
+
+@app.get("/events")
+async def stream_events(request: Request, symbols: Optional[str] = None, types: Optional[str] = None) -> StreamingResponse:
+    subscription = event_bus.get_bus().subscribe(event_bus.parse_filter(symbols), event_bus.parse_filter(types))
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.overflowed:
+                message = await subscription.next(EVENT_HEARTBEAT_SECONDS)
+                if message is None:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                seq, event_type, data = message
+                yield f"id: {seq}\nevent: {event_type}\ndata: {data}\n\n"
+            yield "event: overflow\ndata: {}\n\n"
+        finally:
+            event_bus.get_bus().unsubscribe(subscription)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@app.websocket("/ws/events")
+async def websocket_events(websocket: WebSocket) -> None:
+    await websocket.accept()
+    params = websocket.query_params
+    subscription = event_bus.get_bus().subscribe(
+        event_bus.parse_filter(params.get("symbols")), event_bus.parse_filter(params.get("types"))
+    )
+    try:
+        while not subscription.overflowed:
+            message = await subscription.next(EVENT_HEARTBEAT_SECONDS)
+            if message is None:
+                await websocket.send_text('{"type":"keepalive"}')
+                continue
+            await websocket.send_text(message[2])
+        # 1013 "try again later": the client was too slow and should reconnect and resync.
+        await websocket.send_text('{"type":"overflow"}')
+        await websocket.close(code=1013)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        event_bus.get_bus().unsubscribe(subscription)
+
+
+@app.get("/events/stats")
+async def event_stats() -> Dict[str, int]:
+    return event_bus.get_bus().stats()
+
+
 @app.get("/trades/recent")
-async def trades_recent(limit: int = 50) -> List[Dict[str, Any]]:
+async def trades_recent(limit: int = 50) -> Response:
     try:
-        trades = get_recent_trades(limit=limit)
+        trades = await asyncio.to_thread(get_recent_trades, limit)
     except Exception:
         trades = []
-    return trades
+    return serialization.FastJSONResponse(trades)
 
 
-async def _polling_loop() -> None:
-    symbols_raw = os.getenv("WATCH_SYMBOLS", "")
-    symbols = [s.strip() for s in symbols_raw.split(",") if s.strip()]
-    if not symbols:
-        return
+@app.get("/trades/{trade_id}/audit")
+async def trade_audit(trade_id: int) -> Response:
+    try:
+        bundle = await asyncio.to_thread(audit_store.get_store().get_decision, trade_id)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"audit lookup failed: {exc}")
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="no audit record for this trade")
+    return serialization.FastJSONResponse(bundle)
+
+
+@app.get("/audit/export")
+async def audit_export(since: Optional[datetime] = None, until: Optional[datetime] = None) -> StreamingResponse:
+    """Audited decisions in [since, until) as JSON lines, for offline analysis and replay."""
+    rows = audit_store.get_store().export(since, until)
+
+    async def stream():
+        while True:
+            batch = await asyncio.to_thread(lambda: list(itertools.islice(rows, 100)))
+            if not batch:
+                return
+            yield b"".join(serialization.dumps(row) + b"\n" for row in batch)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/archive")
+async def archive_status() -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(archive.get_archiver().status)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+
+@app.post("/archive/run")
+async def archive_run(retention_days: Optional[float] = None) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(archive.get_archiver().run, retention_days)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"archive run failed: {exc}")
+
+
+@app.get("/archive/query")
+async def archive_query(
+    columns: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[str] = None,
+    limit: int = 1000,
+) -> Response:
+    """Read archived decisions without touching Postgres; only the listed columns are read."""
+    selected = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
     try:
-        interval = int(os.getenv("POLL_INTERVAL_SECONDS", "300"))
+        table = await asyncio.to_thread(archive.scan, selected, since, until, wanted, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    return serialization.FastJSONResponse({"columns": table.column_names, "rows": table.to_pylist()})
+
+
+@app.get("/archive/node_stats")
+async def archive_node_stats(since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(archive.node_stats, since, until)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+
+@app.get("/sweep")
+async def sweep_parameters(
+    samples: int = 500,
+    thresholds: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[str] = None,
+    seed: Optional[int] = None,
+    top: int = 20,
+    refresh: bool = False,
+) -> Dict[str, Any]:
+    """Re-decide the recorded history under many weights/thresholds and return the Pareto front."""
+    try:
+        grid = [float(t) for t in thresholds.split(",") if t.strip()] if thresholds else list(sweep.DEFAULT_THRESHOLDS)
     except ValueError:
-        interval = 300
-    auto_trade = os.getenv("AUTO_TRADE_ENABLED", "false").lower() == "true"
-    nisa_symbols_raw = os.getenv("NISA_SYMBOLS", "")
-    nisa_symbols = [s.strip() for s in nisa_symbols_raw.split(",") if s.strip()]
+        raise HTTPException(status_code=400, detail="thresholds must be comma separated numbers")
+    wanted = [s.strip().upper() for s in symbols.split(",") if s.strip()] if symbols else None
+    settings = get_settings()
+
+    def run() -> Dict[str, Any]:
+        history = sweep.get_history(since, until, wanted, refresh)
+        return sweep.run_sweep(history, max(samples, 1), grid, seed, top, settings)
+
+    try:
+        return await asyncio.to_thread(run)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"sweep failed: {exc}")
+
+
+@app.get("/audit/stats")
+async def audit_stats() -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(audit_store.get_store().stats)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"audit stats failed: {exc}")
+
+
+@app.get("/positions/virtual")
+async def virtual_positions() -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(virtual_ledger.mark_to_market)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"virtual positions unavailable: {exc}")
+
+
+@app.get("/risk/portfolio")
+async def portfolio_risk_snapshot() -> Dict[str, Any]:
+    return await asyncio.to_thread(portfolio_risk.snapshot)
+
+
+@app.get("/nisa/schedule")
+async def nisa_schedule() -> Dict[str, Any]:
+    settings = get_settings()
+    try:
+        return await asyncio.to_thread(nisa_mode.status, list(settings.nisa_symbols), settings)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"NISA state unavailable: {exc}")
+
+
+@app.get("/news")
+async def news_status() -> Dict[str, Any]:
+    return news_store.get_store().status()
+
+
+@app.get("/nodes/weights")
+async def get_node_weights() -> Dict[str, Any]:
+    try:
+        await asyncio.to_thread(node_weights.refresh)
+    except Exception:
+        pass
+    return {
+        "weights": node_weights.get_weights(orchestrator.DEFAULT_WEIGHTS),
+        "stats": node_weights.get_stats(),
+    }
+
+
+@app.post("/nodes/weights/recompute")
+async def recompute_node_weights() -> Dict[str, Any]:
+    try:
+        stats = await asyncio.to_thread(node_weights.recompute_all)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail=f"weight recompute failed: {exc}")
+    return {
+        "weights": node_weights.get_weights(orchestrator.DEFAULT_WEIGHTS),
+        "stats": stats,
+    }
+
+
+async def _run_cycle(
+    symbols: List[str],
+    nisa_symbols: List[str],
+    auto_trade: bool,
+    settings: Optional[Settings] = None,
+) -> Dict[str, Tuple[MarketData, FinalDecision]]:
+    # One snapshot per cycle: a reload mid-cycle never mixes old and new limits.
+    settings = settings or get_settings()
+    # Broker positions and today's journaled P&L are (re)loaded off the event loop.
+    await asyncio.to_thread(portfolio_risk.sync, settings)
+    # Over the LLM budget, open positions are re-checked first and the rest wait their turn.
+    symbols = budget.select_symbols(symbols, portfolio_risk.held_symbols(), settings)
+    orders = []
+    decisions: Dict[str, Tuple[MarketData, FinalDecision]] = {}
+    # When each order's decision was ready: orders are held for the joint portfolio check below.
+    decided_at: List[float] = []
+    for symbol in symbols:
+        try:
+            market_data, decision = await orchestrator.analyze_symbol(symbol, settings)
+            virtual_ledger.update_mark(symbol, market_data.current_price)
+            portfolio_risk.update_mark(symbol, market_data.current_price)
+            decision = risk_manager.apply_risk_filters(decision, market_data, settings)
+            decisions[symbol] = (market_data, decision)
+            if auto_trade:
+                orders.append((symbol, market_data, decision))
+                decided_at.append(time.perf_counter())
+        except Exception:
+            metrics.POLL_ERRORS.inc("analyze")
+            continue
+
+    # NISA mode: scheduled accumulation priced from a single batched quote fetch
+    nisa_orders: List[Any] = []
+    nisa_previous: Dict[str, Any] = {}
+    if auto_trade and nisa_symbols:
+        try:
+            nisa_orders, nisa_previous = await nisa_mode.plan_cycle(nisa_symbols, settings)
+        except Exception:
+            metrics.POLL_ERRORS.inc("nisa")
+            nisa_orders = []
+    orders.extend(nisa_orders)
+
+    if orders:
+        # Claimed NISA runs are settled even if risk or execution raises; no order id releases the claim.
+        nisa_order_ids: List[Optional[str]] = [None] * len(nisa_orders)
+        try:
+            # NISA buys go through the same portfolio limits as signal-driven trades.
+            orders = portfolio_risk.evaluate_cycle(orders, settings)
+            submitted = time.perf_counter()
+            for ready in decided_at:
+                metrics.ORDER_WAIT_SECONDS.observe(submitted - ready)
+            results = await broker_interface.execute_trades(orders, settings)
+            for result in results:
+                metrics.ORDER_SECONDS.observe(result.latency_ms / 1000.0, "error" if result.error is not None else "ok")
+                if result.error is not None:
+                    metrics.POLL_ERRORS.inc("order")
+            if nisa_orders:
+                nisa_order_ids = [r.order_id for r in results[-len(nisa_orders):]]
+            if event_bus.get_bus().has_subscribers():
+                try:
+                    event_bus.publish("pnl", await asyncio.to_thread(virtual_ledger.mark_to_market))
+                except Exception:
+                    pass
+        except Exception:
+            # The cycle's analyses still count; a failed risk check or batch submit only loses its orders.
+            metrics.POLL_ERRORS.inc("order")
+        finally:
+            if nisa_orders:
+                try:
+                    await asyncio.to_thread(nisa_mode.settle, nisa_orders, nisa_order_ids, nisa_previous)
+                except Exception:
+                    metrics.POLL_ERRORS.inc("nisa")
+    return decisions
+
+
+async def _on_price_trigger(symbol: str, reason: str, price: float) -> None:
+    settings = get_settings()
+    with tracing.trace("price_trigger", symbol=symbol, reason=reason, price=price):
+        decisions = await _run_cycle([symbol], [], settings.auto_trade_enabled, settings)
+    if symbol not in decisions:
+        # The analysis failed: keep the current levels and reference rather than disarm the stop.
+        return
+    _, decision = decisions[symbol]
+    price_stream.get_stream().engine.arm(symbol, decision.stop_loss, decision.target_price)
+
+
+async def _polling_loop() -> None:
+    coordinator = coordination.get_coordinator()
+    watch = scheduler.get_scheduler()
+    next_nisa = 0.0
+    while True:
+        try:
+            settings = get_settings()
+            now = time.time()
+            # With several workers/replicas each polls only its shard; NISA buying is leader-only.
+            symbols = coordinator.owned(settings.watch_symbols)
+            # Symbols the stream is ticking are analysed on price triggers; the rest (not yet
+            # subscribed, illiquid, or the stream dropped) stay on the polling schedule.
+            streamed = price_stream.get_stream().covered(symbols, settings.poll_interval_seconds)
+            if streamed:
+                symbols = [s for s in symbols if s not in streamed]
+            watch.sync(symbols, now, settings)
+            due = watch.pop_due(now, settings.schedule_batch_size)
+            nisa_symbols: List[str] = []
+            if coordinator.is_leader() and settings.nisa_symbols and now >= next_nisa:
+                if not settings.market_hours_only or market_calendar.session(now) == "regular":
+                    nisa_symbols = list(settings.nisa_symbols)
+                    next_nisa = now + settings.poll_interval_seconds
+            if due or nisa_symbols:
+                started = time.perf_counter()
+                results: Dict[str, Tuple[MarketData, FinalDecision]] = {}
+                try:
+                    with tracing.trace("polling_cycle", symbols=len(due), nisa_symbols=len(nisa_symbols)):
+                        results = await _run_cycle(due, nisa_symbols, settings.auto_trade_enabled, settings)
+                finally:
+                    # Every popped symbol goes back on the heap, analysed or not.
+                    for symbol in due:
+                        market_data, decision = results.get(symbol, (None, None))
+                        watch.reschedule(symbol, market_data, decision, settings)
+                elapsed = time.perf_counter() - started
+                metrics.POLL_CYCLE_SECONDS.observe(elapsed)
+                metrics.POLL_INTERVAL_SECONDS.set(settings.poll_interval_seconds)
+                metrics.POLL_CYCLE_UTILIZATION.set(elapsed / settings.poll_interval_seconds)
+            if len(due) >= settings.schedule_batch_size:
+                # More symbols may already be overdue; go straight to the next batch.
+                await asyncio.sleep(0)
+                continue
+            next_due = watch.next_due()
+            wake = min(next_due if next_due is not None else math.inf, next_nisa if settings.nisa_symbols else math.inf)
+            # Wake at least every few seconds so new watch symbols and settings are picked up.
+            await asyncio.sleep(min(max(wake - time.time(), 0.0), SCHEDULER_IDLE_SECONDS))
+        except Exception:
+            # Nothing may end the polling task: count the failure and try again shortly.
+            metrics.POLL_ERRORS.inc("cycle")
+            await asyncio.sleep(SCHEDULER_IDLE_SECONDS)
+
+
+async def _heartbeat_loop() -> None:
+    coordinator = coordination.get_coordinator()
+    joined = False
     while True:
-        for symbol in symbols:
+        # Always running: COORDINATION_ENABLED can be switched through app_settings at any time.
+        try:
+            if coordinator.enabled:
+                await asyncio.to_thread(coordinator.heartbeat)
+                joined = True
+            elif joined:
+                await asyncio.to_thread(coordinator.release)
+                joined = False
+        except Exception:
+            pass
+        await asyncio.sleep(coordinator.heartbeat_interval)
+
+
+async def _budget_loop() -> None:
+    controller = budget.get_controller()
+    try:
+        await asyncio.to_thread(controller.load)
+    except Exception:
+        pass
+    while True:
+        await asyncio.sleep(controller.flush_interval)
+        if controller.pricing_age() > controller.pricing_refresh_interval:
             try:
-                market_data = await data_fetcher.fetch_market_data(symbol)
-                decision = await orchestrator.run_analysis(market_data)
-                decision = risk_manager.apply_risk_filters(decision, market_data)
-                if auto_trade:
-                    try:
-                        broker_interface.execute_trade(symbol, market_data, decision)
-                    except Exception:
-                        continue
+                await OpenRouterClient().list_models()
             except Exception:
-                continue
+                pass
+        try:
+            await asyncio.to_thread(controller.flush)
+        except Exception:
+            continue
+
 
-        # NISA mode: simple periodic buying of specified funds
-        for symbol in nisa_symbols:
+async def _node_weight_loop() -> None:
+    # Learned weights are read from memory during analysis; the trade history is polled here.
+    while True:
+        settings = get_settings()
+        try:
+            await asyncio.to_thread(node_weights.refresh, settings)
+        except Exception:
+            pass
+        await asyncio.sleep(max(settings.node_weight_refresh_seconds, 1.0))
+
+
+async def _archive_loop() -> None:
+    archiver = archive.get_archiver()
+    coordinator = coordination.get_coordinator()
+    while True:
+        await asyncio.sleep(archiver.interval)
+        # One archiver per cluster: two would race on the same rows and files.
+        if not coordinator.is_leader():
+            continue
+        if archiver.retention_days > 0:
             try:
-                market_data = await data_fetcher.fetch_market_data(symbol)
-                nisa_decision = nisa_mode.create_nisa_decision(symbol, market_data)
-                if nisa_decision is not None and auto_trade:
-                    broker_interface.execute_trade(symbol, market_data, nisa_decision)
+                await asyncio.to_thread(archiver.run)
             except Exception:
-                continue
+                metrics.POLL_ERRORS.inc("archive")
+        audit_retention_days = get_settings().audit_retention_days
+        if audit_retention_days > 0:
+            try:
+                await asyncio.to_thread(audit_store.get_store().prune, audit_retention_days)
+            except Exception:
+                metrics.POLL_ERRORS.inc("audit_prune")
+
+
+async def _settings_reload_loop() -> None:
+    while True:
+        interval = get_settings().settings_reload_seconds
+        if interval <= 0:
+            return
         await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(app_settings.reload)
+        except Exception:
+            continue
 
 
 @app.on_event("startup")
 async def start_polling() -> None:
+    if os.getenv(db.DATABASE_URL_ENV):
+        try:
+            await asyncio.to_thread(db.ensure_schema)
+        except Exception as exc:
+            logger.error("schema migration failed: %s", exc)
+    await asyncio.to_thread(app_settings.reload)
+    event_bus.get_bus().bind(asyncio.get_running_loop())
+    jobs.get_queue().start()
+    discord_notifier.start_worker()
+    asyncio.create_task(_settings_reload_loop())
+    asyncio.create_task(_budget_loop())
+    asyncio.create_task(_node_weight_loop())
+    asyncio.create_task(_archive_loop())
+    if price_stream.stream_mode() != "off":
+        coordinator = coordination.get_coordinator()
+        asyncio.create_task(
+            price_stream.get_stream().run(lambda: coordinator.owned(get_settings().watch_symbols), _on_price_trigger)
+        )
+    if coordination.get_coordinator().enabled:
+        # Join before the first poll so this worker starts out owning its share.
+        try:
+            await asyncio.to_thread(coordination.get_coordinator().heartbeat)
+        except Exception:
+            pass
+    asyncio.create_task(_heartbeat_loop())
     asyncio.create_task(_polling_loop())
+
+
+@app.on_event("shutdown")
+async def stop_background_workers() -> None:
+    await jobs.get_queue().stop()
+    if coordination.get_coordinator().enabled:
+        try:
+            await asyncio.to_thread(coordination.get_coordinator().release)
+        except Exception:
+            pass
+    await discord_notifier.stop_worker()
+    await http_client.aclose()
+    await asyncio.to_thread(tracing.stop_exporter)
@@ -0,0 +1,152 @@
+"""US equity (NYSE/Nasdaq) trading calendar.
+
+Sessions are computed from rules rather than a timezone database or holiday
+feed: Eastern time follows the post-2007 US daylight saving rule, and holidays
+and early closes follow the NYSE rules (weekend holidays observed on the
+nearest weekday). One-off closures (national days of mourning and the like) are
+not known in advance and are not modelled.
+"""
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Optional
+
+
+REGULAR_OPEN = dtime(9, 30)
+REGULAR_CLOSE = dtime(16, 0)
+EARLY_CLOSE = dtime(13, 0)
+PRE_MARKET_OPEN = dtime(4, 0)
+POST_MARKET_CLOSE = dtime(20, 0)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def _last_weekday(year: int, month: int, weekday: int) -> date:
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    # Anonymous Gregorian algorithm.
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _observed(day: date) -> date:
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=16)
+def holidays(year: int) -> Dict[date, str]:
+    days = {
+        _nth_weekday(year, 1, 0, 3): "Martin Luther King Jr. Day",
+        _nth_weekday(year, 2, 0, 3): "Washington's Birthday",
+        _easter(year) - timedelta(days=2): "Good Friday",
+        _last_weekday(year, 5, 0): "Memorial Day",
+        _observed(date(year, 7, 4)): "Independence Day",
+        _nth_weekday(year, 9, 0, 1): "Labor Day",
+        _nth_weekday(year, 11, 3, 4): "Thanksgiving Day",
+        _observed(date(year, 12, 25)): "Christmas Day",
+    }
+    # New Year's Day falling on a Saturday is not observed on the preceding Friday.
+    new_year = _observed(date(year, 1, 1))
+    if new_year.year == year:
+        days[new_year] = "New Year's Day"
+    if year >= 2022:
+        days[_observed(date(year, 6, 19))] = "Juneteenth"
+    return days
+
+
+@lru_cache(maxsize=16)
+def early_closes(year: int) -> Dict[date, dtime]:
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1): EARLY_CLOSE}
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() < 5 and not is_holiday(day):
+            days[day] = EARLY_CLOSE
+    return days
+
+
+def is_holiday(day: date) -> bool:
+    return day in holidays(day.year)
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and not is_holiday(day)
+
+
+def _utc_offset(moment: datetime) -> timedelta:
+    """Eastern offset for a UTC moment: DST from 2:00 local on the second Sunday of March
+    to 2:00 local on the first Sunday of November."""
+    year = moment.year
+    dst_start = datetime.combine(_nth_weekday(year, 3, 6, 2), dtime(7, 0), timezone.utc)
+    dst_end = datetime.combine(_nth_weekday(year, 11, 6, 1), dtime(6, 0), timezone.utc)
+    return timedelta(hours=-4) if dst_start <= moment < dst_end else timedelta(hours=-5)
+
+
+def to_eastern(ts: float) -> datetime:
+    moment = datetime.fromtimestamp(ts, timezone.utc)
+    offset = _utc_offset(moment)
+    return (moment + offset).replace(tzinfo=timezone(offset))
+
+
+def _from_eastern(day: date, at: dtime) -> float:
+    naive = datetime.combine(day, at)
+    # The offset at noon UTC of that day is right for all session times (none fall near 2:00).
+    offset = _utc_offset(datetime.combine(day, dtime(12, 0), timezone.utc))
+    return (naive - offset).replace(tzinfo=timezone.utc).timestamp()
+
+
+def close_time(day: date) -> dtime:
+    return early_closes(day.year).get(day, REGULAR_CLOSE)
+
+
+def session(ts: float) -> str:
+    """"regular", "pre", "post" or "closed" for a Unix timestamp."""
+    local = to_eastern(ts)
+    day, now = local.date(), local.time()
+    if not is_trading_day(day):
+        return "closed"
+    if REGULAR_OPEN <= now < close_time(day):
+        return "regular"
+    if PRE_MARKET_OPEN <= now < REGULAR_OPEN:
+        return "pre"
+    if close_time(day) <= now < POST_MARKET_CLOSE:
+        return "post"
+    return "closed"
+
+
+def next_open(ts: float) -> float:
+    """Timestamp of the next regular-session open at or after ts (ts itself during a session)."""
+    if session(ts) == "regular":
+        return ts
+    day = to_eastern(ts).date()
+    for _ in range(15):
+        if is_trading_day(day):
+            opens = _from_eastern(day, REGULAR_OPEN)
+            if opens >= ts:
+                return opens
+        day += timedelta(days=1)
+    raise RuntimeError("no trading day found in the next two weeks")
+
+
+def next_close(ts: float) -> Optional[float]:
+    """End of the current regular session, or None outside one."""
+    if session(ts) != "regular":
+        return None
+    day = to_eastern(ts).date()
+    return _from_eastern(day, close_time(day))
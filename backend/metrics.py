@@ -0,0 +1,230 @@
+"""Minimal Prometheus-compatible metrics, rendered by GET /metrics.
+
+Counters and histograms are plain dicts behind a lock, so recording costs a
+dict lookup and a bisect. Every metric caps its number of label combinations
+at MAX_SERIES; further combinations are folded into an "other" series, so a
+misbehaving label (an arbitrary model id, say) cannot grow memory without
+bound. Only low-cardinality values (Alpha Vantage function, node, model,
+trading mode, outcome) are used as labels, never symbols.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+MAX_SERIES = 100
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, values: Sequence[str], series: Dict[LabelValues, object]) -> LabelValues:
+        key = tuple(str(v) for v in values)
+        if key not in series and len(series) >= MAX_SERIES:
+            return tuple("other" for _ in self.labels)
+        return key
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            key = self._key(labels, self._values)
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels, self._values)] = float(value)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class GaugeFunction(_Metric):
+    """A gauge sampled from a callback at scrape time (queue depths, subscriber counts)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float]) -> None:
+        super().__init__(name, help_text)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per-bucket counts incl. +Inf, sum)
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels, self._series)
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._series.items()]
+        lines = self.header()
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+_registry: List[_Metric] = []
+
+
+def _register(metric: _Metric) -> _Metric:
+    _registry.append(metric)
+    return metric
+
+
+def counter(name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help_text, labels))  # type: ignore[return-value]
+
+
+def gauge(name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, help_text, labels))  # type: ignore[return-value]
+
+
+def gauge_function(name: str, help_text: str, fn: Callable[[], float]) -> GaugeFunction:
+    return _register(GaugeFunction(name, help_text, fn))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    labels: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, help_text, labels, buckets))  # type: ignore[return-value]
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Upstream calls
+ALPHAVANTAGE_SECONDS = histogram(
+    "alphavantage_request_seconds", "Alpha Vantage request latency by function.", ("function", "outcome")
+)
+LLM_CHAT_SECONDS = histogram("llm_chat_seconds", "OpenRouter chat completion latency by model.", ("model", "outcome"))
+UPSTREAM_TIMEOUTS = counter("upstream_timeouts_total", "Upstream HTTP timeouts.", ("service",))
+LLM_TOKENS = counter("llm_tokens_total", "OpenRouter tokens by model, node and kind.", ("model", "node", "kind"))
+LLM_COST_USD = counter("llm_cost_usd_total", "OpenRouter spend in USD by model and node.", ("model", "node"))
+BUDGET_ACTIONS = counter("llm_budget_actions_total", "Nodes downgraded or skipped and symbols deferred by the LLM budget.", ("action",))
+
+# Pipeline stages
+NODE_SECONDS = histogram("node_seconds", "Analysis node latency including parsing.", ("node", "model"))
+NODE_FALLBACKS = counter("node_fallbacks_total", "Node results replaced by the HOLD fallback after an error.", ("node",))
+NEWS_HEADLINES = counter("news_headlines_total", "Headlines reviewed by the sentiment node, new or already prompted.", ("kind",))
+SENTIMENT_SCORING = counter("sentiment_scoring_total", "Sentiment node results by scorer (llm, local, local_cached).", ("scorer",))
+ANALYSIS_SECONDS = histogram("run_analysis_seconds", "run_analysis latency (all nodes plus aggregation).")
+RISK_FILTER_SECONDS = histogram("risk_filter_seconds", "Risk filter latency by stage.", ("stage",), FAST_BUCKETS)
+BROKER_SUBMIT_SECONDS = histogram("broker_submit_seconds", "Broker order submit latency.", ("mode", "outcome"))
+DISCORD_DROPPED = counter("discord_notifications_dropped_total", "Trade notifications never delivered to Discord, by reason.", ("reason",))
+ORDER_SECONDS = histogram("order_seconds", "Per-order execution latency (submit, journal, notify) by outcome.", ("outcome",))
+ORDER_WAIT_SECONDS = histogram("order_wait_seconds", "Time a signal order waited between its decision and submission.")
+DB_QUERY_SECONDS = histogram("db_query_seconds", "Database statement latency by statement and table.", ("statement", "table"))
+TRACE_EXPORT_DROPPED = counter("trace_export_dropped_total", "Traces not written to TRACE_EXPORT_PATH.", ("reason",))
+SINGLE_FLIGHT = counter("analysis_single_flight_total", "Analyses started, joined in flight or reused.", ("result",))
+
+# Polling loop
+POLL_CYCLE_SECONDS = histogram("polling_cycle_seconds", "Duration of one polling cycle.")
+POLL_INTERVAL_SECONDS = gauge("polling_interval_seconds", "Configured POLL_INTERVAL_SECONDS.")
+POLL_CYCLE_UTILIZATION = gauge("polling_cycle_utilization", "Last cycle duration divided by POLL_INTERVAL_SECONDS.")
+SCHEDULE_LAG_SECONDS = histogram("schedule_lag_seconds", "How late a symbol was analysed after it fell due.")
+PRICE_TRIGGERS = counter("price_triggers_total", "Analyses triggered by the price stream, by reason.", ("reason",))
+POLL_ERRORS = counter("polling_errors_total", "Symbols skipped in a polling cycle because of an error.", ("stage",))
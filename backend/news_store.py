@@ -0,0 +1,221 @@
+"""Headline deduplication and a local sentiment scorer for the news feed.
+
+Alpha Vantage returns the same market-wide headlines for many tickers and
+again on every poll. Headlines are keyed by the SHA-256 of their normalized
+text (case, punctuation, whitespace and a trailing " - Source" folded away),
+so a story is known once across all symbols and polls. The sentiment node
+only sends the LLM headlines no prompt has carried yet; when a symbol's feed
+has nothing new it is scored locally from the per-article
+overall_sentiment_score instead, memoized per feed fingerprint.
+
+Records expire after NEWS_TTL_HOURS, so a story that resurfaces days later
+counts as new again. NEWS_DEDUP=false restores one LLM call per analysis with
+the full feed. State is per process; with coordination each worker dedups the
+symbols it owns.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import metrics
+from schemas import NewsSentimentItem
+
+
+MAX_HEADLINES = 20_000
+MAX_SCORES = 2_000
+# Alpha Vantage's own bands: scores within +-0.15 are labelled Neutral.
+NEUTRAL_BAND = 0.15
+MAX_LOCAL_CONFIDENCE = 0.8
+
+# A short, digit-free tail after a dash or bar is taken for the outlet name.
+_SOURCE_SUFFIX = re.compile(r"\s+[-|–—]\s+[^-|–—\d]{1,40}$")
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def enabled() -> bool:
+    # Imported here: settings imports the node modules, which import this one.
+    from settings import get_settings
+
+    return get_settings().news_dedup
+
+
+def normalize(headline: str) -> str:
+    text = unicodedata.normalize("NFKC", headline).strip()
+    text = _SOURCE_SUFFIX.sub("", text)
+    text = _NON_WORD.sub(" ", text.lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+def headline_hash(headline: str) -> str:
+    return hashlib.sha256(normalize(headline).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Record:
+    headline: str
+    score: float
+    first_seen: float
+    last_seen: float
+    symbols: Set[str] = field(default_factory=set)
+    prompted: bool = False
+
+
+@dataclass
+class NewsReview:
+    symbol: str
+    new: List[NewsSentimentItem]
+    known: List[NewsSentimentItem]
+    hashes: List[str]
+    fingerprint: str
+
+    @property
+    def items(self) -> List[NewsSentimentItem]:
+        return self.new + self.known
+
+
+@dataclass
+class LocalScore:
+    recommendation: str
+    confidence: float
+    mean_score: float
+    headlines: int
+    reasoning: str
+
+
+def score_items(items: Sequence[NewsSentimentItem]) -> LocalScore:
+    """Mean Alpha Vantage sentiment mapped to a vote; inside the neutral band it is HOLD."""
+    if not items:
+        return LocalScore("HOLD", 0.5, 0.0, 0, "local_news_score: no headlines")
+    mean_score = sum(item.sentiment_score for item in items) / len(items)
+    if mean_score >= NEUTRAL_BAND:
+        recommendation = "BUY"
+    elif mean_score <= -NEUTRAL_BAND:
+        recommendation = "SELL"
+    else:
+        recommendation = "HOLD"
+    confidence = 0.5 if recommendation == "HOLD" else min(0.5 + abs(mean_score), MAX_LOCAL_CONFIDENCE)
+    reasoning = f"local_news_score: mean sentiment {mean_score:+.3f} over {len(items)} known headlines"
+    return LocalScore(recommendation, confidence, mean_score, len(items), reasoning)
+
+
+class NewsStore:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, _Record]" = OrderedDict()
+        self._scores: "OrderedDict[str, LocalScore]" = OrderedDict()
+        self._counts: Dict[str, int] = {"new": 0, "known": 0, "local": 0, "local_cached": 0, "llm": 0}
+
+    @property
+    def ttl_seconds(self) -> float:
+        from settings import get_settings
+
+        return get_settings().news_ttl_hours * 3600.0
+
+    def _expire(self, now: float) -> None:
+        ttl = self.ttl_seconds
+        while self._records:
+            digest, record = next(iter(self._records.items()))
+            if now - record.last_seen <= ttl and len(self._records) <= MAX_HEADLINES:
+                break
+            del self._records[digest]
+
+    def review(self, symbol: str, items: Sequence[NewsSentimentItem], now: Optional[float] = None) -> NewsReview:
+        """Split a symbol's feed into headlines no prompt has carried yet and known ones."""
+        now = time.time() if now is None else now
+        new: List[NewsSentimentItem] = []
+        known: List[NewsSentimentItem] = []
+        hashes: List[str] = []
+        with self._lock:
+            self._expire(now)
+            for item in items:
+                digest = headline_hash(item.headline)
+                if digest in hashes:
+                    continue
+                hashes.append(digest)
+                record = self._records.get(digest)
+                if record is None:
+                    record = _Record(item.headline, item.sentiment_score, now, now)
+                    self._records[digest] = record
+                record.last_seen = now
+                record.score = item.sentiment_score
+                record.symbols.add(symbol)
+                self._records.move_to_end(digest)
+                (known if record.prompted else new).append(item)
+            self._counts["new"] += len(new)
+            self._counts["known"] += len(known)
+        metrics.NEWS_HEADLINES.inc("new", amount=len(new))
+        metrics.NEWS_HEADLINES.inc("known", amount=len(known))
+        # Scores are part of the key: Alpha Vantage re-scores articles as they age.
+        scored = sorted(f"{headline_hash(item.headline)}:{item.sentiment_score}" for item in new + known)
+        fingerprint = hashlib.sha256("\n".join(scored).encode("ascii")).hexdigest()
+        return NewsReview(symbol, new, known, hashes, fingerprint)
+
+    def mark_prompted(self, review: NewsReview) -> None:
+        """Call once the LLM has seen review.new, so other symbols and later polls skip them."""
+        with self._lock:
+            for item in review.new:
+                record = self._records.get(headline_hash(item.headline))
+                if record is not None:
+                    record.prompted = True
+            self._counts["llm"] += 1
+        metrics.SENTIMENT_SCORING.inc("llm")
+
+    def local_score(self, review: NewsReview) -> LocalScore:
+        with self._lock:
+            cached = self._scores.get(review.fingerprint)
+            if cached is not None:
+                self._scores.move_to_end(review.fingerprint)
+                self._counts["local_cached"] += 1
+        if cached is not None:
+            metrics.SENTIMENT_SCORING.inc("local_cached")
+            return cached
+        result = score_items(review.items)
+        with self._lock:
+            self._scores[review.fingerprint] = result
+            while len(self._scores) > MAX_SCORES:
+                self._scores.popitem(last=False)
+            self._counts["local"] += 1
+        metrics.SENTIMENT_SCORING.inc("local")
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            records = list(self._records.values())
+            counts = dict(self._counts)
+        shared = sorted(records, key=lambda r: len(r.symbols), reverse=True)[:10]
+        return {
+            "enabled": enabled(),
+            "ttl_hours": self.ttl_seconds / 3600.0,
+            "headlines": len(records),
+            "prompted": sum(1 for r in records if r.prompted),
+            "counts": counts,
+            "most_shared": [
+                {"headline": r.headline, "symbols": sorted(r.symbols), "score": r.score, "prompted": r.prompted}
+                for r in shared
+                if len(r.symbols) > 1
+            ],
+        }
+
+
+def prompt_news(review: NewsReview) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """New headlines in full, and the known ones folded into a count and mean score."""
+    fresh = [item.model_dump() for item in review.new]
+    summary: Dict[str, Any] = {"previously_seen_headlines": len(review.known)}
+    if review.known:
+        summary["previously_seen_mean_sentiment"] = round(
+            sum(item.sentiment_score for item in review.known) / len(review.known), 4
+        )
+    return fresh, summary
+
+
+_store = NewsStore()
+
+
+def get_store() -> NewsStore:
+    return _store
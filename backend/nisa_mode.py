@@ -1,39 +1,45 @@
-import os
-from typing import Dict
+import asyncio
+import calendar
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from schemas import FinalDecision, MarketData, NodeRecommendation
+from db import get_connection
+from nodes import data_fetcher
+from schemas import FinalDecision, MarketData
+from settings import Settings, get_settings
 
 
-def create_nisa_decision(symbol: str, market_data: MarketData) -> FinalDecision | None:
+WEEKDAYS = {"MON": 0, "TUE": 1, "WED": 2, "THU": 3, "FRI": 4}
+
+Order = Tuple[str, MarketData, FinalDecision]
+
+
+def create_nisa_decision(
+    symbol: str,
+    market_data: MarketData,
+    settings: Optional[Settings] = None,
+) -> FinalDecision | None:
     """SIP/NISA-like simple decision.
 
     - Always BUY if enabled and price is below optional max price.
     - Invest fixed amount per run, controlled by NISA_INVEST_AMOUNT.
     """
-    enabled = os.getenv("NISA_ENABLED", "false").lower() == "true"
-    if not enabled:
+    settings = settings or get_settings()
+    if not settings.nisa_enabled:
         return None
 
-    max_price_str = os.getenv("NISA_MAX_PRICE", "")
-    if max_price_str:
-        try:
-            max_price = float(max_price_str)
-            if market_data.current_price > max_price:
-                return None
-        except ValueError:
-            pass
+    if settings.nisa_max_price is not None and market_data.current_price > settings.nisa_max_price:
+        return None
 
-    invest_amount_str = os.getenv("NISA_INVEST_AMOUNT", "0")
-    try:
-        invest_amount = float(invest_amount_str)
-    except ValueError:
-        invest_amount = 0.0
+    invest_amount = settings.nisa_invest_amount
     if invest_amount <= 0:
         return None
 
     votes: Dict[str, int] = {"BUY": 1, "SELL": 0, "HOLD": 0}
 
-    return FinalDecision(
+    return FinalDecision.model_construct(
         final_decision="BUY",
         aggregate_confidence=1.0,
         votes=votes,
@@ -43,3 +49,246 @@ def create_nisa_decision(symbol: str, market_data: MarketData) -> FinalDecision
         stop_loss=None,
         node_results=[],
     )
+
+
+def _next_business_day(day: date) -> date:
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+@dataclass(frozen=True)
+class Schedule:
+    """Calendar rule for accumulation buys.
+
+    - ``business_day``: every Monday-Friday
+    - ``weekly:MON[,THU]``: the given weekdays
+    - ``monthly:1[,15]``: the given days of month (clamped to month end), moved to the
+      next business day when they fall on a weekend
+    """
+
+    kind: str
+    days: Tuple[int, ...] = ()
+
+    def occurrences(self, start: date, end: date) -> List[date]:
+        if self.kind == "business_day":
+            return [d for d in _days(start, end) if d.weekday() < 5]
+        if self.kind == "weekly":
+            return [d for d in _days(start, end) if d.weekday() in self.days]
+        found = set()
+        # Start a month early: a date moved past a weekend can spill into the window.
+        first = start.replace(day=1) - timedelta(days=1)
+        year, month = first.year, first.month
+        while date(year, month, 1) <= end:
+            last = calendar.monthrange(year, month)[1]
+            for day in self.days:
+                run = _next_business_day(date(year, month, min(day, last)))
+                if start <= run <= end:
+                    found.add(run)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return sorted(found)
+
+    def latest_on_or_before(self, day: date) -> Optional[date]:
+        runs = self.occurrences(day - timedelta(days=40), day)
+        return runs[-1] if runs else None
+
+    def next_after(self, day: date) -> Optional[date]:
+        runs = self.occurrences(day + timedelta(days=1), day + timedelta(days=70))
+        return runs[0] if runs else None
+
+    def is_due(self, last_run: Optional[date], today: date) -> bool:
+        """Due once per scheduled date; missed dates (e.g. downtime) are caught up with a single buy.
+
+        A symbol that has never run waits for its first scheduled date instead of buying at once.
+        """
+        latest = self.latest_on_or_before(today)
+        if latest is None:
+            return False
+        if last_run is None:
+            return latest == today
+        return last_run < latest
+
+
+def _days(start: date, end: date) -> List[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def parse_schedule(text: str) -> Schedule:
+    kind, _, args = text.strip().lower().partition(":")
+    if kind in {"business_day", "daily"} and not args:
+        return Schedule("business_day")
+    if kind == "weekly" and args:
+        names = [a.strip().upper() for a in args.split(",") if a.strip()]
+        if not names or any(n not in WEEKDAYS for n in names):
+            raise ValueError(f"weekly schedule takes MON-FRI, got {args!r}")
+        return Schedule("weekly", tuple(sorted(WEEKDAYS[n] for n in names)))
+    if kind == "monthly" and args:
+        try:
+            days = tuple(sorted(int(a) for a in args.split(",") if a.strip()))
+        except ValueError:
+            raise ValueError(f"monthly schedule takes days of month, got {args!r}") from None
+        if not days or any(not 1 <= d <= 31 for d in days):
+            raise ValueError(f"monthly schedule days must be 1-31, got {args!r}")
+        return Schedule("monthly", days)
+    raise ValueError(f"unknown schedule {text!r}; use business_day, weekly:MON or monthly:1")
+
+
+class AccumulationEngine:
+    """Scheduled dollar-cost averaging over NISA_SYMBOLS.
+
+    The last run date per symbol lives in nisa_runs. A run is claimed with a
+    compare-and-set before the order goes out and released again if no order was
+    placed, so a restart (or a second instance) never buys the same date twice.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last_run: Dict[str, Optional[date]] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT symbol, last_run FROM nisa_runs")
+                rows = cur.fetchall()
+        with self._lock:
+            self._last_run.update({str(symbol): last_run for symbol, last_run in rows})
+            self._loaded = True
+
+    def last_runs(self) -> Dict[str, Optional[date]]:
+        if not self._loaded:
+            self._load()
+        with self._lock:
+            return dict(self._last_run)
+
+    def due_symbols(self, symbols: Sequence[str], schedule: Schedule, today: date) -> List[str]:
+        last_runs = self.last_runs()
+        return [s for s in dict.fromkeys(symbols) if schedule.is_due(last_runs.get(s), today)]
+
+    def claim(self, symbols: Sequence[str], today: date) -> List[str]:
+        """Mark today's run for each symbol, keeping only those no one else claimed first."""
+        claimed: List[str] = []
+        now = datetime.utcnow()
+        with self._lock:
+            expected = {s: self._last_run.get(s) for s in symbols}
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                for symbol in symbols:
+                    cur.execute(
+                        """
+                        INSERT INTO nisa_runs (symbol, last_run, updated_at)
+                        VALUES (%s, NULL, %s)
+                        ON CONFLICT (symbol) DO NOTHING
+                        """,
+                        (symbol, now),
+                    )
+                    cur.execute(
+                        """
+                        UPDATE nisa_runs SET last_run = %s, updated_at = %s
+                        WHERE symbol = %s AND last_run IS NOT DISTINCT FROM %s
+                        """,
+                        (today, now, symbol, expected[symbol]),
+                    )
+                    if cur.rowcount == 1:
+                        claimed.append(symbol)
+            conn.commit()
+        with self._lock:
+            for symbol in claimed:
+                self._last_run[symbol] = today
+        # Anything we lost the race for is stale in the cache.
+        if len(claimed) != len(symbols):
+            self._load()
+        return claimed
+
+    def settle(self, orders: Sequence[Order], order_ids: Sequence[Optional[str]], previous: Dict[str, Optional[date]]) -> None:
+        """Record placed orders; release the claim for orders that were blocked or failed so they retry."""
+        now = datetime.utcnow()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                for (symbol, _, _), order_id in zip(orders, order_ids):
+                    if order_id:
+                        cur.execute(
+                            "UPDATE nisa_runs SET last_order_id = %s, updated_at = %s WHERE symbol = %s",
+                            (order_id, now, symbol),
+                        )
+                    else:
+                        cur.execute(
+                            "UPDATE nisa_runs SET last_run = %s, updated_at = %s WHERE symbol = %s",
+                            (previous.get(symbol), now, symbol),
+                        )
+            conn.commit()
+        with self._lock:
+            for (symbol, _, _), order_id in zip(orders, order_ids):
+                if not order_id:
+                    self._last_run[symbol] = previous.get(symbol)
+
+    async def plan_cycle(
+        self,
+        symbols: Sequence[str],
+        settings: Settings,
+        today: Optional[date] = None,
+    ) -> Tuple[List[Order], Dict[str, Optional[date]]]:
+        """Orders for symbols whose scheduled date has come, priced from one batched quote fetch.
+
+        Returns the claimed orders and the previous last-run dates needed to settle them.
+        """
+        if not settings.nisa_enabled or settings.nisa_invest_amount <= 0 or not symbols:
+            return [], {}
+        today = today or date.today()
+        schedule = parse_schedule(settings.nisa_schedule)
+        due = await asyncio.to_thread(self.due_symbols, symbols, schedule, today)
+        if not due:
+            return [], {}
+        quotes = await data_fetcher.fetch_quotes(due)
+        candidates: List[Order] = []
+        for symbol in due:
+            market_data = quotes.get(symbol)
+            if market_data is None:
+                continue
+            decision = create_nisa_decision(symbol, market_data, settings)
+            if decision is not None:
+                candidates.append((symbol, market_data, decision))
+        if not candidates:
+            return [], {}
+        previous = self.last_runs()
+        claimed = set(await asyncio.to_thread(self.claim, [c[0] for c in candidates], today))
+        return [c for c in candidates if c[0] in claimed], previous
+
+    def status(self, symbols: Sequence[str], settings: Settings, today: Optional[date] = None) -> Dict[str, Any]:
+        today = today or date.today()
+        schedule = parse_schedule(settings.nisa_schedule)
+        last_runs = self.last_runs()
+        return {
+            "enabled": settings.nisa_enabled,
+            "schedule": settings.nisa_schedule,
+            "symbols": {
+                s: {
+                    "last_run": last_runs.get(s).isoformat() if last_runs.get(s) else None,
+                    "due": schedule.is_due(last_runs.get(s), today),
+                    "next_run": (schedule.next_after(today) or today).isoformat(),
+                }
+                for s in symbols
+            },
+        }
+
+
+_engine = AccumulationEngine()
+
+
+def get_engine() -> AccumulationEngine:
+    return _engine
+
+
+async def plan_cycle(
+    symbols: Sequence[str],
+    settings: Optional[Settings] = None,
+) -> Tuple[List[Order], Dict[str, Optional[date]]]:
+    return await _engine.plan_cycle(symbols, settings or get_settings())
+
+
+def settle(orders: Sequence[Order], order_ids: Sequence[Optional[str]], previous: Dict[str, Optional[date]]) -> None:
+    _engine.settle(orders, order_ids, previous)
+
+
+def status(symbols: Sequence[str], settings: Optional[Settings] = None) -> Dict[str, Any]:
+    return _engine.status(symbols, settings or get_settings())
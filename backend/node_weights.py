@@ -0,0 +1,269 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from db import get_connection
+from settings import Settings, get_settings
+
+# Beta(2, 2) prior: an unseen node starts at 50% accuracy and keeps its base weight.
+PRIOR_CORRECT = 2.0
+PRIOR_TOTAL = 4.0
+
+_OUTCOME_COLUMNS = "id, timestamp, decision, profit_loss, node_votes"
+
+Outcome = Tuple[int, datetime, str, float, List[Dict[str, Any]]]
+
+
+def _to_epoch(ts: Any) -> float:
+    if isinstance(ts, datetime):
+        return ts.timestamp()
+    if isinstance(ts, str):
+        return datetime.fromisoformat(ts).timestamp()
+    return float(ts)
+
+
+def compute_node_stats(
+    outcomes: Iterable[Outcome],
+    now: float,
+    half_life_seconds: float,
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Decayed (correct, total) vote counts per node over closed trades.
+
+    A node is credited when it agreed with the executed decision and the trade
+    was profitable, or disagreed with it and the trade lost money.
+    """
+    rows = list(outcomes)
+    if not rows:
+        return {}, {}
+    node_ids = sorted({vote["node_id"] for row in rows for vote in (row[4] or [])})
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+
+    voted = np.zeros((len(rows), len(node_ids)), dtype=bool)
+    agreed = np.zeros_like(voted)
+    ages = np.empty(len(rows), dtype=np.float64)
+    pnl = np.empty(len(rows), dtype=np.float64)
+    for r, (_, ts, decision, profit_loss, votes) in enumerate(rows):
+        ages[r] = now - _to_epoch(ts)
+        pnl[r] = profit_loss
+        for vote in votes or []:
+            c = index[vote["node_id"]]
+            voted[r, c] = True
+            agreed[r, c] = vote.get("recommendation") == decision
+
+    decay = np.power(0.5, np.clip(ages, 0.0, None) / half_life_seconds)
+    correct_mask = voted & (agreed == (pnl > 0)[:, None])
+    correct = decay @ correct_mask
+    total = decay @ voted
+    return (
+        {node_id: float(correct[i]) for node_id, i in index.items()},
+        {node_id: float(total[i]) for node_id, i in index.items()},
+    )
+
+
+def weights_from_stats(
+    base: Dict[str, float],
+    correct: Dict[str, float],
+    total: Dict[str, float],
+    skip_accuracy: float = 0.0,
+    skip_min_samples: float = float("inf"),
+) -> Dict[str, float]:
+    prior_mean = PRIOR_CORRECT / PRIOR_TOTAL
+    weights: Dict[str, float] = {}
+    for node_id, base_weight in base.items():
+        n = total.get(node_id, 0.0)
+        accuracy = (PRIOR_CORRECT + correct.get(node_id, 0.0)) / (PRIOR_TOTAL + n)
+        if n >= skip_min_samples and accuracy < skip_accuracy:
+            weights[node_id] = 0.0
+        else:
+            weights[node_id] = base_weight * accuracy / prior_mean
+    scale = sum(weights.values())
+    if scale <= 0:
+        return base.copy()
+    target = sum(base.values())
+    return {node_id: w * target / scale for node_id, w in weights.items()}
+
+
+def _fetch_outcomes(after_id: int) -> List[Outcome]:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT {_OUTCOME_COLUMNS}
+                FROM trade_decisions
+                WHERE id > %s AND profit_loss IS NOT NULL AND profit_loss <> 0
+                ORDER BY id
+                """,
+                (after_id,),
+            )
+            return cur.fetchall()
+
+
+def _fetch_archived_outcomes() -> List[Outcome]:
+    """Closed trades already moved to the Parquet archive, oldest first."""
+    import archive
+
+    columns = ["id", "timestamp", "decision", "profit_loss"]
+    for node_id in archive.NODE_IDS:
+        columns += [f"{node_id}_recommendation", f"{node_id}_confidence", f"{node_id}_model"]
+    columns.append("extra_votes")
+    try:
+        rows = archive.scan(columns).to_pylist()
+    except RuntimeError:
+        return []
+    return sorted(
+        (
+            (row["id"], row["timestamp"], row["decision"], row["profit_loss"], archive.votes_from_row(row))
+            for row in rows
+            if row["profit_loss"]
+        ),
+        key=lambda outcome: outcome[0],
+    )
+
+
+class NodeWeightBook:
+    """In-memory decayed accuracy per node, refreshed incrementally from trade_decisions.
+
+    Reads never touch the database; main's background loop calls refresh() in a thread.
+    refresh() only follows new rows of the hot table. recompute_all() also reads the
+    Parquet archive, so the full history is available after the archiver moves rows out.
+    With the half-life decay, archived months rarely change the weights by much.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._correct: Dict[str, float] = {}
+        self._total: Dict[str, float] = {}
+        self._as_of = time.time()
+        self._last_id = 0
+        self._last_refresh = 0.0
+
+    @staticmethod
+    def _half_life_seconds(settings: Settings) -> float:
+        return max(settings.node_weight_half_life_days, 0.01) * 86400.0
+
+    def _decay_to(self, now: float, half_life: float) -> None:
+        factor = 0.5 ** (max(now - self._as_of, 0.0) / half_life)
+        for node_id in self._total:
+            self._correct[node_id] *= factor
+            self._total[node_id] *= factor
+        self._as_of = now
+
+    def refresh(self, settings: Settings, force: bool = False) -> None:
+        now = time.time()
+        if not force and now - self._last_refresh < settings.node_weight_refresh_seconds:
+            return
+        with self._lock:
+            self._last_refresh = now
+            rows = _fetch_outcomes(self._last_id)
+            half_life = self._half_life_seconds(settings)
+            self._decay_to(now, half_life)
+            correct, total = compute_node_stats(rows, now, half_life)
+            for node_id, n in total.items():
+                self._correct[node_id] = self._correct.get(node_id, 0.0) + correct[node_id]
+                self._total[node_id] = self._total.get(node_id, 0.0) + n
+            if rows:
+                self._last_id = int(rows[-1][0])
+
+    def recompute_all(self, settings: Settings) -> Dict[str, Dict[str, float]]:
+        """Rebuild all node statistics from the full history in one vectorized pass."""
+        now = time.time()
+        with self._lock:
+            rows = _fetch_archived_outcomes() + _fetch_outcomes(0)
+            correct, total = compute_node_stats(rows, now, self._half_life_seconds(settings))
+            self._correct, self._total = correct, total
+            self._as_of = now
+            self._last_id = int(rows[-1][0]) if rows else 0
+            self._last_refresh = now
+        _store_node_performance(rows, correct, total)
+        return self.stats()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            node_id: {
+                "correct": self._correct.get(node_id, 0.0),
+                "total": n,
+                "accuracy": (PRIOR_CORRECT + self._correct.get(node_id, 0.0)) / (PRIOR_TOTAL + n),
+            }
+            for node_id, n in self._total.items()
+        }
+
+    def weights(self, base: Dict[str, float], settings: Settings) -> Dict[str, float]:
+        return weights_from_stats(
+            base,
+            self._correct,
+            self._total,
+            skip_accuracy=settings.node_skip_accuracy,
+            skip_min_samples=settings.node_skip_min_samples,
+        )
+
+
+def _store_node_performance(
+    rows: List[Outcome],
+    correct: Dict[str, float],
+    total: Dict[str, float],
+) -> None:
+    models: Dict[str, str] = {}
+    counts: Dict[str, int] = {}
+    profits: Dict[str, float] = {}
+    for _, _, _, profit_loss, votes in rows:
+        for vote in votes or []:
+            node_id = vote["node_id"]
+            models[node_id] = vote.get("model", "")
+            counts[node_id] = counts.get(node_id, 0) + 1
+            profits[node_id] = profits.get(node_id, 0.0) + float(profit_loss)
+    now = datetime.utcnow()
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM node_performance")
+            for node_id, n in total.items():
+                cur.execute(
+                    """
+                    INSERT INTO node_performance (
+                        node_id, model_name, total_decisions, accurate_decisions,
+                        accuracy_rate, avg_profit, last_updated
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (
+                        node_id,
+                        models.get(node_id),
+                        counts.get(node_id, 0),
+                        int(round(correct.get(node_id, 0.0))),
+                        (PRIOR_CORRECT + correct.get(node_id, 0.0)) / (PRIOR_TOTAL + n),
+                        profits.get(node_id, 0.0) / max(counts.get(node_id, 0), 1),
+                        now,
+                    ),
+                )
+        conn.commit()
+
+
+_book = NodeWeightBook()
+
+
+def get_weight_book() -> NodeWeightBook:
+    return _book
+
+
+def get_weights(base: Dict[str, float], settings: Optional[Settings] = None) -> Dict[str, float]:
+    """Learned weights from memory; the book is refreshed by refresh(), never on this path."""
+    settings = settings or get_settings()
+    if settings.node_weighting != "adaptive":
+        return base.copy()
+    return _book.weights(base, settings)
+
+
+def refresh(settings: Optional[Settings] = None, force: bool = False) -> None:
+    """Pull newly closed trades into the book (blocking DB work: run it in a thread)."""
+    settings = settings or get_settings()
+    if settings.node_weighting == "adaptive":
+        _book.refresh(settings, force=force)
+
+
+def recompute_all(settings: Optional[Settings] = None) -> Dict[str, Dict[str, float]]:
+    return _book.recompute_all(settings or get_settings())
+
+
+def get_stats() -> Dict[str, Dict[str, float]]:
+    return _book.stats()
@@ -1,27 +1,56 @@
 import asyncio
 import os
+import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
 
+import cassette
+import http_client
+import metrics
+import tracing
 from schemas import Fundamentals, MACD, MarketData, NewsSentimentItem, TechnicalIndicators
 
 
 ALPHA_VANTAGE_API_KEY_ENV = "ALPHA_VANTAGE_API_KEY"
+ALPHA_VANTAGE_BASE_URL_ENV = "ALPHA_VANTAGE_BASE_URL"
 ALPHA_VANTAGE_BASE_URL = "https://www.alphavantage.co/query"
 
+# REALTIME_BULK_QUOTES accepts at most this many comma-separated symbols per call.
+BULK_QUOTE_LIMIT = 100
+
+# Most recent daily closes per symbol (oldest first), kept for portfolio risk estimates.
+_daily_closes: Dict[str, List[float]] = {}
+
 
 async def _get(params: Dict[str, Any]) -> Dict[str, Any]:
+    function = str(params.get("function", "unknown"))
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with tracing.span("alphavantage", function=function):
+            result = await cassette.exchange("alphavantage", params, lambda: _get_live(params))
+        outcome = "ok"
+        return result
+    except httpx.TimeoutException:
+        outcome = "timeout"
+        metrics.UPSTREAM_TIMEOUTS.inc("alphavantage")
+        raise
+    finally:
+        metrics.ALPHAVANTAGE_SECONDS.observe(time.perf_counter() - started, function, outcome)
+
+
+async def _get_live(params: Dict[str, Any]) -> Dict[str, Any]:
     api_key = os.getenv(ALPHA_VANTAGE_API_KEY_ENV)
     if not api_key:
         raise RuntimeError("ALPHA_VANTAGE_API_KEY is not set")
     query = params.copy()
     query["apikey"] = api_key
-    async with httpx.AsyncClient(base_url=ALPHA_VANTAGE_BASE_URL, timeout=60.0) as client:
-        response = await client.get("", params=query)
-        response.raise_for_status()
-        return response.json()
+    base_url = os.getenv(ALPHA_VANTAGE_BASE_URL_ENV, ALPHA_VANTAGE_BASE_URL)
+    response = await http_client.get_client().get(base_url, params=query, timeout=60.0)
+    response.raise_for_status()
+    return response.json()
 
 
 def _latest_entry(time_series: Dict[str, Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
@@ -43,16 +72,20 @@ async def _fetch_intraday(symbol: str, interval: str = "5min") -> Optional[Tuple
     return _latest_entry(series)
 
 
-async def _fetch_daily(symbol: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+async def _fetch_daily_series(symbol: str) -> Optional[Dict[str, Dict[str, Any]]]:
     data = await _get({
         "function": "TIME_SERIES_DAILY_ADJUSTED",
         "symbol": symbol,
         "outputsize": "compact",
     })
     series = data.get("Time Series (Daily)")
-    if not isinstance(series, dict):
+    if not isinstance(series, dict) or not series:
         return None
-    return _latest_entry(series)
+    return series
+
+
+def get_daily_closes(symbol: str) -> Optional[List[float]]:
+    return _daily_closes.get(symbol)
 
 
 async def _fetch_rsi(symbol: str, interval: str = "daily", time_period: int = 14) -> Optional[float]:
@@ -149,16 +182,60 @@ async def _fetch_news_sentiment(symbol: str) -> List[NewsSentimentItem]:
     return items
 
 
+async def _fetch_bulk_quotes(symbols: List[str]) -> Dict[str, MarketData]:
+    data = await _get({"function": "REALTIME_BULK_QUOTES", "symbol": ",".join(symbols)})
+    rows = data.get("data")
+    quotes: Dict[str, MarketData] = {}
+    if not isinstance(rows, list):
+        return quotes
+    for row in rows:
+        symbol = row.get("symbol")
+        price = row.get("close") or row.get("price")
+        if symbol not in symbols or price in (None, ""):
+            continue
+        timestamp = str(row.get("timestamp") or datetime.utcnow().isoformat())
+        quotes[symbol] = MarketData(symbol=symbol, timestamp=timestamp, current_price=float(price))
+    return quotes
+
+
+async def _fetch_global_quote(symbol: str) -> Optional[MarketData]:
+    data = await _get({"function": "GLOBAL_QUOTE", "symbol": symbol})
+    quote = data.get("Global Quote")
+    if not isinstance(quote, dict) or quote.get("05. price") in (None, ""):
+        return None
+    timestamp = quote.get("07. latest trading day") or datetime.utcnow().date().isoformat()
+    return MarketData(symbol=symbol, timestamp=str(timestamp), current_price=float(quote["05. price"]))
+
+
+async def fetch_quotes(symbols: List[str]) -> Dict[str, MarketData]:
+    """Price-only MarketData for many symbols, for callers that never look at indicators or news.
+
+    Uses one bulk quote request per BULK_QUOTE_LIMIT symbols and falls back to GLOBAL_QUOTE
+    for anything the bulk endpoint did not return (it is a premium endpoint).
+    """
+    unique = list(dict.fromkeys(symbols))
+    quotes: Dict[str, MarketData] = {}
+    chunks = [unique[i:i + BULK_QUOTE_LIMIT] for i in range(0, len(unique), BULK_QUOTE_LIMIT)]
+    for result in await asyncio.gather(*(_fetch_bulk_quotes(c) for c in chunks), return_exceptions=True):
+        if isinstance(result, dict):
+            quotes.update(result)
+    missing = [s for s in unique if s not in quotes]
+    for symbol, result in zip(missing, await asyncio.gather(*(_fetch_global_quote(s) for s in missing), return_exceptions=True)):
+        if isinstance(result, MarketData):
+            quotes[symbol] = result
+    return quotes
+
+
 async def fetch_market_data(symbol: str) -> MarketData:
     intraday_task = asyncio.create_task(_fetch_intraday(symbol))
-    daily_task = asyncio.create_task(_fetch_daily(symbol))
+    daily_task = asyncio.create_task(_fetch_daily_series(symbol))
     rsi_task = asyncio.create_task(_fetch_rsi(symbol))
     macd_task = asyncio.create_task(_fetch_macd(symbol))
     bb_task = asyncio.create_task(_fetch_bbands(symbol))
     fundamentals_task = asyncio.create_task(_fetch_fundamentals(symbol))
     news_task = asyncio.create_task(_fetch_news_sentiment(symbol))
 
-    intraday, daily, rsi_value, macd_value, (bb_upper, bb_lower), fundamentals, news = await asyncio.gather(
+    intraday, daily_series, rsi_value, macd_value, (bb_upper, bb_lower), fundamentals, news = await asyncio.gather(
         intraday_task,
         daily_task,
         rsi_task,
@@ -168,6 +245,11 @@ async def fetch_market_data(symbol: str) -> MarketData:
         news_task,
     )
 
+    daily = _latest_entry(daily_series) if daily_series else None
+    sorted_dates: List[str] = sorted(daily_series.keys(), reverse=True) if daily_series else []
+    if daily_series:
+        _daily_closes[symbol] = [float(daily_series[d].get("4. close")) for d in reversed(sorted_dates)]
+
     timestamp: str
     current_price: float
     price_change_1d: Optional[float] = None
@@ -187,20 +269,13 @@ async def fetch_market_data(symbol: str) -> MarketData:
     if daily is not None:
         _, latest_daily = daily
         close_today = float(latest_daily.get("4. close"))
-        series_data = await _get({
-            "function": "TIME_SERIES_DAILY_ADJUSTED",
-            "symbol": symbol,
-            "outputsize": "compact",
-        })
-        series = series_data.get("Time Series (Daily)") or {}
-        sorted_dates = sorted(series.keys(), reverse=True)
         if len(sorted_dates) >= 2:
-            prev_day = series[sorted_dates[1]]
+            prev_day = daily_series[sorted_dates[1]]
             close_prev = float(prev_day.get("4. close"))
             if close_prev != 0:
                 price_change_1d = (close_today - close_prev) / close_prev * 100.0
         if len(sorted_dates) >= 6:
-            week_ago = series[sorted_dates[5]]
+            week_ago = daily_series[sorted_dates[5]]
             close_week = float(week_ago.get("4. close"))
             if close_week != 0:
                 price_change_1w = (close_today - close_week) / close_week * 100.0
@@ -219,16 +294,9 @@ async def fetch_market_data(symbol: str) -> MarketData:
         _, latest_daily = daily
         volume_str = latest_daily.get("6. volume")
         volume = int(volume_str) if volume_str is not None else None
-        series_data = await _get({
-            "function": "TIME_SERIES_DAILY_ADJUSTED",
-            "symbol": symbol,
-            "outputsize": "compact",
-        })
-        series = series_data.get("Time Series (Daily)") or {}
-        sorted_dates = sorted(series.keys(), reverse=True)[:30]
         volumes: List[int] = []
-        for d in sorted_dates:
-            item = series[d]
+        for d in sorted_dates[:30]:
+            item = daily_series[d]
             v_str = item.get("6. volume")
             if v_str is None:
                 continue
@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from openrouter_client import OpenRouterClient
 from schemas import MarketData, NodeRecommendation
@@ -10,13 +10,13 @@ MOMENTUM_MODEL_ENV = "MOMENTUM_MODEL"
 DEFAULT_MOMENTUM_MODEL = "meta-llama/llama-3-70b"
 
 
-async def analyze(market_data: MarketData, client: OpenRouterClient) -> NodeRecommendation:
-    model = os.getenv(MOMENTUM_MODEL_ENV, DEFAULT_MOMENTUM_MODEL)
+async def analyze(market_data: MarketData, client: OpenRouterClient, model: Optional[str] = None) -> NodeRecommendation:
+    model = model or os.getenv(MOMENTUM_MODEL_ENV, DEFAULT_MOMENTUM_MODEL)
     system_content = "You are a momentum and volume-based trading expert. Respond in JSON only."
     user_content = (
         "Analyze the momentum and volume characteristics of the following market data and return a JSON object with the keys: "
         "recommendation (BUY, SELL, HOLD), confidence (0-1), reasoning, target_price, stop_loss, holding_period.\n\n"
-        f"Market data: {market_data.json()}"
+        f"Market data: {market_data.cached_json()}"
     )
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system_content},
@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from openrouter_client import OpenRouterClient
 from schemas import MarketData, NodeRecommendation
@@ -10,13 +10,13 @@ RISK_MODEL_ENV = "RISK_MODEL"
 DEFAULT_RISK_MODEL = "cohere/command-r-plus"
 
 
-async def analyze(market_data: MarketData, client: OpenRouterClient) -> NodeRecommendation:
-    model = os.getenv(RISK_MODEL_ENV, DEFAULT_RISK_MODEL)
+async def analyze(market_data: MarketData, client: OpenRouterClient, model: Optional[str] = None) -> NodeRecommendation:
+    model = model or os.getenv(RISK_MODEL_ENV, DEFAULT_RISK_MODEL)
     system_content = "You are a risk management expert for equity portfolios. Respond in JSON only."
     user_content = (
         "Evaluate the risk of taking a position in the following market data and return a JSON object with the keys: "
         "recommendation (BUY, SELL, HOLD), confidence (0-1), reasoning, target_price, stop_loss, holding_period.\n\n"
-        f"Market data: {market_data.json()}"
+        f"Market data: {market_data.cached_json()}"
     )
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system_content},
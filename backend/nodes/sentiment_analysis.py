@@ -1,23 +1,47 @@
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
+import news_store
 from openrouter_client import OpenRouterClient
 from schemas import MarketData, NodeRecommendation
 
 
 SENTIMENT_MODEL_ENV = "SENTIMENT_MODEL"
 DEFAULT_SENTIMENT_MODEL = "google/gemini-pro"
+LOCAL_MODEL = "local/news-score"
 
 
-async def analyze(market_data: MarketData, client: OpenRouterClient) -> NodeRecommendation:
-    model = os.getenv(SENTIMENT_MODEL_ENV, DEFAULT_SENTIMENT_MODEL)
+async def analyze(market_data: MarketData, client: OpenRouterClient, model: Optional[str] = None) -> NodeRecommendation:
+    model = model or os.getenv(SENTIMENT_MODEL_ENV, DEFAULT_SENTIMENT_MODEL)
+    store = news_store.get_store()
+    review = None
+    if news_store.enabled():
+        review = store.review(market_data.symbol, market_data.news_sentiment or [])
+        # Nothing the LLM has not already read: score the known headlines locally.
+        if not review.new:
+            local = store.local_score(review)
+            return NodeRecommendation(
+                node_id="sentiment_analysis",
+                model=LOCAL_MODEL,
+                recommendation=local.recommendation,
+                confidence=local.confidence,
+                reasoning=local.reasoning,
+            )
+        fresh, seen = news_store.prompt_news(review)
+        market_json = market_data.model_dump_json(exclude={"news_sentiment"})
+        news_text = f"New headlines: {json.dumps(fresh)}\nAlready analysed headlines: {json.dumps(seen)}"
+    else:
+        market_json = market_data.cached_json()
+        news_text = ""
     system_content = "You are an expert sentiment analyst for financial markets. Respond in JSON only."
     user_content = (
         "Analyze the following news and sentiment-related market data and return a JSON object with the keys: "
         "recommendation (BUY, SELL, HOLD), confidence (0-1), reasoning, target_price, stop_loss, holding_period.\n\n"
-        f"Market data: {market_data.json()}"
+        f"Market data: {market_json}"
     )
+    if news_text:
+        user_content += f"\n{news_text}"
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system_content},
         {"role": "user", "content": user_content},
@@ -34,6 +58,8 @@ async def analyze(market_data: MarketData, client: OpenRouterClient) -> NodeReco
         target_price = data.get("target_price")
         stop_loss = data.get("stop_loss")
         holding_period = data.get("holding_period")
+        if review is not None:
+            store.mark_prompted(review)
     except Exception as exc:
         recommendation = "HOLD"
         confidence = 0.5
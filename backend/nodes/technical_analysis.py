@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from openrouter_client import OpenRouterClient
 from schemas import MarketData, NodeRecommendation
@@ -10,13 +10,13 @@ TECHNICAL_MODEL_ENV = "TECHNICAL_MODEL"
 DEFAULT_TECHNICAL_MODEL = "anthropic/claude-sonnet-4"
 
 
-async def analyze(market_data: MarketData, client: OpenRouterClient) -> NodeRecommendation:
-    model = os.getenv(TECHNICAL_MODEL_ENV, DEFAULT_TECHNICAL_MODEL)
+async def analyze(market_data: MarketData, client: OpenRouterClient, model: Optional[str] = None) -> NodeRecommendation:
+    model = model or os.getenv(TECHNICAL_MODEL_ENV, DEFAULT_TECHNICAL_MODEL)
     system_content = "You are an expert technical analyst for equities. Respond in JSON only."
     user_content = (
         "Analyze the following market data and return a JSON object with the keys: "
         "recommendation (BUY, SELL, HOLD), confidence (0-1), reasoning, target_price, stop_loss, holding_period.\n\n"
-        f"Market data: {market_data.json()}"
+        f"Market data: {market_data.cached_json()}"
     )
     messages: List[Dict[str, str]] = [
         {"role": "system", "content": system_content},
@@ -1,12 +1,22 @@
 import os
+import time
 from typing import Any, Dict, List, Optional
 
 import httpx
 
+import cassette
+import http_client
+import metrics
+import tracing
+
+
+OPENROUTER_BASE_URL_ENV = "OPENROUTER_BASE_URL"
+DEFAULT_OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
 
 class OpenRouterClient:
-    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://openrouter.ai/api/v1") -> None:
-        self.base_url = base_url
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None) -> None:
+        self.base_url = base_url or os.getenv(OPENROUTER_BASE_URL_ENV, DEFAULT_OPENROUTER_BASE_URL)
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
 
     def _headers(self) -> Dict[str, str]:
@@ -20,19 +30,46 @@ class OpenRouterClient:
         }
 
     async def chat(self, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> Dict[str, Any]:
+        import audit_store
+        import budget
+
         payload: Dict[str, Any] = {"model": model, "messages": messages}
         payload.update(kwargs)
-        async with httpx.AsyncClient(base_url=self.base_url, timeout=60.0) as client:
-            response = await client.post("/chat/completions", json=payload, headers=self._headers())
-            response.raise_for_status()
-            return response.json()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracing.span("openrouter.chat", model=model):
+                result = await cassette.exchange("openrouter.chat", payload, lambda: self._post_chat(payload))
+            outcome = "ok"
+            budget.record(model, result.get("usage"))
+            audit_store.record_exchange(budget.current_node(), model, payload, result)
+            return result
+        except httpx.TimeoutException:
+            outcome = "timeout"
+            metrics.UPSTREAM_TIMEOUTS.inc("openrouter")
+            raise
+        finally:
+            metrics.LLM_CHAT_SECONDS.observe(time.perf_counter() - started, model, outcome)
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url.rstrip('/')}{path}"
+
+    async def _post_chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        client = http_client.get_client()
+        response = await client.post(self._url("/chat/completions"), json=payload, headers=self._headers(), timeout=60.0)
+        response.raise_for_status()
+        return response.json()
 
     async def list_models(self, free_only: bool = False) -> List[Dict[str, Any]]:
-        async with httpx.AsyncClient(base_url=self.base_url, timeout=30.0) as client:
-            response = await client.get("/models", headers=self._headers())
-            response.raise_for_status()
-            data = response.json()
+        client = http_client.get_client()
+        response = await client.get(self._url("/models"), headers=self._headers(), timeout=30.0)
+        response.raise_for_status()
+        data = response.json()
         models: List[Dict[str, Any]] = data.get("data", [])
+        import budget
+
+        # Every model listing doubles as a pricing refresh for cost accounting.
+        budget.get_controller().update_pricing(models)
         if not free_only:
             return models
         free_models: List[Dict[str, Any]] = []
@@ -1,11 +1,21 @@
 import asyncio
-import os
+import hashlib
 from statistics import mean
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
+
+import audit_store
+import budget
+import event_bus
+import metrics
+import node_weights
+import tracing
 from openrouter_client import OpenRouterClient
 from schemas import FinalDecision, MarketData, NodeRecommendation
-from nodes import fundamental_analysis, momentum_analysis, risk_evaluation, sentiment_analysis, technical_analysis
+from settings import Settings, get_settings
+from singleflight import SingleFlight
+from nodes import data_fetcher, fundamental_analysis, momentum_analysis, risk_evaluation, sentiment_analysis, technical_analysis
 
 
 DEFAULT_WEIGHTS: Dict[str, float] = {
@@ -16,6 +26,50 @@ DEFAULT_WEIGHTS: Dict[str, float] = {
     "momentum_analysis": 0.15,
 }
 
+NODES = {
+    "technical_analysis": technical_analysis,
+    "fundamental_analysis": fundamental_analysis,
+    "sentiment_analysis": sentiment_analysis,
+    "risk_evaluation": risk_evaluation,
+    "momentum_analysis": momentum_analysis,
+}
+
+# Shared by every entry point (API, jobs, polling loop) so concurrent requests for a symbol run once.
+_flights = SingleFlight(metrics.SINGLE_FLIGHT)
+
+VOTE_CODES: Dict[str, int] = {"BUY": 1, "SELL": -1, "HOLD": 0}
+DECISIONS_BY_CODE: Dict[int, str] = {code: name for name, code in VOTE_CODES.items()}
+
+
+def aggregate_votes(
+    codes: np.ndarray,
+    confidences: np.ndarray,
+    weights: np.ndarray,
+    threshold,
+    algo: str = "weighted_majority",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized decision rule shared by run_analysis, the backtester and parameter sweeps.
+
+    codes/confidences are (..., n_nodes) arrays of VOTE_CODES and confidences, weights
+    broadcasts against them and threshold against the leading shape. Returns the
+    decision codes and aggregate confidences with the leading shape.
+    """
+    if algo == "unanimous":
+        n_buy = (codes == 1).sum(axis=-1)
+        n_sell = (codes == -1).sum(axis=-1)
+        decision = np.where((n_buy > 0) & (n_sell == 0), 1, np.where((n_sell > 0) & (n_buy == 0), -1, 0))
+        confidence = np.where(decision != 0, np.minimum(1.0, confidences.mean(axis=-1)), 0.0)
+        return decision, confidence
+    # Mask at the votes' shape, then contract against the weights: a sweep's weights carry a
+    # leading configs axis, and materialising configs x rows x nodes temporaries dominates.
+    buy_score = np.einsum("...n,...n->...", np.where(codes == 1, confidences, 0.0), weights, optimize=True)
+    sell_score = np.einsum("...n,...n->...", np.where(codes == -1, confidences, 0.0), weights, optimize=True)
+    buy = buy_score > threshold
+    sell = (sell_score > threshold) & ~buy
+    decision = buy.astype(np.int8) - sell
+    confidence = np.where(buy, buy_score, np.where(sell, sell_score, np.maximum(buy_score, sell_score)))
+    return decision, confidence
+
 
 def _aggregate_prices(node_results: List[NodeRecommendation]) -> (Optional[float], Optional[float]):
     targets = [r.target_price for r in node_results if r.target_price is not None]
@@ -25,50 +79,72 @@ def _aggregate_prices(node_results: List[NodeRecommendation]) -> (Optional[float
     return target_price, stop_loss
 
 
-async def run_analysis(market_data: MarketData) -> FinalDecision:
+async def _run_node(node_id: str, market_data: MarketData, client: OpenRouterClient, model: Optional[str]) -> NodeRecommendation:
+    with metrics.NODE_SECONDS.time(node_id, model or "default"), tracing.span(f"node.{node_id}", model=model):
+        with budget.attribute(node_id):
+            result = await NODES[node_id].analyze(market_data, client, model)
+    if result.reasoning.startswith("fallback_due_to_error"):
+        metrics.NODE_FALLBACKS.inc(node_id)
+    # Published as each node finishes so dashboards see votes arrive before the decision.
+    event_bus.publish("node_result", result, market_data.symbol)
+    return result
+
+
+async def run_analysis(market_data: MarketData, settings: Optional[Settings] = None) -> FinalDecision:
+    with metrics.ANALYSIS_SECONDS.time(), tracing.span("run_analysis", symbol=market_data.symbol):
+        return await _run_analysis(market_data, settings)
+
+
+async def _run_analysis(market_data: MarketData, settings: Optional[Settings]) -> FinalDecision:
+    settings = settings or get_settings()
     client = OpenRouterClient()
-    tasks = [
-        technical_analysis.analyze(market_data, client),
-        fundamental_analysis.analyze(market_data, client),
-        sentiment_analysis.analyze(market_data, client),
-        risk_evaluation.analyze(market_data, client),
-        momentum_analysis.analyze(market_data, client),
-    ]
-    node_results: List[NodeRecommendation] = await asyncio.gather(*tasks)
+    weights = node_weights.get_weights(DEFAULT_WEIGHTS, settings)
+    # Nodes the weight book has zeroed out are not worth an LLM call.
+    active_nodes = [node_id for node_id in NODES if weights.get(node_id, 0.0) > 0.0] or list(NODES)
+    # Over budget, paid models are swapped for LLM_FALLBACK_MODEL or the node sits the round out.
+    plan = budget.plan_models(active_nodes, weights, settings)
+    tasks = [_run_node(node_id, market_data, client, model) for node_id, model in plan.items() if model is not None]
+    if not tasks:
+        return FinalDecision.model_construct(
+            final_decision="HOLD",
+            aggregate_confidence=0.0,
+            votes={"BUY": 0, "SELL": 0, "HOLD": 0},
+            dissenting_opinions=[{"node": "budget", "reason": "llm_budget_exhausted"}],
+            node_results=[],
+        )
+    with audit_store.capture() as exchanges:
+        node_results: List[NodeRecommendation] = await asyncio.gather(*tasks)
+    with tracing.span("aggregate", algorithm=settings.decision_algorithm):
+        decision = _aggregate(market_data, node_results, weights, settings)
+    decision._audit = {
+        "market_data": market_data.model_dump(mode="json"),
+        "node_results": [r.model_dump(mode="json") for r in node_results],
+        "exchanges": exchanges,
+        "weights": weights,
+        "settings_version": settings.version,
+        "trace_id": tracing.current_trace_id(),
+    }
+    return decision
+
+
+def _aggregate(
+    market_data: MarketData,
+    node_results: List[NodeRecommendation],
+    weights: Dict[str, float],
+    settings: Settings,
+) -> FinalDecision:
     votes: Dict[str, int] = {"BUY": 0, "SELL": 0, "HOLD": 0}
     for result in node_results:
         votes[result.recommendation] += 1
 
-    algo = os.getenv("DECISION_ALGORITHM", "weighted_majority")
-    threshold = float(os.getenv("CONFIDENCE_THRESHOLD", "0.6"))
-
-    if algo == "unanimous":
-        non_hold = [r.recommendation for r in node_results if r.recommendation != "HOLD"]
-        if non_hold and len(set(non_hold)) == 1:
-            final_decision = non_hold[0]
-            aggregate_confidence = min(1.0, sum(r.confidence for r in node_results) / len(node_results))
-        else:
-            final_decision = "HOLD"
-            aggregate_confidence = 0.0
-    else:
-        buy_score = 0.0
-        sell_score = 0.0
-        weights = DEFAULT_WEIGHTS.copy()
-        for result in node_results:
-            weight = weights.get(result.node_id, 0.0)
-            if result.recommendation == "BUY":
-                buy_score += result.confidence * weight
-            elif result.recommendation == "SELL":
-                sell_score += result.confidence * weight
-        if buy_score > threshold:
-            final_decision = "BUY"
-            aggregate_confidence = buy_score
-        elif sell_score > threshold:
-            final_decision = "SELL"
-            aggregate_confidence = sell_score
-        else:
-            final_decision = "HOLD"
-            aggregate_confidence = max(buy_score, sell_score)
+    codes = np.array([VOTE_CODES[r.recommendation] for r in node_results])
+    confidences = np.array([r.confidence for r in node_results])
+    node_weight_values = np.array([weights.get(r.node_id, 0.0) for r in node_results])
+    decision_code, confidence = aggregate_votes(
+        codes, confidences, node_weight_values, settings.confidence_threshold, settings.decision_algorithm
+    )
+    final_decision = DECISIONS_BY_CODE[int(decision_code)]
+    aggregate_confidence = float(confidence)
 
     dissenting_opinions = []
     for result in node_results:
@@ -77,7 +153,8 @@ async def run_analysis(market_data: MarketData) -> FinalDecision:
 
     target_price, stop_loss = _aggregate_prices(node_results)
 
-    return FinalDecision(
+    # Every field is computed here from already-validated node results; skip re-validating them.
+    decision = FinalDecision.model_construct(
         final_decision=final_decision,
         aggregate_confidence=aggregate_confidence,
         votes=votes,
@@ -87,3 +164,40 @@ async def run_analysis(market_data: MarketData) -> FinalDecision:
         stop_loss=stop_loss,
         node_results=node_results,
     )
+    event_bus.publish("decision", decision, market_data.symbol)
+    return decision
+
+
+async def analyze_symbol(symbol: str, settings: Optional[Settings] = None) -> Tuple[MarketData, FinalDecision]:
+    """Fetch and analyse a symbol, joining an in-flight (or, within ANALYSIS_REUSE_SECONDS, just
+    finished) analysis of the same symbol instead of repeating the fetch and LLM calls.
+
+    The decision is a private copy: callers go on to size and mutate it.
+    """
+    settings = settings or get_settings()
+
+    async def fetch_and_analyze() -> Tuple[MarketData, FinalDecision]:
+        market_data = await fetch()
+        return market_data, await run_analysis(market_data, settings)
+
+    # The settings version is part of the key so a config change never reuses an old analysis.
+    async def fetch() -> MarketData:
+        with tracing.span("fetch_market_data", symbol=symbol):
+            return await data_fetcher.fetch_market_data(symbol)
+
+    key = ("symbol", symbol, settings.version)
+    market_data, decision = await _flights.do(key, fetch_and_analyze, settings.analysis_reuse_seconds)
+    return market_data, decision.model_copy(deep=True)
+
+
+async def analyze_market_data(market_data: MarketData, settings: Optional[Settings] = None) -> FinalDecision:
+    """run_analysis coalesced on a fingerprint of the supplied market data."""
+    settings = settings or get_settings()
+    fingerprint = hashlib.sha256(market_data.cached_json().encode("utf-8")).hexdigest()
+    key = ("market_data", fingerprint, settings.version)
+    decision = await _flights.do(key, lambda: run_analysis(market_data, settings), settings.analysis_reuse_seconds)
+    return decision.model_copy(deep=True)
+
+
+def single_flight_stats() -> Dict[str, int]:
+    return _flights.stats()
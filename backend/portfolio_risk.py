@@ -0,0 +1,301 @@
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+import tracing
+from nodes import data_fetcher
+from schemas import FinalDecision, MarketData
+from settings import Settings, get_settings
+
+TRADING_DAYS = 252
+RETURN_LOOKBACK_DAYS = 60
+VAR_Z_95 = 1.645
+SYNC_RETRY_SECONDS = 30.0
+
+Candidate = Tuple[str, MarketData, FinalDecision]
+
+
+def _block(decision: FinalDecision, reason: str) -> None:
+    decision.final_decision = "HOLD"
+    decision.recommended_position_size = 0.0
+    decision.dissenting_opinions = (decision.dissenting_opinions or []) + [{"node": "portfolio_risk", "reason": reason}]
+
+
+def risk_model(symbols: Sequence[str], default_volatility: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Daily volatility, correlation matrix and a has-history mask from cached daily closes.
+
+    Symbols without enough history get default_volatility and zero correlation.
+    """
+    n = len(symbols)
+    histories = [data_fetcher.get_daily_closes(s) or [] for s in symbols]
+    lengths = [len(h) for h in histories if len(h) > 2]
+    known = np.array([len(h) > 2 for h in histories], dtype=bool)
+    vol = np.full(n, default_volatility / np.sqrt(TRADING_DAYS))
+    corr = np.eye(n)
+    if not lengths:
+        return vol, corr, known
+    window = min(min(lengths), RETURN_LOOKBACK_DAYS + 1)
+    closes = np.array([h[-window:] for h, k in zip(histories, known) if k], dtype=np.float64)
+    returns = np.diff(np.log(closes), axis=1)
+    vol[known] = returns.std(axis=1, ddof=1)
+    if returns.shape[0] > 1:
+        sub = np.corrcoef(returns)
+        idx = np.flatnonzero(known)
+        corr[np.ix_(idx, idx)] = np.nan_to_num(sub)
+        np.fill_diagonal(corr, 1.0)
+    return vol, corr, known
+
+
+def value_at_risk(exposures: np.ndarray, vol: np.ndarray, corr: np.ndarray) -> float:
+    cov = corr * np.outer(vol, vol)
+    return float(VAR_Z_95 * np.sqrt(max(exposures @ cov @ exposures, 0.0)))
+
+
+def _today() -> date:
+    # trade_decisions timestamps are UTC, so the daily loss window is a UTC day too.
+    return datetime.utcnow().date()
+
+
+class PortfolioRiskEngine:
+    """Position book and intraday realized P&L used to vet a whole cycle of trades at once.
+
+    The book is seeded from the active broker adapter and today's realized P&L from the
+    journaled profit_loss in trade_decisions, so neither a restart nor a mode switch
+    resets the limits; fills recorded afterwards are applied in memory.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._positions: Dict[str, Tuple[float, float]] = {}
+        self._marks: Dict[str, float] = {}
+        self._realized_today = 0.0
+        self._day = _today()
+        self._synced: Optional[Tuple[date, str]] = None
+        self._sync_failed_at = 0.0
+
+    def _roll_day(self) -> None:
+        today = _today()
+        if today != self._day:
+            self._day = today
+            self._realized_today = 0.0
+
+    def sync(self, settings: Optional[Settings] = None) -> None:
+        """Reload positions and today's P&L once per UTC day and trading mode; failures retry after a pause."""
+        from broker_adapters import get_adapter
+        from db import get_realized_pnl_since
+
+        settings = settings or get_settings()
+        key = (_today(), settings.trading_mode)
+        if self._synced == key or time.monotonic() - self._sync_failed_at < SYNC_RETRY_SECONDS:
+            return
+        try:
+            positions = get_adapter(settings.trading_mode).positions()
+            realized = get_realized_pnl_since(datetime.combine(key[0], datetime.min.time()))
+        except Exception:
+            self._sync_failed_at = time.monotonic()
+            metrics.POLL_ERRORS.inc("portfolio_sync")
+            return
+        with self._lock:
+            self._positions = dict(positions)
+            self._day = key[0]
+            self._realized_today = realized
+            self._synced = key
+
+    def invalidate(self) -> None:
+        """Reload from the broker on the next sync (an order is still working there)."""
+        self._synced = None
+        self._sync_failed_at = 0.0
+
+    def update_mark(self, symbol: str, price: float) -> None:
+        self._marks[symbol] = price
+
+    def record_fill(self, symbol: str, side: str, qty: float, price: float) -> None:
+        self.sync()
+        with self._lock:
+            self._roll_day()
+            current_qty, avg_price = self._positions.get(symbol, (0.0, 0.0))
+            if side == "BUY":
+                new_qty = current_qty + qty
+                self._positions[symbol] = (new_qty, (current_qty * avg_price + qty * price) / new_qty)
+            else:
+                sold = min(qty, current_qty)
+                if sold > 0:
+                    self._realized_today += (price - avg_price) * sold
+                if current_qty - sold <= 0:
+                    self._positions.pop(symbol, None)
+                else:
+                    self._positions[symbol] = (current_qty - sold, avg_price)
+            self._marks[symbol] = price
+
+    def exposure(self, symbol: str) -> float:
+        self.sync()
+        with self._lock:
+            qty, avg_price = self._positions.get(symbol, (0.0, 0.0))
+        return qty * self._marks.get(symbol, avg_price)
+
+    def held_symbols(self) -> List[str]:
+        self.sync()
+        with self._lock:
+            return list(self._positions)
+
+    def evaluate_cycle(self, candidates: List[Candidate], settings: Optional[Settings] = None) -> List[Candidate]:
+        """Apply daily-loss, concurrency, volatility sizing and VaR limits to a cycle's trades jointly.
+
+        BUY decisions are resized in place or turned into HOLD; SELLs only reduce risk and pass through.
+        """
+        settings = settings or get_settings()
+        equity = settings.account_equity
+        max_position_ratio = settings.max_position_size
+        max_daily_loss = settings.max_daily_loss
+        max_positions = settings.max_concurrent_positions
+        target_vol = settings.risk_target_volatility
+        default_vol = settings.risk_default_volatility
+        max_var = settings.risk_max_var * equity
+
+        self.sync(settings)
+        with self._lock:
+            self._roll_day()
+            positions = dict(self._positions)
+            realized_today = self._realized_today
+        for symbol, market_data, _ in candidates:
+            self._marks[symbol] = market_data.current_price
+
+        buys = [c for c in candidates if c[2].final_decision == "BUY"]
+        if not buys:
+            return candidates
+        if realized_today <= -max_daily_loss * equity:
+            for _, _, decision in buys:
+                _block(decision, f"daily loss limit reached ({realized_today:.2f})")
+            return candidates
+
+        held = {s for s, (qty, _) in positions.items() if qty > 0}
+        slots = max(max_positions - len(held), 0)
+        new_entries = sorted(
+            (c for c in buys if c[0] not in held),
+            key=lambda c: c[2].aggregate_confidence,
+            reverse=True,
+        )
+        for _, _, decision in new_entries[slots:]:
+            _block(decision, f"max concurrent positions ({max_positions}) reached")
+        buys = [c for c in buys if c[2].final_decision == "BUY"]
+        if not buys:
+            return candidates
+
+        held_symbols = sorted(held)
+        buy_symbols = [c[0] for c in buys]
+        universe = held_symbols + [s for s in buy_symbols if s not in held]
+        index = {s: i for i, s in enumerate(universe)}
+        vol, corr, known = risk_model(universe, default_vol)
+
+        # Volatility scaling only shrinks positions, and only where there is history to measure it.
+        annual_vol = vol[[index[s] for s in buy_symbols]] * np.sqrt(TRADING_DAYS)
+        has_history = known[[index[s] for s in buy_symbols]]
+        scale = np.where(has_history & (annual_vol > 0), np.minimum(1.0, target_vol / np.maximum(annual_vol, 1e-12)), 1.0)
+        # Limits only shrink: a BUY never leaves larger than the size its decision already carried.
+        requested = np.array([c[2].recommended_position_size or 0.0 for c in buys], dtype=np.float64)
+        sizes = np.minimum(equity * max_position_ratio * scale, requested)
+
+        existing = np.zeros(len(universe))
+        for s in held_symbols:
+            qty, avg_price = positions[s]
+            existing[index[s]] = qty * self._marks.get(s, avg_price)
+        new = np.zeros(len(universe))
+        np.add.at(new, [index[s] for s in buy_symbols], sizes)
+
+        cov = corr * np.outer(vol, vol)
+        limit_sq = (max_var / VAR_Z_95) ** 2
+        a = existing @ cov @ existing - limit_sq
+        b = 2.0 * existing @ cov @ new
+        c = new @ cov @ new
+        if a + b + c > 0:
+            # Largest s in [0, 1] with VaR(existing + s * new) <= RISK_MAX_VAR.
+            if a >= 0 or c <= 0:
+                s = 0.0
+            else:
+                s = float(np.clip((-b + np.sqrt(b * b - 4.0 * c * a)) / (2.0 * c), 0.0, 1.0))
+            sizes = sizes * s
+
+        for (symbol, _, decision), size, wanted in zip(buys, sizes, requested):
+            if wanted <= 0:
+                _block(decision, "no position size")
+            elif size <= 0:
+                _block(decision, "portfolio VaR limit reached")
+            else:
+                decision.recommended_position_size = float(size)
+        return candidates
+
+    def snapshot(self, settings: Optional[Settings] = None) -> Dict[str, Any]:
+        settings = settings or get_settings()
+        self.sync(settings)
+        with self._lock:
+            self._roll_day()
+            positions = dict(self._positions)
+            realized_today = self._realized_today
+        equity = settings.account_equity
+        symbols = sorted(positions)
+        exposures = np.array([positions[s][0] * self._marks.get(s, positions[s][1]) for s in symbols])
+        vol, corr, _ = risk_model(symbols, settings.risk_default_volatility)
+        var = value_at_risk(exposures, vol, corr) if symbols else 0.0
+        return {
+            "equity": equity,
+            "realized_pnl_today": realized_today,
+            "open_positions": len(symbols),
+            "gross_exposure": float(np.abs(exposures).sum()) if symbols else 0.0,
+            "net_exposure": float(exposures.sum()) if symbols else 0.0,
+            "value_at_risk_95": var,
+            "positions": {
+                s: {
+                    "quantity": positions[s][0],
+                    "exposure": float(exposures[i]),
+                    "weight": float(exposures[i] / equity) if equity else 0.0,
+                    "annual_volatility": float(vol[i] * np.sqrt(TRADING_DAYS)),
+                }
+                for i, s in enumerate(symbols)
+            },
+            "correlation": {"symbols": symbols, "matrix": corr.round(4).tolist()},
+            "limits": {
+                "max_daily_loss": settings.max_daily_loss * equity,
+                "max_concurrent_positions": settings.max_concurrent_positions,
+                "max_value_at_risk": settings.risk_max_var * equity,
+            },
+        }
+
+
+_engine = PortfolioRiskEngine()
+
+
+def get_engine() -> PortfolioRiskEngine:
+    return _engine
+
+
+def sync(settings: Optional[Settings] = None) -> None:
+    _engine.sync(settings)
+
+
+def evaluate_cycle(candidates: List[Candidate], settings: Optional[Settings] = None) -> List[Candidate]:
+    with metrics.RISK_FILTER_SECONDS.time("portfolio"), tracing.span("risk.portfolio", candidates=len(candidates)):
+        return _engine.evaluate_cycle(candidates, settings)
+
+
+def record_fill(symbol: str, side: str, qty: float, price: float) -> None:
+    _engine.record_fill(symbol, side, qty, price)
+
+
+def update_mark(symbol: str, price: float) -> None:
+    _engine.update_mark(symbol, price)
+
+
+def invalidate() -> None:
+    _engine.invalidate()
+
+
+def snapshot(settings: Optional[Settings] = None) -> Dict[str, Any]:
+    return _engine.snapshot(settings)
+
+
+def held_symbols() -> List[str]:
+    return _engine.held_symbols()
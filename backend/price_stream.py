@@ -0,0 +1,340 @@
+"""Event-driven analysis triggers from a streaming price feed.
+
+With PRICE_STREAM=alpaca the consumer subscribes to trades for the symbols
+this worker owns on the Alpaca market data WebSocket; PRICE_STREAM=replay
+plays back a JSON-lines file of {"symbol", "price", "ts"} ticks instead, for
+offline testing. Every tick updates an in-memory last-price table and is
+checked against per-symbol triggers:
+
+- move: price moved TRIGGER_MOVE_PCT from where it was last analysed
+- volatility: the tick's log return is TRIGGER_VOLATILITY_SIGMA standard
+  deviations out against the symbol's EWMA volatility
+- stop_loss / target: price crossed the last decision's stop or target
+
+A triggered symbol is analysed at most once per TRIGGER_DEBOUNCE_SECONDS (in
+feed time, so replays at any speed debounce the same way). Stop and target
+levels fire once when crossed and re-arm only after the price crosses back.
+The polling loop leaves a watch symbol to the stream while the stream is
+connected and has delivered a tick for it within POLL_INTERVAL_SECONDS.
+"""
+import asyncio
+import gzip
+import json
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import metrics
+from settings import Settings, get_settings
+
+
+PRICE_STREAM_ENV = "PRICE_STREAM"
+PRICE_STREAM_URL_ENV = "PRICE_STREAM_URL"
+PRICE_STREAM_REPLAY_PATH_ENV = "PRICE_STREAM_REPLAY_PATH"
+
+DEFAULT_STREAM_URL = "wss://stream.data.alpaca.markets/v2/iex"
+STREAM_MODES = {"off", "alpaca", "replay"}
+
+# EWMA of squared log returns; the volatility trigger waits for VOL_WARMUP ticks.
+VOL_ALPHA = 0.05
+VOL_WARMUP = 20
+RESUBSCRIBE_SECONDS = 5.0
+AUTH_TIMEOUT_SECONDS = 10.0
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class Tick(NamedTuple):
+    symbol: str
+    price: float
+    ts: float
+
+
+def stream_mode() -> str:
+    mode = os.getenv(PRICE_STREAM_ENV, "off").lower()
+    return mode if mode in STREAM_MODES else "off"
+
+
+@dataclass
+class SymbolState:
+    price: float
+    ts: float
+    reference: float
+    variance: float = 0.0
+    samples: int = 0
+    stop_loss: Optional[float] = None
+    target_price: Optional[float] = None
+    # A level that has fired stays quiet until the price is back on the other side of it.
+    stop_armed: bool = True
+    target_armed: bool = True
+    last_trigger: float = -math.inf
+    triggers: Dict[str, int] = field(default_factory=dict)
+
+
+class TriggerEngine:
+    """Last-price table plus the per-symbol trigger rules; called once per tick on the event loop."""
+
+    def __init__(self) -> None:
+        self._states: Dict[str, SymbolState] = {}
+
+    def on_tick(self, tick: Tick, settings: Settings) -> Optional[str]:
+        state = self._states.get(tick.symbol)
+        if state is None or tick.price <= 0:
+            if tick.price > 0:
+                self._states[tick.symbol] = SymbolState(price=tick.price, ts=tick.ts, reference=tick.price)
+            return None
+        ret = math.log(tick.price / state.price)
+        sigma = math.sqrt(state.variance)
+        state.variance = (1.0 - VOL_ALPHA) * state.variance + VOL_ALPHA * ret * ret
+        state.samples += 1
+        state.price = tick.price
+        state.ts = tick.ts
+
+        if state.stop_loss is not None and tick.price > state.stop_loss:
+            state.stop_armed = True
+        if state.target_price is not None and tick.price < state.target_price:
+            state.target_armed = True
+
+        reason = None
+        if state.stop_armed and state.stop_loss is not None and tick.price <= state.stop_loss:
+            reason = "stop_loss"
+        elif state.target_armed and state.target_price is not None and tick.price >= state.target_price:
+            reason = "target"
+        elif settings.trigger_move_pct > 0 and abs(tick.price / state.reference - 1.0) >= settings.trigger_move_pct:
+            reason = "move"
+        elif (
+            settings.trigger_volatility_sigma > 0
+            and state.samples > VOL_WARMUP
+            and sigma > 0
+            and abs(ret) >= settings.trigger_volatility_sigma * sigma
+        ):
+            reason = "volatility"
+        if reason is None or tick.ts - state.last_trigger < settings.trigger_debounce_seconds:
+            return None
+        state.last_trigger = tick.ts
+        if reason == "stop_loss":
+            state.stop_armed = False
+        elif reason == "target":
+            state.target_armed = False
+        state.triggers[reason] = state.triggers.get(reason, 0) + 1
+        return reason
+
+    def arm(self, symbol: str, stop_loss: Optional[float] = None, target_price: Optional[float] = None) -> None:
+        """Re-base a symbol on its current price after an analysis and adopt the decision's levels."""
+        state = self._states.get(symbol)
+        if state is None:
+            return
+        state.reference = state.price
+        state.stop_loss = stop_loss
+        state.target_price = target_price
+        # A level the price is already beyond is not a fresh crossing.
+        state.stop_armed = stop_loss is None or state.price > stop_loss
+        state.target_armed = target_price is None or state.price < target_price
+
+    def last_prices(self) -> Dict[str, float]:
+        return {symbol: state.price for symbol, state in self._states.items()}
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            symbol: {
+                "price": state.price,
+                "ts": state.ts,
+                "reference": state.reference,
+                "move": state.price / state.reference - 1.0,
+                "tick_volatility": math.sqrt(state.variance),
+                "stop_loss": state.stop_loss,
+                "target_price": state.target_price,
+                "triggers": dict(state.triggers),
+            }
+            for symbol, state in sorted(self._states.items())
+        }
+
+
+async def _authenticate(ws: Any, key: str, secret: str) -> None:
+    """Send credentials and wait for the "authenticated" ack; Alpaca drops subscriptions sent before it."""
+    await ws.send(json.dumps({"action": "auth", "key": key, "secret": secret}))
+    deadline = time.monotonic() + AUTH_TIMEOUT_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RuntimeError("alpaca stream did not acknowledge authentication")
+        for message in json.loads(await asyncio.wait_for(ws.recv(), remaining)):
+            kind = message.get("T")
+            if kind == "success" and message.get("msg") == "authenticated":
+                return
+            if kind == "error":
+                raise RuntimeError(f"alpaca stream auth error {message.get('code')}: {message.get('msg')}")
+
+
+async def alpaca_ticks(
+    symbols: Callable[[], Iterable[str]],
+    on_connected: Callable[[], None] = lambda: None,
+) -> AsyncIterator[Tick]:
+    """Trades from the Alpaca market data stream, following changes to the owned symbol set."""
+    import websockets
+
+    from broker_adapters import ALPACA_API_KEY_ENV, ALPACA_SECRET_KEY_ENV
+
+    key, secret = os.getenv(ALPACA_API_KEY_ENV), os.getenv(ALPACA_SECRET_KEY_ENV)
+    if not key or not secret:
+        raise RuntimeError("Alpaca API keys are not set")
+    async with websockets.connect(os.getenv(PRICE_STREAM_URL_ENV, DEFAULT_STREAM_URL)) as ws:
+        await _authenticate(ws, key, secret)
+        on_connected()
+        subscribed: Set[str] = set()
+        while True:
+            wanted = set(symbols())
+            if wanted != subscribed:
+                if subscribed - wanted:
+                    await ws.send(json.dumps({"action": "unsubscribe", "trades": sorted(subscribed - wanted)}))
+                if wanted - subscribed:
+                    await ws.send(json.dumps({"action": "subscribe", "trades": sorted(wanted - subscribed)}))
+                subscribed = wanted
+            try:
+                raw = await asyncio.wait_for(ws.recv(), RESUBSCRIBE_SECONDS)
+            except asyncio.TimeoutError:
+                continue
+            for message in json.loads(raw):
+                kind = message.get("T")
+                if kind == "t":
+                    yield Tick(message["S"], float(message["p"]), time.time())
+                elif kind == "error":
+                    raise RuntimeError(f"alpaca stream error {message.get('code')}: {message.get('msg')}")
+
+
+def _read_lines(path: str) -> List[str]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as fh:
+        return [line for line in fh if line.strip()]
+
+
+async def replay_ticks(path: str, speed: float) -> AsyncIterator[Tick]:
+    """Ticks from a JSON-lines file (optionally gzipped), paced by their timestamps / speed (0 = no pacing)."""
+    lines = await asyncio.to_thread(_read_lines, path)
+    first_ts: Optional[float] = None
+    started = time.monotonic()
+    for line in lines:
+        record = json.loads(line)
+        tick = Tick(str(record["symbol"]), float(record["price"]), float(record["ts"]))
+        if speed > 0:
+            first_ts = tick.ts if first_ts is None else first_ts
+            delay = (tick.ts - first_ts) / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        else:
+            # Still yield to the loop so triggered analyses run alongside the replay.
+            await asyncio.sleep(0)
+        yield tick
+
+
+class PriceStream:
+    def __init__(self) -> None:
+        self.engine = TriggerEngine()
+        self.connected = False
+        self.finished = False
+        self.ticks = 0
+        self.last_error: Optional[str] = None
+        self._inflight: Set[str] = set()
+        self._owned: Set[str] = set()
+        self._owned_at = -math.inf
+        # Monotonic receive time of each symbol's latest tick, for coverage().
+        self._seen: Dict[str, float] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+
+    def _source(self, symbols: Callable[[], Iterable[str]]) -> AsyncIterator[Tick]:
+        if stream_mode() == "replay":
+            path = os.getenv(PRICE_STREAM_REPLAY_PATH_ENV)
+            if not path:
+                raise RuntimeError("PRICE_STREAM_REPLAY_PATH is not set")
+            self._connected()
+            return replay_ticks(path, get_settings().price_stream_replay_speed)
+        return alpaca_ticks(symbols, self._connected)
+
+    def _connected(self) -> None:
+        self.connected = True
+
+    async def run(
+        self,
+        symbols: Callable[[], Iterable[str]],
+        on_trigger: Callable[[str, str, float], Awaitable[None]],
+    ) -> None:
+        """Consume the feed until cancelled (or a replay ends), reconnecting with backoff."""
+        backoff = 1.0
+        while True:
+            try:
+                async for tick in self._source(symbols):
+                    backoff = 1.0
+                    self._handle(tick, symbols, on_trigger)
+                if stream_mode() == "replay":
+                    self.finished = True
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.last_error = f"{type(exc).__name__}: {exc}"
+            finally:
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+    def _handle(
+        self,
+        tick: Tick,
+        symbols: Callable[[], Iterable[str]],
+        on_trigger: Callable[[str, str, float], Awaitable[None]],
+    ) -> None:
+        self.ticks += 1
+        self._seen[tick.symbol] = time.monotonic()
+        # Replays carry every symbol; only the ones this worker owns are acted on.
+        now = time.monotonic()
+        if now - self._owned_at > RESUBSCRIBE_SECONDS:
+            self._owned, self._owned_at = set(symbols()), now
+        if tick.symbol not in self._owned:
+            return
+        reason = self.engine.on_tick(tick, get_settings())
+        if reason is None or tick.symbol in self._inflight:
+            return
+        metrics.PRICE_TRIGGERS.inc(reason)
+        self._inflight.add(tick.symbol)
+        task = asyncio.get_running_loop().create_task(on_trigger(tick.symbol, reason, tick.price))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t, symbol=tick.symbol: self._done(symbol, t))
+
+    def _done(self, symbol: str, task: "asyncio.Task[None]") -> None:
+        self._tasks.discard(task)
+        self._inflight.discard(symbol)
+
+    def covered(self, symbols: Iterable[str], max_age_seconds: float) -> Set[str]:
+        """Symbols the stream is live for: connected, with a tick received within max_age_seconds."""
+        if not self.connected:
+            return set()
+        now = time.monotonic()
+        return {s for s in symbols if now - self._seen.get(s, -math.inf) <= max_age_seconds}
+
+    async def drain(self) -> None:
+        """Wait for triggered analyses still running (used after a replay finishes)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "mode": stream_mode(),
+            "connected": self.connected,
+            "finished": self.finished,
+            "ticks": self.ticks,
+            "in_flight": sorted(self._inflight),
+            "last_error": self.last_error,
+            "symbols": self.engine.snapshot(),
+        }
+
+
+_stream = PriceStream()
+
+
+def get_stream() -> PriceStream:
+    return _stream
+
+
+def last_prices() -> Dict[str, float]:
+    return _stream.engine.last_prices()
@@ -0,0 +1,103 @@
+"""Opt-in sampling profiler for slow requests.
+
+With PROFILE_SLOW_REQUESTS_MS set, a daemon thread samples the stacks of every
+Python thread (the event loop and the broker/DB worker threads) every
+PROFILE_INTERVAL_MS while at least one request is in flight. When a request
+finishes slower than the threshold, the samples taken during it are written as
+collapsed stacks ("frame;frame;frame count", the flamegraph.pl / speedscope
+input format) to PROFILE_DIR/<trace id>.folded. Nothing runs when disabled.
+
+Coroutines suspended on I/O are not on any thread's stack; the trace span tree
+covers that time, the profile shows where CPU and blocking calls went.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from settings import get_settings
+
+
+PROFILE_DIR_ENV = "PROFILE_DIR"
+
+MAX_SAMPLES = 200_000
+MAX_DEPTH = 64
+
+
+def _collapse(frame, thread_name: str) -> str:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self) -> None:
+        self._samples: Deque[Tuple[float, str]] = deque(maxlen=MAX_SAMPLES)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def threshold_ms(self) -> float:
+        return get_settings().profile_slow_requests_ms
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def _run(self) -> None:
+        interval = max(get_settings().profile_interval_ms, 1.0) / 1000.0
+        me = threading.get_ident()
+        while True:
+            if self._active <= 0:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            now = time.perf_counter()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                self._samples.append((now, _collapse(frame, names.get(ident, str(ident)))))
+            time.sleep(interval)
+
+    def begin(self) -> float:
+        with self._lock:
+            self._active += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return time.perf_counter()
+
+    def end(self, started: float, label: str) -> Optional[str]:
+        """Finish a request; returns the written profile path if it was slow enough to keep."""
+        ended = time.perf_counter()
+        with self._lock:
+            self._active -= 1
+        if (ended - started) * 1000.0 < self.threshold_ms:
+            return None
+        stacks: Dict[str, int] = Counter(stack for ts, stack in list(self._samples) if started <= ts <= ended)
+        if not stacks:
+            return None
+        directory = os.getenv(PROFILE_DIR_ENV, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{label}.folded")
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, count in sorted(stacks.items()):
+                fh.write(f"{stack} {count}\n")
+        return path
+
+
+_profiler = SamplingProfiler()
+
+
+def get_profiler() -> SamplingProfiler:
+    return _profiler
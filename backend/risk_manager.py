@@ -1,25 +1,50 @@
-import os
 from typing import Optional
 
+import event_bus
+import metrics
+import tracing
 from schemas import FinalDecision, MarketData
+from settings import Settings, get_settings
 
 
-def apply_risk_filters(decision: FinalDecision, market_data: MarketData) -> FinalDecision:
-    max_position_ratio = float(os.getenv("MAX_POSITION_SIZE", "0.10"))
-    total_capital = float(os.getenv("ACCOUNT_EQUITY", "100000"))
+def apply_risk_filters(
+    decision: FinalDecision,
+    market_data: MarketData,
+    settings: Optional[Settings] = None,
+) -> FinalDecision:
+    with metrics.RISK_FILTER_SECONDS.time("position"), tracing.span("risk.position"):
+        return _apply_risk_filters(decision, market_data, settings or get_settings())
+
+
+def _apply_risk_filters(decision: FinalDecision, market_data: MarketData, settings: Settings) -> FinalDecision:
 
     if decision.final_decision == "HOLD":
         decision.recommended_position_size = 0.0
+        _publish(decision, market_data)
         return decision
 
-    position_dollar = total_capital * max_position_ratio
+    position_dollar = settings.account_equity * settings.max_position_size
     decision.recommended_position_size = position_dollar
 
-    min_stop_loss_distance = float(os.getenv("MIN_STOP_LOSS_DISTANCE", "0.03"))
+    min_stop_loss_distance = settings.min_stop_loss_distance
     if decision.stop_loss is not None:
         distance = (market_data.current_price - decision.stop_loss) / market_data.current_price
         if distance < min_stop_loss_distance:
             adjusted_stop = market_data.current_price * (1.0 - min_stop_loss_distance)
             decision.stop_loss = adjusted_stop
 
+    _publish(decision, market_data)
     return decision
+
+
+def _publish(decision: FinalDecision, market_data: MarketData) -> None:
+    event_bus.publish(
+        "risk",
+        {
+            "final_decision": decision.final_decision,
+            "recommended_position_size": decision.recommended_position_size,
+            "stop_loss": decision.stop_loss,
+            "price": market_data.current_price,
+        },
+        market_data.symbol,
+    )
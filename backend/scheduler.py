@@ -0,0 +1,188 @@
+"""Per-symbol, market-hours-aware scheduling for the polling loop.
+
+Symbols sit in a heap keyed by when they are next due. After each analysis a
+symbol's interval is POLL_INTERVAL_SECONDS divided by an urgency score:
+
+- volatility: annualised volatility above RISK_TARGET_VOLATILITY adds urgency
+- position: an open position adds up to 1 as it approaches MAX_POSITION_SIZE
+- proximity: price within PROXIMITY_BAND of the decision's stop or target adds up to 2
+- idle: an unheld symbol the nodes voted HOLD on counts half
+
+clamped to [SCHEDULE_MIN_INTERVAL_SECONDS, SCHEDULE_MAX_INTERVAL_SECONDS]. With
+MARKET_HOURS_ONLY=true nothing is due outside the regular session (due times
+roll to the next open); otherwise closed-market intervals are stretched by
+CLOSED_MARKET_FACTOR. Each cycle takes at most SCHEDULE_BATCH_SIZE of the most
+overdue symbols, so when capacity is short the urgent ones go first.
+"""
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import market_calendar
+import metrics
+import portfolio_risk
+from schemas import FinalDecision, MarketData
+from settings import Settings, get_settings
+
+
+PROXIMITY_BAND = 0.05
+IDLE_URGENCY = 0.5
+CLOSED_MARKET_FACTOR = 4.0
+TRADING_DAYS = 252
+
+
+@dataclass
+class Cadence:
+    interval: float
+    urgency: float
+    volatility: float
+    position_weight: float
+    proximity: Optional[float]
+    reason: str
+
+
+def cadence(
+    settings: Settings,
+    market_data: Optional[MarketData],
+    decision: Optional[FinalDecision],
+    position_weight: float,
+    annual_volatility: float,
+) -> Cadence:
+    base = float(settings.poll_interval_seconds)
+    urgency = 1.0
+    reasons = []
+    vol_excess = max(annual_volatility / settings.risk_target_volatility - 1.0, 0.0) if settings.risk_target_volatility > 0 else 0.0
+    if vol_excess > 0:
+        urgency += vol_excess
+        reasons.append("volatility")
+    if position_weight > 0:
+        urgency += min(position_weight / settings.max_position_size, 1.0)
+        reasons.append("position")
+    proximity = None
+    if market_data is not None and decision is not None and market_data.current_price > 0:
+        levels = [level for level in (decision.stop_loss, decision.target_price) if level]
+        if levels:
+            proximity = min(abs(market_data.current_price - level) / market_data.current_price for level in levels)
+            if proximity < PROXIMITY_BAND:
+                urgency += 2.0 * (1.0 - proximity / PROXIMITY_BAND)
+                reasons.append("near_stop_or_target")
+    if position_weight <= 0 and decision is not None and decision.final_decision == "HOLD" and urgency == 1.0:
+        urgency = IDLE_URGENCY
+        reasons.append("idle")
+    interval = min(max(base / urgency, settings.schedule_min_interval_seconds), settings.schedule_max_interval_seconds)
+    return Cadence(interval, urgency, annual_volatility, position_weight, proximity, ",".join(reasons) or "base")
+
+
+class SymbolScheduler:
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[str, float] = {}
+        self._cadence: Dict[str, Cadence] = {}
+        self._counter = itertools.count()
+
+    def _push(self, symbol: str, due: float) -> None:
+        self._due[symbol] = due
+        heapq.heappush(self._heap, (due, next(self._counter), symbol))
+
+    def _admit(self, due: float, settings: Settings) -> float:
+        if settings.market_hours_only:
+            return market_calendar.next_open(due)
+        return due
+
+    def sync(self, symbols: Iterable[str], now: float, settings: Optional[Settings] = None) -> None:
+        """Track exactly these symbols; new ones are due immediately (or at the next open)."""
+        settings = settings or get_settings()
+        wanted = set(symbols)
+        for symbol in [s for s in self._due if s not in wanted]:
+            # Heap entries are dropped lazily when they surface.
+            del self._due[symbol]
+            self._cadence.pop(symbol, None)
+        for symbol in wanted:
+            if symbol not in self._due:
+                self._push(symbol, self._admit(now, settings))
+        if len(self._heap) > 4 * max(len(self._due), 16):
+            self._heap = [(due, seq, s) for due, seq, s in self._heap if self._due.get(s) == due]
+            heapq.heapify(self._heap)
+
+    def _peek(self) -> Optional[Tuple[float, str]]:
+        while self._heap:
+            due, _, symbol = self._heap[0]
+            if self._due.get(symbol) == due:
+                return due, symbol
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: float, limit: int) -> List[str]:
+        """Up to limit symbols whose due time has passed, most overdue first."""
+        popped: List[str] = []
+        while len(popped) < limit:
+            top = self._peek()
+            if top is None or top[0] > now:
+                break
+            heapq.heappop(self._heap)
+            due, symbol = top
+            metrics.SCHEDULE_LAG_SECONDS.observe(max(now - due, 0.0))
+            # Parked until rescheduled; a symbol never runs twice at once.
+            self._due[symbol] = math.inf
+            popped.append(symbol)
+        return popped
+
+    def next_due(self) -> Optional[float]:
+        top = self._peek()
+        return top[0] if top else None
+
+    def reschedule(
+        self,
+        symbol: str,
+        market_data: Optional[MarketData],
+        decision: Optional[FinalDecision],
+        settings: Optional[Settings] = None,
+        now: Optional[float] = None,
+    ) -> None:
+        settings = settings or get_settings()
+        now = time.time() if now is None else now
+        if symbol not in self._due:
+            return
+        equity = settings.account_equity
+        weight = portfolio_risk.get_engine().exposure(symbol) / equity if equity else 0.0
+        daily_vol, _, known = portfolio_risk.risk_model([symbol], settings.risk_default_volatility)
+        annual_vol = float(daily_vol[0] * math.sqrt(TRADING_DAYS)) if known[0] else settings.risk_default_volatility
+        plan = cadence(settings, market_data, decision, abs(weight), annual_vol)
+        interval = plan.interval
+        if not settings.market_hours_only and market_calendar.session(now) != "regular":
+            interval = min(interval * CLOSED_MARKET_FACTOR, max(settings.schedule_max_interval_seconds, interval))
+        self._cadence[symbol] = plan
+        self._push(symbol, self._admit(now + interval, settings))
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        symbols = {}
+        for symbol, due in sorted(self._due.items(), key=lambda item: item[1]):
+            plan = self._cadence.get(symbol)
+            symbols[symbol] = {
+                "due_in_seconds": None if math.isinf(due) else due - now,
+                "running": math.isinf(due),
+                "interval_seconds": plan.interval if plan else None,
+                "urgency": plan.urgency if plan else None,
+                "annual_volatility": plan.volatility if plan else None,
+                "position_weight": plan.position_weight if plan else None,
+                "proximity": plan.proximity if plan else None,
+                "reason": plan.reason if plan else None,
+            }
+        next_close = market_calendar.next_close(now)
+        return {
+            "session": market_calendar.session(now),
+            "next_open": market_calendar.next_open(now),
+            "next_close": next_close,
+            "symbols": symbols,
+        }
+
+
+_scheduler = SymbolScheduler()
+
+
+def get_scheduler() -> SymbolScheduler:
+    return _scheduler
@@ -1,14 +1,19 @@
-from typing import Dict, List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr
 
 
+# The parts of MarketData are immutable so its cached JSON cannot go stale underneath it.
 class MACD(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     value: float
     signal: float
 
 
 class TechnicalIndicators(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     rsi_14: Optional[float] = None
     macd: Optional[MACD] = None
     bb_upper: Optional[float] = None
@@ -16,11 +21,15 @@ class TechnicalIndicators(BaseModel):
 
 
 class Fundamentals(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     pe_ratio: Optional[float] = None
     market_cap: Optional[float] = None
 
 
 class NewsSentimentItem(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     headline: str
     sentiment_score: float
 
@@ -35,7 +44,29 @@ class MarketData(BaseModel):
     volume_avg_30d: Optional[int] = None
     technical_indicators: Optional[TechnicalIndicators] = None
     fundamentals: Optional[Fundamentals] = None
-    news_sentiment: Optional[List[NewsSentimentItem]] = None
+    news_sentiment: Optional[Tuple[NewsSentimentItem, ...]] = None
+    # The five node prompts, the single-flight fingerprint and the audit share one encoding.
+    _json: Optional[str] = PrivateAttr(default=None)
+
+    def cached_json(self) -> str:
+        """model_dump_json(), computed once; assigning a field (or model_copy) starts afresh.
+
+        Nested models are frozen and news_sentiment is a tuple, so a field assignment is the
+        only way the data can change.
+        """
+        if self._json is None:
+            self._json = self.model_dump_json()
+        return self._json
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name != "_json":
+            super().__setattr__("_json", None)
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> "MarketData":
+        copied = super().model_copy(update=update, deep=deep)
+        copied._json = None
+        return copied
 
 
 class NodeRecommendation(BaseModel):
@@ -58,9 +89,12 @@ class FinalDecision(BaseModel):
     target_price: Optional[float] = None
     stop_loss: Optional[float] = None
     node_results: List[NodeRecommendation]
+    # Prompts, raw responses and the input snapshot, journalled to the audit store; never serialized.
+    _audit: Optional[Dict[str, Any]] = PrivateAttr(default=None)
 
 
 class TradeResponse(BaseModel):
     symbol: str
     decision: FinalDecision
     order_id: Optional[str] = None
+    trace_id: Optional[str] = None
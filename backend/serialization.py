@@ -0,0 +1,51 @@
+"""JSON encoding for API responses, events and DB payloads.
+
+orjson is used when installed (stdlib json otherwise, with the same output
+shape apart from whitespace). Pydantic models are encoded by pydantic-core
+with model_dump_json and returned as ready bytes, so FastAPI neither
+re-validates nor re-encodes a FinalDecision on the way out.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # timedelta, Decimal, UUID and the like, as json.dumps(default=str) would.
+    return str(value)
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps_text(value: Any) -> str:
+    return dumps(value).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; datetimes, numpy values and models are handled natively."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(model: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """A trusted model encoded once by pydantic-core, bypassing response_model validation."""
+    return Response(content=model.model_dump_json(), status_code=status_code, headers=headers, media_type="application/json")
+
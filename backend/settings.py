@@ -0,0 +1,311 @@
+"""Immutable, validated runtime configuration.
+
+A Settings snapshot is built from the environment overlaid with the
+app_settings table. Stages take the snapshot they are handed (or the current
+one) instead of parsing os.environ on every call; reload() swaps in a new
+snapshot atomically, so a polling cycle always sees one consistent view.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from nodes import fundamental_analysis, momentum_analysis, risk_evaluation, sentiment_analysis, technical_analysis
+
+
+DECISION_ALGORITHMS = {"weighted_majority", "unanimous"}
+
+# node_id -> (env var, default model)
+NODE_MODEL_ENVS: Dict[str, Tuple[str, str]] = {
+    "technical_analysis": (technical_analysis.TECHNICAL_MODEL_ENV, technical_analysis.DEFAULT_TECHNICAL_MODEL),
+    "fundamental_analysis": (fundamental_analysis.FUNDAMENTAL_MODEL_ENV, fundamental_analysis.DEFAULT_FUNDAMENTAL_MODEL),
+    "sentiment_analysis": (sentiment_analysis.SENTIMENT_MODEL_ENV, sentiment_analysis.DEFAULT_SENTIMENT_MODEL),
+    "risk_evaluation": (risk_evaluation.RISK_MODEL_ENV, risk_evaluation.DEFAULT_RISK_MODEL),
+    "momentum_analysis": (momentum_analysis.MOMENTUM_MODEL_ENV, momentum_analysis.DEFAULT_MOMENTUM_MODEL),
+}
+
+
+def _symbols(value: str) -> Tuple[str, ...]:
+    return tuple(s.strip() for s in value.split(",") if s.strip())
+
+
+def _bool(value: str) -> bool:
+    return value.lower() == "true"
+
+
+def _bool_default_true(value: str) -> bool:
+    return value.lower() != "false"
+
+
+def _optional_float(value: str) -> Optional[float]:
+    return float(value) if value else None
+
+
+@dataclass(frozen=True)
+class Settings:
+    trading_mode: str = "virtual"
+    decision_algorithm: str = "weighted_majority"
+    confidence_threshold: float = 0.6
+    max_position_size: float = 0.10
+    account_equity: float = 100000.0
+    min_stop_loss_distance: float = 0.03
+    max_daily_loss: float = 0.02
+    max_concurrent_positions: int = 10
+    risk_target_volatility: float = 0.20
+    risk_default_volatility: float = 0.30
+    risk_max_var: float = 0.03
+    node_weighting: str = "adaptive"
+    node_weight_half_life_days: float = 30.0
+    node_weight_refresh_seconds: float = 300.0
+    node_skip_accuracy: float = 0.0
+    node_skip_min_samples: float = 20.0
+    analysis_reuse_seconds: float = 0.0
+    llm_daily_budget_usd: float = 0.0
+    llm_daily_token_budget: int = 0
+    llm_fallback_model: str = ""
+    trigger_move_pct: float = 0.01
+    trigger_volatility_sigma: float = 4.0
+    trigger_debounce_seconds: float = 60.0
+    watch_symbols: Tuple[str, ...] = ()
+    poll_interval_seconds: int = 300
+    market_hours_only: bool = True
+    schedule_min_interval_seconds: float = 30.0
+    schedule_max_interval_seconds: float = 3600.0
+    schedule_batch_size: int = 10
+    auto_trade_enabled: bool = False
+    nisa_enabled: bool = False
+    nisa_symbols: Tuple[str, ...] = ()
+    nisa_invest_amount: float = 0.0
+    nisa_max_price: Optional[float] = None
+    nisa_schedule: str = "monthly:1"
+    # Infrastructure knobs, parsed once per snapshot like the trading settings above.
+    settings_reload_seconds: float = 30.0
+    coordination_enabled: bool = False
+    lease_ttl_seconds: float = 30.0
+    lease_heartbeat_seconds: float = 10.0
+    job_workers: int = 4
+    job_queue_size: int = 1000
+    job_result_ttl_seconds: float = 3600.0
+    budget_flush_seconds: float = 60.0
+    budget_pricing_refresh_seconds: float = 3600.0
+    price_stream_replay_speed: float = 1.0
+    archive_retention_days: float = 0.0
+    archive_interval_seconds: float = 3600.0
+    audit_retention_days: float = 0.0
+    news_dedup: bool = True
+    news_ttl_hours: float = 48.0
+    profile_slow_requests_ms: float = 0.0
+    profile_interval_ms: float = 5.0
+    node_models: Mapping[str, str] = field(
+        default_factory=lambda: MappingProxyType({node_id: default for node_id, (_, default) in NODE_MODEL_ENVS.items()})
+    )
+    version: int = 0
+    loaded_at: float = 0.0
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # MappingProxyType does not pickle; rebuild it so snapshots can be sent to worker processes.
+        return _restore, (describe(self),)
+
+    def validate(self) -> None:
+        from broker_adapters import available_modes
+
+        if self.trading_mode not in available_modes():
+            raise ValueError(f"TRADING_MODE must be one of {sorted(available_modes())}, got {self.trading_mode!r}")
+        if self.decision_algorithm not in DECISION_ALGORITHMS:
+            raise ValueError(f"DECISION_ALGORITHM must be one of {sorted(DECISION_ALGORITHMS)}")
+        if self.confidence_threshold < 0:
+            raise ValueError("CONFIDENCE_THRESHOLD must be >= 0")
+        if not 0 < self.max_position_size <= 1:
+            raise ValueError("MAX_POSITION_SIZE must be in (0, 1]")
+        if self.account_equity <= 0:
+            raise ValueError("ACCOUNT_EQUITY must be > 0")
+        if not 0 <= self.min_stop_loss_distance < 1:
+            raise ValueError("MIN_STOP_LOSS_DISTANCE must be in [0, 1)")
+        if self.max_daily_loss < 0 or self.max_concurrent_positions < 0:
+            raise ValueError("MAX_DAILY_LOSS and MAX_CONCURRENT_POSITIONS must be >= 0")
+        if self.analysis_reuse_seconds < 0:
+            raise ValueError("ANALYSIS_REUSE_SECONDS must be >= 0")
+        if self.llm_daily_budget_usd < 0 or self.llm_daily_token_budget < 0:
+            raise ValueError("LLM_DAILY_BUDGET_USD and LLM_DAILY_TOKEN_BUDGET must be >= 0")
+        if self.trigger_move_pct < 0 or self.trigger_volatility_sigma < 0 or self.trigger_debounce_seconds < 0:
+            raise ValueError("TRIGGER_MOVE_PCT, TRIGGER_VOLATILITY_SIGMA and TRIGGER_DEBOUNCE_SECONDS must be >= 0")
+        if self.poll_interval_seconds <= 0:
+            raise ValueError("POLL_INTERVAL_SECONDS must be > 0")
+        if not 0 < self.schedule_min_interval_seconds <= self.schedule_max_interval_seconds:
+            raise ValueError("SCHEDULE_MIN_INTERVAL_SECONDS must be > 0 and <= SCHEDULE_MAX_INTERVAL_SECONDS")
+        if self.schedule_batch_size <= 0:
+            raise ValueError("SCHEDULE_BATCH_SIZE must be > 0")
+        if self.nisa_invest_amount < 0:
+            raise ValueError("NISA_INVEST_AMOUNT must be >= 0")
+        if self.lease_ttl_seconds <= 0 or self.lease_heartbeat_seconds <= 0:
+            raise ValueError("LEASE_TTL_SECONDS and LEASE_HEARTBEAT_SECONDS must be > 0")
+        if self.job_workers <= 0 or self.job_queue_size <= 0 or self.job_result_ttl_seconds < 0:
+            raise ValueError("JOB_WORKERS and JOB_QUEUE_SIZE must be > 0, JOB_RESULT_TTL_SECONDS >= 0")
+        if min(self.price_stream_replay_speed, self.archive_retention_days, self.audit_retention_days, self.news_ttl_hours) < 0:
+            raise ValueError(
+                "PRICE_STREAM_REPLAY_SPEED, ARCHIVE_RETENTION_DAYS, AUDIT_RETENTION_DAYS and NEWS_TTL_HOURS must be >= 0"
+            )
+        from nisa_mode import parse_schedule
+
+        try:
+            parse_schedule(self.nisa_schedule)
+        except ValueError as exc:
+            raise ValueError(f"NISA_SCHEDULE: {exc}") from exc
+
+
+# Settings attribute -> (source key, parser). Keys are shared by the environment and app_settings.
+_SOURCES: Dict[str, Tuple[str, Callable[[str], Any]]] = {
+    "trading_mode": ("TRADING_MODE", str.lower),
+    "decision_algorithm": ("DECISION_ALGORITHM", str.lower),
+    "confidence_threshold": ("CONFIDENCE_THRESHOLD", float),
+    "max_position_size": ("MAX_POSITION_SIZE", float),
+    "account_equity": ("ACCOUNT_EQUITY", float),
+    "min_stop_loss_distance": ("MIN_STOP_LOSS_DISTANCE", float),
+    "max_daily_loss": ("MAX_DAILY_LOSS", float),
+    "max_concurrent_positions": ("MAX_CONCURRENT_POSITIONS", int),
+    "risk_target_volatility": ("RISK_TARGET_VOLATILITY", float),
+    "risk_default_volatility": ("RISK_DEFAULT_VOLATILITY", float),
+    "risk_max_var": ("RISK_MAX_VAR", float),
+    "node_weighting": ("NODE_WEIGHTING", str.lower),
+    "node_weight_half_life_days": ("NODE_WEIGHT_HALF_LIFE_DAYS", float),
+    "node_weight_refresh_seconds": ("NODE_WEIGHT_REFRESH_SECONDS", float),
+    "node_skip_accuracy": ("NODE_SKIP_ACCURACY", float),
+    "node_skip_min_samples": ("NODE_SKIP_MIN_SAMPLES", float),
+    "analysis_reuse_seconds": ("ANALYSIS_REUSE_SECONDS", float),
+    "llm_daily_budget_usd": ("LLM_DAILY_BUDGET_USD", float),
+    "llm_daily_token_budget": ("LLM_DAILY_TOKEN_BUDGET", int),
+    "llm_fallback_model": ("LLM_FALLBACK_MODEL", str),
+    "trigger_move_pct": ("TRIGGER_MOVE_PCT", float),
+    "trigger_volatility_sigma": ("TRIGGER_VOLATILITY_SIGMA", float),
+    "trigger_debounce_seconds": ("TRIGGER_DEBOUNCE_SECONDS", float),
+    "watch_symbols": ("WATCH_SYMBOLS", _symbols),
+    "poll_interval_seconds": ("POLL_INTERVAL_SECONDS", int),
+    "market_hours_only": ("MARKET_HOURS_ONLY", _bool),
+    "schedule_min_interval_seconds": ("SCHEDULE_MIN_INTERVAL_SECONDS", float),
+    "schedule_max_interval_seconds": ("SCHEDULE_MAX_INTERVAL_SECONDS", float),
+    "schedule_batch_size": ("SCHEDULE_BATCH_SIZE", int),
+    "auto_trade_enabled": ("AUTO_TRADE_ENABLED", _bool),
+    "nisa_enabled": ("NISA_ENABLED", _bool),
+    "nisa_symbols": ("NISA_SYMBOLS", _symbols),
+    "nisa_invest_amount": ("NISA_INVEST_AMOUNT", float),
+    "nisa_max_price": ("NISA_MAX_PRICE", _optional_float),
+    "nisa_schedule": ("NISA_SCHEDULE", str),
+    "settings_reload_seconds": ("SETTINGS_RELOAD_SECONDS", float),
+    "coordination_enabled": ("COORDINATION_ENABLED", _bool),
+    "lease_ttl_seconds": ("LEASE_TTL_SECONDS", float),
+    "lease_heartbeat_seconds": ("LEASE_HEARTBEAT_SECONDS", float),
+    "job_workers": ("JOB_WORKERS", int),
+    "job_queue_size": ("JOB_QUEUE_SIZE", int),
+    "job_result_ttl_seconds": ("JOB_RESULT_TTL_SECONDS", float),
+    "budget_flush_seconds": ("BUDGET_FLUSH_SECONDS", float),
+    "budget_pricing_refresh_seconds": ("BUDGET_PRICING_REFRESH_SECONDS", float),
+    "price_stream_replay_speed": ("PRICE_STREAM_REPLAY_SPEED", float),
+    "archive_retention_days": ("ARCHIVE_RETENTION_DAYS", float),
+    "archive_interval_seconds": ("ARCHIVE_INTERVAL_SECONDS", float),
+    "audit_retention_days": ("AUDIT_RETENTION_DAYS", float),
+    "news_dedup": ("NEWS_DEDUP", _bool_default_true),
+    "news_ttl_hours": ("NEWS_TTL_HOURS", float),
+    "profile_slow_requests_ms": ("PROFILE_SLOW_REQUESTS_MS", float),
+    "profile_interval_ms": ("PROFILE_INTERVAL_MS", float),
+}
+
+
+def _clean(value: str) -> str:
+    # .env files are often written with trailing "# comment" on the same line.
+    return value.split(" #", 1)[0].strip()
+
+
+def build_settings(sources: Mapping[str, str], version: int = 0) -> Settings:
+    values: Dict[str, Any] = {}
+    for attr, (key, parse) in _SOURCES.items():
+        raw = sources.get(key)
+        if raw is None:
+            continue
+        try:
+            values[attr] = parse(_clean(raw))
+        except ValueError as exc:
+            raise ValueError(f"invalid {key}={raw!r}: {exc}") from exc
+    values["node_models"] = MappingProxyType({
+        node_id: _clean(sources.get(env) or "") or default for node_id, (env, default) in NODE_MODEL_ENVS.items()
+    })
+    settings = Settings(**values, version=version, loaded_at=time.time())
+    settings.validate()
+    return settings
+
+
+def _load_overrides() -> Dict[str, str]:
+    from db import get_connection
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT key, value FROM app_settings")
+            return {str(key): str(value) for key, value in cur.fetchall() if value is not None}
+
+
+_current: Optional[Settings] = None
+_last_error: Optional[str] = None
+_reload_lock = threading.Lock()
+
+
+def reload(use_db: bool = True) -> Settings:
+    """Rebuild the snapshot from env + app_settings; on invalid input the previous snapshot stays active.
+
+    If app_settings cannot be read the previous snapshot is kept as well: an env-only
+    rebuild could silently undo a database override such as TRADING_MODE=virtual.
+    The version only moves when the effective configuration changes, so caches keyed
+    on it survive periodic reloads.
+    """
+    global _current, _last_error
+    with _reload_lock:
+        sources: Dict[str, str] = dict(os.environ)
+        db_error: Optional[str] = None
+        if use_db:
+            try:
+                sources.update(_load_overrides())
+            except Exception as exc:
+                db_error = f"app_settings unavailable: {exc}"
+                if _current is not None:
+                    _last_error = db_error
+                    return _current
+        try:
+            candidate = build_settings(sources, version=(_current.version + 1) if _current else 1)
+        except ValueError as exc:
+            _last_error = str(exc)
+            if _current is None:
+                raise
+            return _current
+        # At startup without a database the env-only snapshot is all there is; the error stays visible.
+        _last_error = db_error
+        if _current is not None and _effective(candidate) == _effective(_current):
+            return _current
+        _current = candidate
+        return candidate
+
+
+def get_settings() -> Settings:
+    current = _current
+    if current is None:
+        current = reload()
+    return current
+
+
+def last_error() -> Optional[str]:
+    return _last_error
+
+
+def _restore(data: Dict[str, Any]) -> Settings:
+    return Settings(**{**data, "node_models": MappingProxyType(dict(data["node_models"]))})
+
+
+def _effective(settings: Settings) -> Dict[str, Any]:
+    data = describe(settings)
+    del data["version"], data["loaded_at"]
+    return data
+
+
+def describe(settings: Settings) -> Dict[str, Any]:
+    data = {f.name: getattr(settings, f.name) for f in fields(settings)}
+    data["node_models"] = dict(settings.node_models)
+    return data
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import metrics
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one in-flight task.
+
+    Callers that arrive while a call is running await the same task and get
+    its result (or exception). With reuse_seconds > 0 a successful result is
+    also handed to callers arriving shortly after it completed. The shared task
+    is shielded, so one caller disconnecting does not cancel it for the rest.
+    Callers receive the same object; copy it before mutating.
+    """
+
+    def __init__(self, counter: Optional[metrics.Counter] = None) -> None:
+        self._counter = counter
+        self._inflight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self._recent: Dict[Hashable, Tuple[float, Any]] = {}
+        self.started = 0
+        self.joined = 0
+        self.reused = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], reuse_seconds: float = 0.0) -> Any:
+        now = time.monotonic()
+        recent = self._recent.get(key)
+        if recent is not None:
+            if recent[0] > now:
+                self.reused += 1
+                self._count("reused")
+                return recent[1]
+            del self._recent[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.started += 1
+            self._count("started")
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t, reuse_seconds))
+        else:
+            self.joined += 1
+            self._count("joined")
+        return await asyncio.shield(task)
+
+    def _count(self, result: str) -> None:
+        if self._counter is not None:
+            self._counter.inc(result)
+
+    def _finish(self, key: Hashable, task: "asyncio.Task[Any]", reuse_seconds: float) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if reuse_seconds > 0 and not task.cancelled() and task.exception() is None:
+            self._recent[key] = (time.monotonic() + reuse_seconds, task.result())
+        # Expired entries are otherwise only dropped when their key is asked for again.
+        now = time.monotonic()
+        for stale in [k for k, (expires, _) in self._recent.items() if expires <= now]:
+            del self._recent[stale]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "cached": len(self._recent),
+            "started": self.started,
+            "joined": self.joined,
+            "reused": self.reused,
+        }
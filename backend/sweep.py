@@ -0,0 +1,376 @@
+"""Parameter sweep of the vote aggregation over recorded node votes.
+
+Every journalled decision in trade_decisions (and the Parquet archive) is a
+decision point with the five nodes' recommendations and confidences and the
+price it was taken at. The history is loaded once into (rows, nodes) matrices;
+orchestrator.aggregate_votes then re-decides every row for a whole chunk of
+weight/threshold combinations in one broadcast call.
+
+Each configuration is scored like the long-only ledger: BUY opens a unit
+position, SELL closes it, HOLD keeps it, and the position earns the symbol's
+return up to its next decision point. Realized P&L recorded on the rows where
+a configuration would have made the same call is reported alongside. The
+configurations that are not dominated on total return, max drawdown and hit
+rate form the Pareto front.
+
+    python sweep.py --samples 1000 --thresholds 0.3,0.4,0.5,0.6,0.7
+"""
+import argparse
+import json
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import node_weights
+import orchestrator
+from settings import Settings, get_settings, reload as reload_settings
+
+
+NODE_IDS: List[str] = list(orchestrator.DEFAULT_WEIGHTS)
+DEFAULT_THRESHOLDS: Tuple[float, ...] = (0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8)
+# Upper bound on configs * rows evaluated per chunk.
+CHUNK_ELEMENTS = 4_000_000
+HISTORY_TTL_SECONDS = 300.0
+
+
+@dataclass
+class VoteHistory:
+    """Decision points sorted by (symbol, timestamp)."""
+
+    ids: np.ndarray
+    timestamps: np.ndarray  # datetime64[s]
+    symbols: np.ndarray
+    codes: np.ndarray  # (rows, nodes) VOTE_CODES, 0 where a node did not vote
+    confidences: np.ndarray
+    executed: np.ndarray  # decision code actually journalled
+    profit_loss: np.ndarray  # realized P&L, 0 when none
+    returns: np.ndarray  # price change to the symbol's next decision point, 0 on its last
+    segment_start: np.ndarray  # index of the first row of each row's symbol
+    time_order: np.ndarray  # row indices in timestamp order, for the portfolio equity curve
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def _price(entry_price: Optional[float], exit_price: Optional[float]) -> float:
+    # SELL rows carry the average cost as entry_price; the fill is exit_price.
+    price = exit_price if exit_price is not None else entry_price
+    return float(price) if price else np.nan
+
+
+def build_history(rows: Sequence[Tuple[Any, ...]]) -> VoteHistory:
+    """rows are (id, timestamp, symbol, decision, entry_price, exit_price, profit_loss, node_votes)."""
+    rows = sorted(rows, key=lambda row: (row[2], row[1], row[0]))
+    n = len(rows)
+    col = {node_id: i for i, node_id in enumerate(NODE_IDS)}
+    codes = np.zeros((n, len(NODE_IDS)), dtype=np.int8)
+    confidences = np.zeros((n, len(NODE_IDS)))
+    prices = np.empty(n)
+    for r, row in enumerate(rows):
+        prices[r] = _price(row[4], row[5])
+        for vote in row[7] or []:
+            c = col.get(vote.get("node_id"))
+            if c is None:
+                continue
+            codes[r, c] = orchestrator.VOTE_CODES.get(vote.get("recommendation"), 0)
+            confidences[r, c] = float(vote.get("confidence", 0.5))
+    symbols = np.array([row[2] for row in rows], dtype=object)
+    first = np.ones(n, dtype=bool)
+    first[1:] = symbols[1:] != symbols[:-1]
+    last = np.ones(n, dtype=bool)
+    last[:-1] = first[1:]
+    returns = np.zeros(n)
+    if n > 1:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns[:-1] = prices[1:] / prices[:-1] - 1.0
+    returns = np.where(last | ~np.isfinite(returns), 0.0, returns)
+    timestamps = np.array([row[1] for row in rows], dtype="datetime64[s]")
+    return VoteHistory(
+        ids=np.array([row[0] for row in rows], dtype=np.int64),
+        timestamps=timestamps,
+        symbols=symbols,
+        codes=codes,
+        confidences=confidences,
+        executed=np.array([orchestrator.VOTE_CODES.get(row[3], 0) for row in rows], dtype=np.int8),
+        profit_loss=np.array([float(row[6] or 0.0) for row in rows]),
+        returns=returns,
+        segment_start=np.maximum.accumulate(np.where(first, np.arange(n), 0)),
+        time_order=np.argsort(timestamps, kind="stable"),
+    )
+
+
+def load_history(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[Sequence[str]] = None,
+) -> VoteHistory:
+    from db import get_connection
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, timestamp, symbol, decision, entry_price, exit_price, profit_loss, node_votes
+                FROM trade_decisions
+                WHERE node_votes IS NOT NULL
+                  AND (%s::timestamp IS NULL OR timestamp >= %s)
+                  AND (%s::timestamp IS NULL OR timestamp < %s)
+                  AND (%s::text[] IS NULL OR symbol = ANY(%s))
+                """,
+                (since, since, until, until, list(symbols) if symbols else None, list(symbols) if symbols else None),
+            )
+            rows = list(cur.fetchall())
+    try:
+        import archive
+
+        columns = ["id", "timestamp", "symbol", "decision", "entry_price", "exit_price", "profit_loss"] + [
+            f"{node_id}_{part}" for node_id in archive.NODE_IDS for part in ("recommendation", "confidence", "model")
+        ] + ["extra_votes"]
+        for row in archive.scan(columns, since, until, symbols).to_pylist():
+            rows.append((
+                row["id"], row["timestamp"], row["symbol"], row["decision"],
+                row["entry_price"], row["exit_price"], row["profit_loss"], archive.votes_from_row(row),
+            ))
+    except RuntimeError:
+        pass
+    return build_history(rows)
+
+
+def weight_grid(
+    base: Dict[str, float],
+    samples: int,
+    concentration: float = 10.0,
+    seed: Optional[int] = None,
+    extra: Sequence[Dict[str, float]] = (),
+) -> np.ndarray:
+    """(k, nodes) weight vectors: the base and extra sets, then Dirichlet draws centred on the base.
+
+    Half the draws are concentrated around the base weights, half uniform over the simplex; all
+    are scaled to the base total so thresholds stay comparable.
+    """
+    rng = np.random.default_rng(seed)
+    base_vec = np.array([base.get(node_id, 0.0) for node_id in NODE_IDS])
+    total = base_vec.sum() or 1.0
+    fixed = [base_vec] + [np.array([w.get(node_id, 0.0) for node_id in NODE_IDS]) for w in extra]
+    near = samples // 2
+    alpha = np.maximum(base_vec / total * concentration, 1e-3)
+    drawn = np.vstack([
+        rng.dirichlet(alpha, size=near),
+        rng.dirichlet(np.ones(len(NODE_IDS)), size=samples - near),
+    ]) * total
+    return np.vstack(fixed + [drawn])
+
+
+def _evaluate(history: VoteHistory, decision: np.ndarray) -> Dict[str, np.ndarray]:
+    """Score (configs, rows) decision codes; every metric comes back with shape (configs,)."""
+    n = len(history)
+    decision = decision.astype(np.int8, copy=False)
+    index = np.arange(n, dtype=np.int32)
+    nonzero = decision != 0
+    # Forward-fill the last BUY/SELL within each symbol, encoded as 2 * row + is_buy:
+    # a long position is open when that signal exists and was a BUY.
+    last = np.maximum.accumulate(np.where(nonzero, 2 * index + (decision == 1), -1), axis=-1)
+    position = (last >= 2 * history.segment_start) & (last & 1).astype(bool)
+
+    # Per-row returns are small, so float32 keeps the curve exact enough at half the memory traffic.
+    returns = history.returns[history.time_order].astype(np.float32)
+    contribution = np.where(position[:, history.time_order], returns, np.float32(0.0))
+    equity = np.cumsum(contribution, axis=-1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=-1), 0.0)
+    drawdown = (equity - peak).min(axis=-1)
+
+    starts = history.segment_start == index
+    changes = (position[:, 1:] != position[:, :-1]) & ~starts[1:]
+    trades = np.count_nonzero(changes, axis=-1) + np.count_nonzero(position[:, starts], axis=-1)
+
+    direction = np.sign(history.returns).astype(np.int8)
+    called = np.count_nonzero(nonzero & (direction != 0), axis=-1)
+    # 2 never equals a decision code, so a flat next move counts for no config.
+    correct = np.count_nonzero(decision == np.where(direction != 0, direction, 2).astype(np.int8), axis=-1)
+    agreed = decision == history.executed
+    return {
+        "total_return": contribution.sum(axis=-1, dtype=np.float64),
+        "max_drawdown": drawdown,
+        "hit_rate": np.where(called > 0, correct / np.maximum(called, 1), 0.0),
+        "trades": trades,
+        "signals": np.count_nonzero(nonzero, axis=-1),
+        "agreement": np.count_nonzero(agreed, axis=-1) / n,
+        "realized_pnl_agreed": np.where(agreed, history.profit_loss, 0.0).sum(axis=-1),
+    }
+
+
+def pareto_front(objectives: np.ndarray) -> np.ndarray:
+    """Indices of the rows of a (configs, k) maximisation matrix that no other row dominates."""
+    # In descending lexicographic order a row can only be dominated by one before it, and by
+    # transitivity by one already on the front, so each row is checked against the front only.
+    order = np.lexsort(-objectives.T[::-1])
+    front: List[int] = []
+    for i in order:
+        if front:
+            members = objectives[front]
+            if np.any(np.all(members >= objectives[i], axis=-1) & np.any(members > objectives[i], axis=-1)):
+                continue
+        front.append(int(i))
+    return np.array(front, dtype=np.int64)
+
+
+def sweep(
+    history: VoteHistory,
+    weights: np.ndarray,
+    thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+    include_unanimous: bool = True,
+) -> Dict[str, Any]:
+    """Score every (weights, threshold) pair with weighted_majority, plus the unanimous rule.
+
+    Returns the per-config parameters and metric arrays; config i uses weights[weight_index[i]].
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    weight_index = np.repeat(np.arange(len(weights)), len(thresholds))
+    threshold = np.tile(thresholds, len(weights))
+    n = len(history)
+    # Scores depend only on the weights, so each weight vector is scored once and every
+    # threshold is applied to it by broadcasting: (weights, 1, 1, nodes) x (1, thresholds, 1).
+    step = max(1, CHUNK_ELEMENTS // max(n * len(thresholds), 1))
+    parts: List[Dict[str, np.ndarray]] = []
+    for start in range(0, len(weights), step):
+        w = weights[start:start + step, None, None, :]
+        decision, _ = orchestrator.aggregate_votes(
+            history.codes, history.confidences, w, thresholds[None, :, None], "weighted_majority"
+        )
+        parts.append(_evaluate(history, decision.reshape(-1, n)))
+    algos = ["weighted_majority"] * len(threshold)
+    if include_unanimous:
+        decision, _ = orchestrator.aggregate_votes(history.codes, history.confidences, weights[0], 0.0, "unanimous")
+        parts.append(_evaluate(history, decision[None]))
+        algos.append("unanimous")
+        weight_index = np.append(weight_index, -1)
+        threshold = np.append(threshold, np.nan)
+    metrics = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]} if parts else {}
+    return {"algo": algos, "weight_index": weight_index, "threshold": threshold, "metrics": metrics}
+
+
+def _config(result: Dict[str, Any], weights: np.ndarray, i: int) -> Dict[str, Any]:
+    w = int(result["weight_index"][i])
+    threshold = float(result["threshold"][i])
+    return {
+        "algo": result["algo"][i],
+        "threshold": None if np.isnan(threshold) else threshold,
+        "weights": None if w < 0 else {node_id: float(weights[w, c]) for c, node_id in enumerate(NODE_IDS)},
+        **{key: float(values[i]) for key, values in result["metrics"].items()},
+    }
+
+
+def run_sweep(
+    history: VoteHistory,
+    samples: int = 500,
+    thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+    seed: Optional[int] = None,
+    top: int = 50,
+    settings: Optional[Settings] = None,
+) -> Dict[str, Any]:
+    """Sweep around the live configuration and report it next to the Pareto-optimal ones."""
+    settings = settings or get_settings()
+    if not len(history):
+        return {"rows": 0, "configs": 0, "pareto": [], "baseline": None}
+    started = time.perf_counter()
+    base = dict(orchestrator.DEFAULT_WEIGHTS)
+    # Row 1 is what run_analysis uses now: the learned weights under NODE_WEIGHTING=adaptive.
+    try:
+        node_weights.refresh(settings)
+    except Exception:
+        pass
+    live_weights = node_weights.get_weights(base, settings)
+    weights = weight_grid(base, samples, seed=seed, extra=[live_weights])
+    live_threshold = float(settings.confidence_threshold)
+    grid = sorted(set(float(t) for t in thresholds) | {live_threshold})
+    result = sweep(history, weights, grid)
+    metrics = result["metrics"]
+
+    if settings.decision_algorithm == "unanimous":
+        baseline = len(result["algo"]) - 1
+    else:
+        baseline = int(np.flatnonzero((result["weight_index"] == 1) & (result["threshold"] == live_threshold))[0])
+
+    objectives = np.column_stack([metrics["total_return"], metrics["max_drawdown"], metrics["hit_rate"]])
+    front = pareto_front(objectives)
+    front = front[np.argsort(-metrics["total_return"][front], kind="stable")][:top]
+    return {
+        "rows": len(history),
+        "symbols": int(len(set(history.symbols))),
+        "start": str(history.timestamps.min()),
+        "end": str(history.timestamps.max()),
+        "configs": len(result["algo"]),
+        "objectives": ["total_return", "max_drawdown", "hit_rate"],
+        "baseline": _config(result, weights, baseline),
+        "pareto": [_config(result, weights, int(i)) for i in front],
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+class HistoryCache:
+    """The last loaded VoteHistory per filter, reused for HISTORY_TTL_SECONDS."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple[Any, ...]] = None
+        self._history: Optional[VoteHistory] = None
+        self._loaded_at = 0.0
+
+    def get(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        symbols: Optional[Sequence[str]] = None,
+        refresh: bool = False,
+    ) -> VoteHistory:
+        key = (since, until, tuple(sorted(symbols)) if symbols else None)
+        with self._lock:
+            fresh = time.time() - self._loaded_at < HISTORY_TTL_SECONDS
+            if refresh or self._history is None or self._key != key or not fresh:
+                self._history = load_history(since, until, symbols)
+                self._key = key
+                self._loaded_at = time.time()
+            return self._history
+
+
+_cache = HistoryCache()
+
+
+def get_history(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    symbols: Optional[Sequence[str]] = None,
+    refresh: bool = False,
+) -> VoteHistory:
+    return _cache.get(since, until, symbols, refresh)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sweep vote weights and thresholds over recorded node votes")
+    parser.add_argument("--symbols", help="comma separated symbols (all when omitted)")
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--samples", type=int, default=500, help="random weight vectors per threshold")
+    parser.add_argument("--thresholds", help="comma separated thresholds")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON report to this path")
+    args = parser.parse_args()
+
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()] if args.symbols else None
+    thresholds = [float(t) for t in args.thresholds.split(",")] if args.thresholds else DEFAULT_THRESHOLDS
+    settings = reload_settings(use_db=False)
+    history = load_history(args.since, args.until, symbols)
+    report = json.dumps(run_sweep(history, args.samples, thresholds, args.seed, args.top, settings), indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(report)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
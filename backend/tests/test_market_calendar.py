@@ -0,0 +1,75 @@
+from datetime import date, datetime, time as dtime, timezone
+
+import market_calendar
+
+
+def _utc(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+
+def test_holidays_2024():
+    assert sorted(market_calendar.holidays(2024)) == [
+        date(2024, 1, 1),
+        date(2024, 1, 15),
+        date(2024, 2, 19),
+        date(2024, 3, 29),
+        date(2024, 5, 27),
+        date(2024, 6, 19),
+        date(2024, 7, 4),
+        date(2024, 9, 2),
+        date(2024, 11, 28),
+        date(2024, 12, 25),
+    ]
+
+
+def test_weekend_holidays_are_observed():
+    holidays_2022 = market_calendar.holidays(2022)
+    assert date(2022, 12, 26) in holidays_2022  # Christmas on a Sunday
+    assert date(2022, 6, 20) in holidays_2022  # Juneteenth on a Sunday
+    assert date(2021, 7, 5) in market_calendar.holidays(2021)  # Independence Day on a Sunday
+    assert date(2020, 7, 3) in market_calendar.holidays(2020)  # Independence Day on a Saturday
+
+
+def test_saturday_new_year_is_not_observed_in_the_prior_year():
+    assert date(2021, 12, 31) not in market_calendar.holidays(2021)
+    assert date(2021, 12, 31) not in market_calendar.holidays(2022)
+    assert market_calendar.is_trading_day(date(2021, 12, 31))
+
+
+def test_juneteenth_starts_in_2022():
+    assert not any(day.month == 6 for day in market_calendar.holidays(2021))
+
+
+def test_early_closes_2024():
+    assert market_calendar.early_closes(2024) == {
+        date(2024, 7, 3): dtime(13, 0),
+        date(2024, 11, 29): dtime(13, 0),
+        date(2024, 12, 24): dtime(13, 0),
+    }
+
+
+def test_no_early_close_on_weekends():
+    # 2022-07-03 is a Sunday and 2022-12-24 a Saturday.
+    assert market_calendar.early_closes(2022) == {date(2022, 11, 25): dtime(13, 0)}
+
+
+def test_next_open_during_session_is_now():
+    ts = _utc(2024, 7, 2, 15, 0)  # 11:00 EDT
+    assert market_calendar.session(ts) == "regular"
+    assert market_calendar.next_open(ts) == ts
+
+
+def test_next_open_skips_weekend_in_summer():
+    saturday = _utc(2024, 7, 6, 12, 0)
+    assert market_calendar.next_open(saturday) == _utc(2024, 7, 8, 13, 30)
+
+
+def test_next_open_skips_holiday_weekend_in_winter():
+    friday_evening = _utc(2024, 1, 12, 22, 0)  # 17:00 EST, Monday is MLK day
+    assert market_calendar.next_open(friday_evening) == _utc(2024, 1, 16, 14, 30)
+
+
+def test_next_open_before_the_bell_is_the_same_day():
+    premarket = _utc(2024, 3, 11, 12, 0)  # 08:00 EDT, first weekday after DST starts
+    assert market_calendar.session(premarket) == "pre"
+    assert market_calendar.next_open(premarket) == _utc(2024, 3, 11, 13, 30)
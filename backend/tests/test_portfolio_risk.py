@@ -0,0 +1,127 @@
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+import pytest
+
+import portfolio_risk
+from schemas import FinalDecision, MarketData
+from settings import Settings
+
+EQUITY = 100000.0
+
+
+def _settings(**overrides) -> Settings:
+    values = dict(
+        account_equity=EQUITY,
+        max_position_size=0.10,
+        max_concurrent_positions=10,
+        max_daily_loss=0.02,
+        risk_target_volatility=10.0,  # no volatility scaling unless a test asks for it
+        risk_default_volatility=0.30,
+        risk_max_var=1.0,
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def _buy(symbol: str, size: float, confidence: float = 0.8) -> Tuple[str, MarketData, FinalDecision]:
+    market_data = MarketData(symbol=symbol, timestamp="2024-01-02T15:00:00", current_price=100.0)
+    decision = FinalDecision(
+        final_decision="BUY",
+        aggregate_confidence=confidence,
+        votes={"BUY": 5, "SELL": 0, "HOLD": 0},
+        recommended_position_size=size,
+        node_results=[],
+    )
+    return symbol, market_data, decision
+
+
+def _engine(settings: Settings, positions: Dict[str, Tuple[float, float]] = None) -> portfolio_risk.PortfolioRiskEngine:
+    engine = portfolio_risk.PortfolioRiskEngine()
+    engine._positions = dict(positions or {})
+    # Already synced for today: no broker or database access.
+    engine._synced = (portfolio_risk._today(), settings.trading_mode)
+    return engine
+
+
+@pytest.fixture
+def flat_model(monkeypatch):
+    """Daily volatility 1% for every symbol and a uniform pairwise correlation."""
+
+    def install(correlation: float = 0.0, daily_vol: float = 0.01):
+        def risk_model(symbols: Sequence[str], default_volatility: float):
+            n = len(symbols)
+            corr = np.full((n, n), correlation)
+            np.fill_diagonal(corr, 1.0)
+            return np.full(n, daily_vol), corr, np.ones(n, dtype=bool)
+
+        monkeypatch.setattr(portfolio_risk, "risk_model", risk_model)
+
+    return install
+
+
+def test_value_at_risk_single_position():
+    var = portfolio_risk.value_at_risk(np.array([10000.0]), np.array([0.02]), np.eye(1))
+    assert var == pytest.approx(portfolio_risk.VAR_Z_95 * 0.02 * 10000.0)
+
+
+def test_limits_never_grow_the_requested_size(flat_model):
+    flat_model()
+    settings = _settings()
+    nisa = _buy("VT", 500.0)
+    _engine(settings).evaluate_cycle([nisa], settings)
+    assert nisa[2].final_decision == "BUY"
+    assert nisa[2].recommended_position_size == pytest.approx(500.0)
+
+
+def test_position_cap_shrinks_oversized_buy(flat_model):
+    flat_model()
+    settings = _settings()
+    big = _buy("AAPL", 50000.0)
+    _engine(settings).evaluate_cycle([big], settings)
+    assert big[2].recommended_position_size == pytest.approx(EQUITY * settings.max_position_size)
+
+
+def test_var_limit_scales_new_buys_to_the_boundary(flat_model):
+    flat_model(daily_vol=0.02)
+    # 10000 at 2% daily vol has VaR 329; a limit of 164.5 allows exactly half of it.
+    settings = _settings(risk_max_var=164.5 / EQUITY)
+    buy = _buy("AAPL", 10000.0)
+    _engine(settings).evaluate_cycle([buy], settings)
+    assert buy[2].recommended_position_size == pytest.approx(5000.0)
+
+
+def test_var_solve_with_existing_book_lands_on_the_limit(flat_model):
+    flat_model(correlation=0.5)
+    settings = _settings(risk_max_var=250.0 / EQUITY)
+    engine = _engine(settings, {"MSFT": (100.0, 100.0)})
+    first, second = _buy("AAPL", 10000.0), _buy("NVDA", 6000.0)
+    engine.evaluate_cycle([first, second], settings)
+
+    scaled = np.array([10000.0, first[2].recommended_position_size, second[2].recommended_position_size])
+    vol = np.full(3, 0.01)
+    corr = np.full((3, 3), 0.5)
+    np.fill_diagonal(corr, 1.0)
+    assert portfolio_risk.value_at_risk(scaled, vol, corr) == pytest.approx(250.0)
+    # One common scale factor keeps the buys in proportion.
+    assert second[2].recommended_position_size / first[2].recommended_position_size == pytest.approx(0.6)
+
+
+def test_existing_book_over_the_limit_blocks_buys(flat_model):
+    flat_model()
+    settings = _settings(risk_max_var=100.0 / EQUITY)
+    engine = _engine(settings, {"MSFT": (100.0, 100.0)})  # VaR 164.5 on its own
+    buy = _buy("AAPL", 1000.0)
+    engine.evaluate_cycle([buy], settings)
+    assert buy[2].final_decision == "HOLD"
+    assert buy[2].recommended_position_size == 0.0
+
+
+def test_concurrency_slots_go_to_the_most_confident(flat_model):
+    flat_model()
+    settings = _settings(max_concurrent_positions=2)
+    engine = _engine(settings, {"MSFT": (10.0, 100.0)})
+    low, high = _buy("AAPL", 1000.0, confidence=0.6), _buy("NVDA", 1000.0, confidence=0.9)
+    engine.evaluate_cycle([low, high], settings)
+    assert high[2].final_decision == "BUY"
+    assert low[2].final_decision == "HOLD"
@@ -0,0 +1,39 @@
+import numpy as np
+
+from sweep import pareto_front
+
+
+def test_dominated_rows_are_dropped():
+    objectives = np.array([
+        [1.0, 5.0],
+        [3.0, 3.0],
+        [2.0, 2.0],  # dominated by [3, 3]
+        [5.0, 1.0],
+        [0.5, 4.0],  # dominated by [1, 5]
+    ])
+    assert pareto_front(objectives).tolist() == [3, 1, 0]
+
+
+def test_single_best_row():
+    objectives = np.array([[1.0, 1.0], [2.0, 2.0], [0.0, 2.0]])
+    assert pareto_front(objectives).tolist() == [1]
+
+
+def test_duplicates_of_a_front_point_are_kept():
+    objectives = np.array([[2.0, 2.0], [1.0, 1.0], [2.0, 2.0]])
+    assert sorted(pareto_front(objectives).tolist()) == [0, 2]
+
+
+def test_tie_on_one_objective():
+    objectives = np.array([[3.0, 1.0], [3.0, 2.0], [1.0, 3.0]])
+    assert pareto_front(objectives).tolist() == [1, 2]
+
+
+def test_three_objectives():
+    objectives = np.array([
+        [1.0, 0.0, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 0.0, 1.0],
+        [0.0, 0.0, 0.5],
+    ])
+    assert sorted(pareto_front(objectives).tolist()) == [0, 1, 2]
@@ -0,0 +1,243 @@
+"""Lightweight per-decision tracing.
+
+span() records a timed span under the current trace (held in a contextvar, so
+it follows asyncio tasks and asyncio.to_thread). trace() starts a trace, or a
+child span if one is already active, and when the outermost span finishes the
+whole tree is kept in a small in-memory ring (GET /traces/{id}) and, with
+TRACE_EXPORT_PATH set, appended as one OpenTelemetry (OTLP/JSON) document per
+line so it can be loaded into any OTLP-aware viewer. The export is handed to a
+background writer thread so finishing a trace never touches the disk; when the
+writer falls behind, traces are dropped and counted rather than queued without
+bound.
+"""
+import contextvars
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import metrics
+
+TRACE_EXPORT_PATH_ENV = "TRACE_EXPORT_PATH"
+TRACE_BUFFER_SIZE = 200
+TRACE_EXPORT_QUEUE_SIZE = 1000
+SERVICE_NAME = "ai-hedge-backend"
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+class _Trace:
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.spans: List[Span] = []
+        self.lock = threading.Lock()
+
+
+_current_trace: contextvars.ContextVar[Optional[_Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+_recent: "OrderedDict[str, List[Span]]" = OrderedDict()
+_recent_lock = threading.Lock()
+_export_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=TRACE_EXPORT_QUEUE_SIZE)
+_export_thread: Optional[threading.Thread] = None
+_export_thread_lock = threading.Lock()
+
+
+def current_trace_id() -> Optional[str]:
+    active = _current_trace.get()
+    return active.trace_id if active else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a child span of the current span; a no-op outside a trace."""
+    active = _current_trace.get()
+    if active is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = Span(
+        trace_id=active.trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        name=name,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        with active.lock:
+            active.spans.append(current)
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Span]:
+    """Start a trace rooted at name, or nest as a span when one is already running."""
+    if _current_trace.get() is not None:
+        with span(name, **attributes) as current:
+            yield current  # type: ignore[misc]
+        return
+    active = _Trace(secrets.token_hex(16))
+    trace_token = _current_trace.set(active)
+    try:
+        with span(name, **attributes) as root:
+            yield root  # type: ignore[misc]
+    finally:
+        _current_trace.reset(trace_token)
+        _finish(active)
+
+
+def _finish(active: _Trace) -> None:
+    with active.lock:
+        spans = sorted(active.spans, key=lambda s: s.start_ns)
+    with _recent_lock:
+        _recent[active.trace_id] = spans
+        while len(_recent) > TRACE_BUFFER_SIZE:
+            _recent.popitem(last=False)
+    path = os.getenv(TRACE_EXPORT_PATH_ENV)
+    if path:
+        _start_exporter()
+        try:
+            _export_queue.put_nowait((path, spans))
+        except queue.Full:
+            metrics.TRACE_EXPORT_DROPPED.inc("queue_full")
+
+
+def _start_exporter() -> None:
+    global _export_thread
+    with _export_thread_lock:
+        if _export_thread is None or not _export_thread.is_alive():
+            _export_thread = threading.Thread(target=_export_loop, name="trace-export", daemon=True)
+            _export_thread.start()
+
+
+def _export_loop() -> None:
+    while True:
+        item = _export_queue.get()
+        if item is None:
+            return
+        batch = [item]
+        # Drain whatever else is waiting so a burst costs one open() per file.
+        while True:
+            try:
+                item = _export_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                _write(batch)
+                return
+            batch.append(item)
+        _write(batch)
+
+
+def _write(batch: List[tuple]) -> None:
+    lines: Dict[str, List[str]] = {}
+    for path, spans in batch:
+        lines.setdefault(path, []).append(json.dumps(to_otlp(spans), separators=(",", ":"), default=str))
+    for path, chunk in lines.items():
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write("\n".join(chunk) + "\n")
+        except OSError:
+            metrics.TRACE_EXPORT_DROPPED.inc("write_error", amount=len(chunk))
+
+
+def stop_exporter(timeout: float = 5.0) -> None:
+    """Flush pending exports and stop the writer thread (application shutdown)."""
+    global _export_thread
+    with _export_thread_lock:
+        thread, _export_thread = _export_thread, None
+    if thread is None or not thread.is_alive():
+        return
+    try:
+        _export_queue.put(None, timeout=timeout)
+    except queue.Full:
+        return
+    thread.join(timeout)
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def to_otlp(spans: List[Span]) -> Dict[str, Any]:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{
+                "scope": {"name": "tracing"},
+                "spans": [
+                    {
+                        "traceId": s.trace_id,
+                        "spanId": s.span_id,
+                        "parentSpanId": s.parent_id or "",
+                        "name": s.name,
+                        "kind": 1,
+                        "startTimeUnixNano": str(s.start_ns),
+                        "endTimeUnixNano": str(s.end_ns),
+                        "attributes": [_attribute(k, v) for k, v in s.attributes.items() if v is not None],
+                        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+                    }
+                    for s in spans
+                ],
+            }],
+        }],
+    }
+
+
+def get_trace(trace_id: str) -> Optional[List[Span]]:
+    with _recent_lock:
+        return _recent.get(trace_id)
+
+
+def recent_traces(limit: int = 50) -> List[Dict[str, Any]]:
+    with _recent_lock:
+        items = list(_recent.items())[-limit:]
+    summaries = []
+    for trace_id, spans in reversed(items):
+        root = next((s for s in spans if s.parent_id is None), spans[0] if spans else None)
+        if root is None:
+            continue
+        summaries.append({
+            "trace_id": trace_id,
+            "name": root.name,
+            "duration_ms": (root.end_ns - root.start_ns) / 1e6,
+            "spans": len(spans),
+            "error": any(s.error for s in spans),
+        })
+    return summaries
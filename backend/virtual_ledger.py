@@ -0,0 +1,212 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from db import get_connection
+
+
+@dataclass
+class Fill:
+    symbol: str
+    side: str
+    qty: float
+    price: float
+
+
+@dataclass
+class FillResult:
+    symbol: str
+    side: str
+    qty: float
+    price: float
+    realized_pnl: Optional[float]
+    entry_price_used: Optional[float]
+
+
+def _apply_buy(cur: Any, fill: Fill, now: datetime) -> Tuple[float, float]:
+    # Additive upsert: the row lock taken by ON CONFLICT serialises concurrent buys,
+    # including the very first buy of a symbol that has no row to SELECT ... FOR UPDATE yet.
+    cur.execute(
+        """
+        INSERT INTO virtual_positions AS p (symbol, quantity, avg_price, last_updated)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (symbol) DO UPDATE
+        SET quantity = COALESCE(p.quantity, 0) + EXCLUDED.quantity,
+            avg_price = CASE
+                WHEN COALESCE(p.quantity, 0) + EXCLUDED.quantity > 0 THEN
+                    (COALESCE(p.quantity, 0) * COALESCE(p.avg_price, 0)
+                     + EXCLUDED.quantity * EXCLUDED.avg_price)
+                    / (COALESCE(p.quantity, 0) + EXCLUDED.quantity)
+                ELSE EXCLUDED.avg_price
+            END,
+            last_updated = EXCLUDED.last_updated
+        RETURNING quantity, avg_price
+        """,
+        (fill.symbol, fill.qty, fill.price, now),
+    )
+    qty, avg_price = cur.fetchone()
+    return float(qty), float(avg_price)
+
+
+def _apply_sell(cur: Any, fill: Fill, now: datetime) -> Tuple[Optional[float], float, float, float]:
+    cur.execute(
+        "SELECT quantity, avg_price FROM virtual_positions WHERE symbol = %s FOR UPDATE",
+        (fill.symbol,),
+    )
+    row = cur.fetchone()
+    current_qty = float(row[0] or 0.0) if row else 0.0
+    avg_price = float(row[1] or 0.0) if row else 0.0
+    sell_qty = min(fill.qty, current_qty) if current_qty > 0 else 0.0
+    if sell_qty <= 0:
+        # no position to sell from
+        return 0.0, fill.price, current_qty, avg_price
+    new_qty = current_qty - sell_qty
+    if new_qty <= 0:
+        cur.execute("DELETE FROM virtual_positions WHERE symbol = %s", (fill.symbol,))
+    else:
+        cur.execute(
+            "UPDATE virtual_positions SET quantity = %s, last_updated = %s WHERE symbol = %s",
+            (new_qty, now, fill.symbol),
+        )
+    return (fill.price - avg_price) * sell_qty, avg_price, new_qty, avg_price
+
+
+class PositionBook:
+    """Read cache of virtual_positions, re-read from the table after every committed fill."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._positions: Dict[str, Tuple[float, float]] = {}
+        self._marks: Dict[str, float] = {}
+        self._loaded = False
+
+    def load(self) -> None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT symbol, quantity, avg_price FROM virtual_positions")
+                rows = cur.fetchall()
+        with self._lock:
+            self._positions = {
+                symbol: (float(qty or 0.0), float(avg or 0.0)) for symbol, qty, avg in rows if (qty or 0) > 0
+            }
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _reload(self, symbols: List[str]) -> None:
+        # Read back what is committed, under the cache lock: whichever of two concurrent
+        # batches reloads last sees both commits, so the cache cannot end on the older one.
+        with self._lock:
+            with get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "SELECT symbol, quantity, avg_price FROM virtual_positions WHERE symbol = ANY(%s)",
+                        (symbols,),
+                    )
+                    rows = cur.fetchall()
+            for symbol in symbols:
+                self._positions.pop(symbol, None)
+            for symbol, qty, avg in rows:
+                if (qty or 0) > 0:
+                    self._positions[symbol] = (float(qty), float(avg or 0.0))
+
+    def update_mark(self, symbol: str, price: float) -> None:
+        self._marks[symbol] = price
+
+    def positions(self) -> Dict[str, Tuple[float, float]]:
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._positions)
+
+    def apply_fills(self, fills: Iterable[Fill]) -> List[FillResult]:
+        """Apply a cycle's fills in one transaction on one connection.
+
+        Fills are processed grouped by symbol so concurrent batches take row locks
+        in the same order; fills for the same symbol keep their submitted order.
+        """
+        ordered = sorted(fills, key=lambda f: f.symbol)
+        if not ordered:
+            return []
+        now = datetime.utcnow()
+        results: List[FillResult] = []
+        final: Set[str] = set()
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                for fill in ordered:
+                    if fill.side == "BUY":
+                        _apply_buy(cur, fill, now)
+                        final.add(fill.symbol)
+                        results.append(FillResult(fill.symbol, fill.side, fill.qty, fill.price, None, fill.price))
+                    else:  # SELL
+                        pnl, entry_price_used, _, _ = _apply_sell(cur, fill, now)
+                        final.add(fill.symbol)
+                        results.append(
+                            FillResult(fill.symbol, fill.side, fill.qty, fill.price, pnl, entry_price_used)
+                        )
+            conn.commit()
+        self._reload(sorted(final))
+        for fill in ordered:
+            self._marks[fill.symbol] = fill.price
+        return results
+
+    def mark_to_market(self, prices: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        positions = self.positions()
+        marks = dict(self._marks)
+        if prices:
+            marks.update(prices)
+        symbols = list(positions)
+        qty = np.fromiter((positions[s][0] for s in symbols), dtype=np.float64, count=len(symbols))
+        avg = np.fromiter((positions[s][1] for s in symbols), dtype=np.float64, count=len(symbols))
+        last = np.fromiter((marks.get(s, positions[s][1]) for s in symbols), dtype=np.float64, count=len(symbols))
+        cost = qty * avg
+        value = qty * last
+        unrealized = value - cost
+        return {
+            "positions": [
+                {
+                    "symbol": s,
+                    "quantity": float(qty[i]),
+                    "avg_price": float(avg[i]),
+                    "mark_price": float(last[i]),
+                    "market_value": float(value[i]),
+                    "unrealized_pnl": float(unrealized[i]),
+                }
+                for i, s in enumerate(symbols)
+            ],
+            "total_cost": float(cost.sum()),
+            "total_market_value": float(value.sum()),
+            "total_unrealized_pnl": float(unrealized.sum()),
+        }
+
+
+_book = PositionBook()
+
+
+def get_position_book() -> PositionBook:
+    return _book
+
+
+def apply_fills(fills: Iterable[Fill]) -> List[FillResult]:
+    return _book.apply_fills(fills)
+
+
+def apply_virtual_fill(symbol: str, side: str, qty: float, price: float) -> Tuple[Optional[float], Optional[float]]:
+    """Apply a single virtual fill atomically.
+
+    Returns (realized_pnl, entry_price_used).
+    """
+    result = _book.apply_fills([Fill(symbol=symbol, side=side, qty=qty, price=price)])[0]
+    return result.realized_pnl, result.entry_price_used
+
+
+def update_mark(symbol: str, price: float) -> None:
+    _book.update_mark(symbol, price)
+
+
+def mark_to_market(prices: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    return _book.mark_to_market(prices)
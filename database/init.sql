@@ -1,4 +1,4 @@
-CREATE TABLE trade_decisions (
+CREATE TABLE IF NOT EXISTS trade_decisions (
     id SERIAL PRIMARY KEY,
     timestamp TIMESTAMP,
     symbol VARCHAR(10),
@@ -8,10 +8,11 @@ CREATE TABLE trade_decisions (
     exit_price FLOAT,
     profit_loss FLOAT,
     holding_period INTERVAL,
-    node_votes JSONB
+    node_votes JSONB,
+    audit_hash TEXT
 );
 
-CREATE TABLE node_performance (
+CREATE TABLE IF NOT EXISTS node_performance (
     node_id VARCHAR(50),
     model_name VARCHAR(100),
     total_decisions INT,
@@ -21,14 +22,71 @@ CREATE TABLE node_performance (
     last_updated TIMESTAMP
 );
 
-CREATE TABLE virtual_positions (
+CREATE TABLE IF NOT EXISTS virtual_positions (
     symbol VARCHAR(10) PRIMARY KEY,
     quantity FLOAT,
     avg_price FLOAT,
     last_updated TIMESTAMP
 );
 
-CREATE TABLE app_settings (
+CREATE TABLE IF NOT EXISTS app_settings (
     key TEXT PRIMARY KEY,
     value TEXT
 );
+
+CREATE TABLE IF NOT EXISTS nisa_runs (
+    symbol VARCHAR(10) PRIMARY KEY,
+    last_run DATE,
+    last_order_id TEXT,
+    updated_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS worker_leases (
+    worker_id TEXT PRIMARY KEY,
+    hostname TEXT,
+    started_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT,
+    expires_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS llm_usage (
+    day DATE,
+    model TEXT,
+    node TEXT,
+    prompt_tokens BIGINT DEFAULT 0,
+    completion_tokens BIGINT DEFAULT 0,
+    cost_usd DOUBLE PRECISION DEFAULT 0,
+    requests INTEGER DEFAULT 0,
+    PRIMARY KEY (day, model, node)
+);
+
+CREATE TABLE IF NOT EXISTS audit_blobs (
+    hash TEXT PRIMARY KEY,
+    codec TEXT,
+    raw_size INTEGER,
+    data BYTEA,
+    created_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT,
+    symbol TEXT,
+    priority INTEGER,
+    submitted_at DOUBLE PRECISION,
+    status TEXT,
+    started_at DOUBLE PRECISION,
+    finished_at DOUBLE PRECISION,
+    result JSONB,
+    error TEXT,
+    idempotency_key TEXT UNIQUE,
+    trace_id TEXT
+);
+
+-- Existing volumes skip this file; the backend applies the same statements at startup (db.SCHEMA_MIGRATIONS).
+ALTER TABLE trade_decisions ADD COLUMN IF NOT EXISTS audit_hash TEXT;
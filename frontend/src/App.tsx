@@ -8,9 +8,12 @@ function App() {
   const [activeTab, setActiveTab] = useState<TabKey>("monitor");
   const [health, setHealth] = useState<string>("unknown");
   const [symbol, setSymbol] = useState<string>("AAPL");
+  // The symbol last submitted with Analyze/Trade; the live stream follows this, not each keystroke.
+  const [watchedSymbol, setWatchedSymbol] = useState<string>("AAPL");
   const [analyzeResult, setAnalyzeResult] = useState<any | null>(null);
   const [trades, setTrades] = useState<any[]>([]);
   const [mode, setMode] = useState<string>("virtual");
+  const [fills, setFills] = useState<any[]>([]);
 
   useEffect(() => {
     fetch(`${API_URL}/health`)
@@ -23,7 +26,23 @@ function App() {
       .catch(() => undefined);
   }, []);
 
+  // Live decisions and fills pushed by the backend; EventSource reconnects on its own.
+  useEffect(() => {
+    const source = new EventSource(
+      `${API_URL}/events?symbols=${encodeURIComponent(watchedSymbol)}&types=decision,fill`
+    );
+    source.addEventListener("decision", (e) => {
+      setAnalyzeResult(JSON.parse((e as MessageEvent).data).data);
+    });
+    source.addEventListener("fill", (e) => {
+      const event = JSON.parse((e as MessageEvent).data);
+      setFills((prev) => [{ symbol: event.symbol, ts: event.ts, ...event.data }, ...prev].slice(0, 50));
+    });
+    return () => source.close();
+  }, [watchedSymbol]);
+
   const handleAnalyze = async () => {
+    setWatchedSymbol(symbol);
     const res = await fetch(`${API_URL}/analyze/${encodeURIComponent(symbol)}`, {
       method: "POST"
     });
@@ -32,6 +51,7 @@ function App() {
   };
 
   const handleTrade = async () => {
+    setWatchedSymbol(symbol);
     const res = await fetch(`${API_URL}/trade/${encodeURIComponent(symbol)}`, {
       method: "POST"
     });
@@ -78,6 +98,20 @@ function App() {
     );
   };
 
+  const renderFills = () => {
+    if (!fills.length) return <p>No fills yet.</p>;
+    return (
+      <ul>
+        {fills.map((f) => (
+          <li key={f.order_id ?? f.ts}>
+            {new Date(f.ts * 1000).toLocaleTimeString()} {f.side} {f.quantity} {f.symbol} @ {f.price}
+            {f.realized_pnl != null ? ` (P/L ${f.realized_pnl})` : ""}
+          </li>
+        ))}
+      </ul>
+    );
+  };
+
   const renderVotes = () => {
     if (!analyzeResult) return <p>No votes yet.</p>;
     const nodes = analyzeResult.node_results ?? [];
@@ -185,6 +219,8 @@ function App() {
         <div>
           <h2>Real-time Monitor</h2>
           {renderDecisionSummary()}
+          <h3>Fills</h3>
+          {renderFills()}
         </div>
       )}
 